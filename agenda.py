@@ -0,0 +1,313 @@
+import os
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import date, time, timedelta
+
+from modelos import Agendamento, lerHora
+
+DURACOES_SERVICOS = {"Corte": 45, "Barba": 30, "Sobrancelha": 30, "Reflexo": 90}
+# Duração dos agendamentos sem duração gravada, anteriores à agenda por serviço (a antiga grade de 1 hora).
+DURACAO_PADRAO = 60
+
+
+def minutos(hora: time):
+    return hora.hour * 60 + hora.minute
+
+
+def horaDeMinutos(valor: int):
+    """
+    Converte minutos desde a meia-noite em time. Horas iguais compartilham o mesmo objeto.
+    """
+    return lerHora(f"{valor // 60:02d}:{valor % 60:02d}")
+
+
+@dataclass
+class ConfiguracaoAgenda:
+    """
+    Configuração da agenda: os barbeiros, o horário de funcionamento, o passo da grade de
+    horários de início, em minutos, e a duração de cada serviço, em minutos.
+
+    Agendamentos sem barbeiro (anteriores à agenda por barbeiro) ocupam o primeiro barbeiro.
+    """
+    barbeiros: tuple = ("Barbeiro",)
+    abertura: time = time(9, 0)
+    fechamento: time = time(23, 0)
+    passo: int = 15
+    duracoes: dict = field(default_factory=lambda: dict(DURACOES_SERVICOS))
+
+    @classmethod
+    def deAmbiente(cls):
+        """
+        Lê a configuração de BARBEARIA_BARBEIROS (nomes separados por vírgula),
+        BARBEARIA_ABERTURA, BARBEARIA_FECHAMENTO (HH:MM) e BARBEARIA_PASSO_MINUTOS.
+        """
+        barbeiros = tuple(nome.strip() for nome in os.environ.get("BARBEARIA_BARBEIROS", "Barbeiro").split(",")
+                          if nome.strip())
+        config = cls(barbeiros=barbeiros,
+                     abertura=lerHora(os.environ.get("BARBEARIA_ABERTURA", "09:00")),
+                     fechamento=lerHora(os.environ.get("BARBEARIA_FECHAMENTO", "23:00")),
+                     passo=int(os.environ.get("BARBEARIA_PASSO_MINUTOS", "15")))
+        if not config.barbeiros:
+            raise ValueError("Nenhum barbeiro configurado.")
+        if config.passo <= 0 or config.abertura >= config.fechamento:
+            raise ValueError("Horário de funcionamento inválido.")
+        return config
+
+    @property
+    def servicos(self):
+        return list(self.duracoes)
+
+    def duracao(self, servico: str):
+        return self.duracoes.get(servico, DURACAO_PADRAO)
+
+    def barbeiroDe(self, agendamento: Agendamento):
+        return agendamento.barbeiro or self.barbeiros[0]
+
+    def intervaloDe(self, agendamento: Agendamento):
+        """
+        Retorna (inicio, fim) do agendamento em minutos desde a meia-noite.
+        """
+        inicio = minutos(agendamento.hora)
+        return inicio, inicio + (agendamento.duracao or DURACAO_PADRAO)
+
+    def candidatos(self, barbeiro: str = None):
+        """
+        Barbeiros que podem atender, na ordem de preferência: o escolhido ou todos.
+        """
+        return (barbeiro,) if barbeiro else self.barbeiros
+
+    def inicios(self, duracao: int):
+        """
+        Horários de início da grade, em minutos, para um serviço que precisa terminar até o fechamento.
+        """
+        return range(minutos(self.abertura), minutos(self.fechamento) - duracao + 1, self.passo)
+
+    def cabe(self, inicio: int, duracao: int):
+        return minutos(self.abertura) <= inicio and inicio + duracao <= minutos(self.fechamento)
+
+
+class Intervalos:
+    """
+    Intervalos ocupados de um barbeiro em um dia, em minutos, em arrays ordenados pelo início.
+
+    Guarda também o alcance, o maior fim entre os intervalos até cada posição: com ele, saber se
+    [inicio, fim) conflita é uma busca binária (algum intervalo que começa antes de fim termina
+    depois de inicio?), mesmo que existam intervalos sobrepostos gravados antes da agenda por
+    barbeiro. Inserir e remover custam O(intervalos do dia).
+    """
+
+    __slots__ = ("inicios", "fins", "alcance", "donos")
+
+    def __init__(self):
+        self.inicios = []
+        self.fins = []
+        self.alcance = []
+        self.donos = []
+
+    def _recalcularAlcance(self, posicao: int):
+        maior = self.alcance[posicao - 1] if posicao else 0
+        for i in range(posicao, len(self.fins)):
+            maior = max(maior, self.fins[i])
+            self.alcance[i] = maior
+
+    def adicionar(self, inicio: int, fim: int, dono=None):
+        posicao = bisect_right(self.inicios, inicio)
+        self.inicios.insert(posicao, inicio)
+        self.fins.insert(posicao, fim)
+        self.donos.insert(posicao, dono)
+        self.alcance.insert(posicao, fim)
+        self._recalcularAlcance(posicao)
+
+    def remover(self, dono):
+        for posicao, atual in enumerate(self.donos):
+            if atual is dono:
+                for lista in (self.inicios, self.fins, self.donos, self.alcance):
+                    del lista[posicao]
+                self._recalcularAlcance(posicao)
+                return True
+        return False
+
+    def conflita(self, inicio: int, fim: int):
+        posicao = bisect_right(self.inicios, fim - 1)
+        return posicao > 0 and self.alcance[posicao - 1] > inicio
+
+    def livres(self, inicios, duracao: int):
+        """
+        Percorre os horários de início (crescentes) e os intervalos juntos, em uma única passada,
+        e gera os que não conflitam com nenhum intervalo.
+        """
+        posicao, total = 0, len(self.inicios)
+        for inicio in inicios:
+            fim = inicio + duracao
+            while posicao < total and self.inicios[posicao] < fim:
+                posicao += 1
+            if not posicao or self.alcance[posicao - 1] <= inicio:
+                yield inicio
+
+    def copia(self):
+        copia = Intervalos()
+        copia.inicios, copia.fins = self.inicios[:], self.fins[:]
+        copia.alcance, copia.donos = self.alcance[:], self.donos[:]
+        return copia
+
+    def __len__(self):
+        return len(self.inicios)
+
+
+def dias(inicio: date, fim: date):
+    return [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+
+
+def horariosLivres(agenda: ConfiguracaoAgenda, periodo: list, duracao: int, intervalos, barbeiros=None):
+    """
+    Calcula os horários livres de um serviço em vários dias de uma vez.
+
+    intervalos(barbeiro, dia) retorna os Intervalos ocupados do barbeiro no dia, ou None se ele
+    estiver livre o dia todo. Retorna {dia: {hora: (barbeiros livres)}}, com as horas em ordem.
+    Cada barbeiro e dia custa uma passada pela grade e pelos seus intervalos.
+    """
+    inicios = agenda.inicios(duracao)
+    resultado = {}
+    for dia in periodo:
+        livres = {}
+        for barbeiro in barbeiros or agenda.barbeiros:
+            ocupados = intervalos(barbeiro, dia)
+            for inicio in (inicios if not ocupados else ocupados.livres(inicios, duracao)):
+                livres.setdefault(inicio, []).append(barbeiro)
+        resultado[dia] = {horaDeMinutos(inicio): tuple(livres[inicio]) for inicio in sorted(livres)}
+    return resultado
+
+
+def descontarOcupados(livres: dict, barbeiro: str, ocupados: Intervalos, duracao: int):
+    """
+    Retorna uma cópia dos horários livres de um dia ({hora: (barbeiros)}) sem o barbeiro nos
+    horários em que o serviço conflitaria com os intervalos ocupados. Os horários que ficam sem
+    nenhum barbeiro são removidos; livres não é alterado.
+    """
+    resultado = {}
+    for hora, barbeiros in livres.items():
+        if barbeiro in barbeiros:
+            inicio = minutos(hora)
+            if ocupados.conflita(inicio, inicio + duracao):
+                barbeiros = tuple(candidato for candidato in barbeiros if candidato != barbeiro)
+                if not barbeiros:
+                    continue
+        resultado[hora] = barbeiros
+    return resultado
+
+
+class IndiceAgendamentos:
+    """
+    Agendamentos por id, com os intervalos ocupados de cada barbeiro em cada dia.
+
+    Guarda os agendamentos em um dicionário por id, na ordem de inserção (a ordem dos ids), e em
+    paralelo os Intervalos de cada (barbeiro, data), permitindo verificar conflitos com uma busca
+    binária e montar os horários livres de um dia em uma passada, independente do tamanho do
+    histórico. Os agendamentos também são agrupados por data, para listar os de um dia sem
+    percorrer todo o histórico. Buscar, remover e substituir pelo id custam O(1), mais os
+    intervalos do dia.
+
+    versoesDias conta as alterações de cada data, para que caches dos horários livres descartem
+    apenas os dias alterados.
+    """
+
+    def __init__(self, agendamentos=None, agenda: ConfiguracaoAgenda = None):
+        self.agenda = agenda or ConfiguracaoAgenda()
+        self._porId = {}
+        self._ocupacao = {}
+        self._porData = {}
+        self.versoesDias = {}
+        for agendamento in agendamentos or []:
+            self.adicionar(agendamento)
+
+    def _registrarAlteracao(self, data: date):
+        self.versoesDias[data] = self.versoesDias.get(data, 0) + 1
+
+    def intervalos(self, barbeiro: str, data: date):
+        return self._ocupacao.get((barbeiro, data))
+
+    def conflita(self, barbeiro: str, data: date, inicio: int, fim: int):
+        """
+        Indica se o barbeiro já tem agendamento que se sobreponha a [inicio, fim) na data.
+        """
+        ocupados = self._ocupacao.get((barbeiro, data))
+        return ocupados is not None and ocupados.conflita(inicio, fim)
+
+    def ocupar(self, agendamento: Agendamento):
+        """
+        Registra o intervalo do agendamento como ocupado.
+        """
+        chave = (self.agenda.barbeiroDe(agendamento), agendamento.data)
+        self._ocupacao.setdefault(chave, Intervalos()).adicionar(*self.agenda.intervaloDe(agendamento), agendamento)
+
+    def liberar(self, agendamento: Agendamento):
+        """
+        Libera o intervalo do agendamento, como para verificar uma alteração sem que ele conflite
+        consigo mesmo.
+        """
+        chave = (self.agenda.barbeiroDe(agendamento), agendamento.data)
+        ocupados = self._ocupacao[chave]
+        ocupados.remover(agendamento)
+        if not ocupados:
+            del self._ocupacao[chave]
+
+    def _agrupar(self, agendamento: Agendamento):
+        self._porData.setdefault(agendamento.data, {})[agendamento.id] = agendamento
+        self._registrarAlteracao(agendamento.data)
+
+    def _desagrupar(self, agendamento: Agendamento):
+        doDia = self._porData[agendamento.data]
+        del doDia[agendamento.id]
+        if not doDia:
+            del self._porData[agendamento.data]
+        self._registrarAlteracao(agendamento.data)
+
+    def adicionar(self, agendamento: Agendamento):
+        """
+        Adiciona um agendamento, que já deve ter id, e registra o intervalo como ocupado.
+        """
+        self._porId[agendamento.id] = agendamento
+        self.ocupar(agendamento)
+        self._agrupar(agendamento)
+
+    def obter(self, identificador: int):
+        return self._porId.get(identificador)
+
+    def remover(self, identificador: int):
+        """
+        Remove e retorna o agendamento com o id informado, liberando o intervalo, ou None se ele
+        não existir.
+        """
+        agendamento = self._porId.pop(identificador, None)
+        if agendamento is not None:
+            self.liberar(agendamento)
+            self._desagrupar(agendamento)
+        return agendamento
+
+    def substituir(self, novo: Agendamento):
+        """
+        Substitui o agendamento de mesmo id, mantendo sua posição na ordem dos ids, e atualiza os
+        intervalos ocupados. Retorna o agendamento antigo.
+        """
+        antigo = self._porId[novo.id]
+        self.liberar(antigo)
+        self._desagrupar(antigo)
+        self._porId[novo.id] = novo
+        self.ocupar(novo)
+        self._agrupar(novo)
+        return antigo
+
+    def doDia(self, data: date):
+        """
+        Retorna os agendamentos de uma data, ordenados por hora.
+        """
+        return sorted(self._porData.get(data, {}).values(), key=lambda agendamento: agendamento.hora)
+
+    def __iter__(self):
+        return iter(self._porId.values())
+
+    def __len__(self):
+        return len(self._porId)
+
+    def __bool__(self):
+        return bool(self._porId)
@@ -0,0 +1,300 @@
+import asyncio
+import heapq
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from modelos import Agendamento, Conta
+from notificacoes import EntregadorNotificacoes, Notificacao
+from paginacao import LIMITE_MAXIMO, Consulta, chaveOrdenacao
+
+TABELAS_PROGRAMADAS = ("agendamentos", "contas")
+
+
+@dataclass
+class ConfiguracaoAgendador:
+    """
+    Configuração das tarefas em segundo plano.
+
+    O agendador mantém na memória apenas os eventos das próximas horasHorizonte horas e relê essa
+    janela pelos índices a cada sincronizacao segundos, se agendamentos ou contas mudaram (o que
+    inclui as escritas de outros workers) ou se a janela estiver perto do fim. Os lembretes são
+    enviados lembreteMinutos antes do horário do agendamento.
+    """
+    ativo: bool = True
+    lembreteMinutos: float = 60.0
+    horasHorizonte: float = 24.0
+    sincronizacao: float = 60.0
+
+    @classmethod
+    def deAmbiente(cls):
+        """
+        Lê a configuração das variáveis de ambiente BARBEARIA_AGENDADOR* e BARBEARIA_LEMBRETE_MINUTOS.
+        """
+        config = cls(
+            ativo=os.environ.get("BARBEARIA_AGENDADOR", "1") != "0",
+            lembreteMinutos=float(os.environ.get("BARBEARIA_LEMBRETE_MINUTOS", cls.lembreteMinutos)),
+            horasHorizonte=float(os.environ.get("BARBEARIA_AGENDADOR_HORIZONTE_HORAS", cls.horasHorizonte)),
+            sincronizacao=float(os.environ.get("BARBEARIA_AGENDADOR_SINCRONIZACAO", cls.sincronizacao)))
+        if config.sincronizacao <= 0 or config.horasHorizonte * 3600 <= 2 * config.sincronizacao:
+            raise ValueError("O horizonte do agendador deve ser maior que duas sincronizações.")
+        return config
+
+
+def inicioAgendamento(agendamento: Agendamento):
+    return datetime.combine(agendamento.data, agendamento.hora)
+
+
+def atrasoConta(conta: Conta):
+    """
+    Momento em que uma conta ativa passa a estar em atraso: o início do dia seguinte ao vencimento.
+    """
+    return datetime.combine(conta.vencimento + timedelta(days=1), time.min)
+
+
+class Agendador:
+    """
+    Executa, em segundo plano, as ações que dependem da hora: marca as contas vencidas como
+    "Atraso" e envia o lembrete de cada agendamento; também envia a notificação de cada novo
+    agendamento. Nenhuma requisição percorre contas ou agendamentos para isso.
+
+    Os eventos ficam em um heap de temporizadores, por momento; a tarefa dorme até o primeiro
+    vencer ou até um evento mais próximo ser programado. Os endpoints programam os eventos dos
+    registros que criam ou alteram (programarConta, programarLembrete e notificarAgendamento), em
+    O(log n). Alterações e exclusões não removem entradas do heap: _programados guarda o momento
+    vigente de cada evento, uma entrada diferente dele é ignorada, e o registro é lido de novo
+    antes da ação, que só acontece se ainda fizer sentido. A troca para "Atraso" é um
+    compare-and-set, então uma conta paga nesse meio-tempo não é alterada.
+
+    Apenas os eventos dentro do horizonte ficam no heap. A janela é carregada na inicialização e
+    relida periodicamente por consultas por faixa nos índices de contas por (status, vencimento) e
+    de agendamentos por data, não pela tabela inteira. Com vários workers (SQLite), só o que detém
+    a trava "agendador" executa os eventos; os outros assumem se ele parar de renová-la. Lembretes
+    cujo momento já passou ao carregar a janela não são enviados, pois podem já ter sido enviados
+    antes de uma reinicialização; os agendamentos feitos em cima da hora recebem o lembrete na hora.
+    """
+
+    def __init__(self, repositorio, entregador: EntregadorNotificacoes, config: ConfiguracaoAgendador = None,
+                 relogio=datetime.now):
+        self.repositorio = repositorio
+        self.entregador = entregador
+        self.config = config or ConfiguracaoAgendador()
+        self.relogio = relogio
+        self.dono = uuid.uuid4().hex
+        self.lider = False
+        self.logger = logging.getLogger("barbearia.agendador")
+        self.contasAtrasadas = 0
+        self.lembretesEnviados = 0
+        self._heap = []
+        self._programados = {}
+        self._carregadoAte = None
+        self._versoes = None
+        self._acordar = None
+        self._tarefa = None
+
+    @property
+    def antecedencia(self):
+        return timedelta(minutes=self.config.lembreteMinutos)
+
+    @property
+    def horizonte(self):
+        return timedelta(hours=self.config.horasHorizonte)
+
+    def _programar(self, chave: tuple, momento: datetime):
+        if self._programados.get(chave) == momento:
+            return
+        self._programados[chave] = momento
+        heapq.heappush(self._heap, (momento, chave))
+        if self._acordar is not None and self._heap[0][1] == chave:
+            self._acordar.set()
+
+    def _cancelar(self, chave: tuple):
+        self._programados.pop(chave, None)
+
+    def _dentroDaJanela(self, momento: datetime):
+        """
+        Indica se o evento deve ir para o heap: desde a primeira carga, tudo até o fim do horizonte
+        a partir de agora, que pode ir além da janela carregada; o resto entra em uma próxima carga.
+        """
+        return self._carregadoAte is not None and momento <= self.relogio() + self.horizonte
+
+    def programarConta(self, conta: Conta):
+        """
+        Programa a troca da conta para "Atraso" ao fim do dia do vencimento, ou cancela a troca se
+        a conta não estiver mais ativa.
+        """
+        chave = ("conta", conta.id)
+        momento = atrasoConta(conta)
+        if conta.status == "Ativa" and self._dentroDaJanela(momento):
+            self._programar(chave, momento)
+        else:
+            self._cancelar(chave)
+
+    def programarLembrete(self, agendamento: Agendamento, atrasado: bool = True):
+        """
+        Programa o lembrete do agendamento para lembreteMinutos antes do horário. Com atrasado, um
+        lembrete cujo momento já passou é enviado imediatamente, se o agendamento ainda não começou.
+        """
+        chave = ("lembrete", agendamento.id)
+        inicio = inicioAgendamento(agendamento)
+        momento = inicio - self.antecedencia
+        agora = self.relogio()
+        if inicio <= agora or not self._dentroDaJanela(momento):
+            self._cancelar(chave)
+        elif atrasado or momento >= agora:
+            self._programar(chave, momento)
+
+    def notificarAgendamento(self, agendamento: Agendamento):
+        """
+        Envia a notificação de novo agendamento e programa o seu lembrete.
+        """
+        if self._tarefa is None:
+            return
+        self.entregador.enviar(Notificacao("agendamento_novo", agendamento.paraDicionario()))
+        self.programarLembrete(agendamento)
+
+    async def _paginas(self, consulta: Consulta):
+        """
+        Percorre todas as páginas da consulta, usando o cursor de cada página.
+        """
+        while True:
+            pagina = await self.repositorio.listarPagina(consulta)
+            for registro in pagina.itens:
+                yield registro
+            if pagina.proximo is None:
+                return
+            consulta.apos = chaveOrdenacao(consulta.tabela, consulta.ordem, pagina.itens[-1])
+
+    async def carregar(self):
+        """
+        Carrega os eventos da janela: as contas ativas que vencem até o fim do horizonte (inclusive
+        as já vencidas) e os lembretes dos agendamentos que começam até lá. O fim da janela só é
+        atualizado depois da leitura.
+        """
+        agora = self.relogio()
+        self._versoes = await self.repositorio.versoesDados()
+        ate = agora + self.horizonte
+        if self._carregadoAte is None:
+            self._carregadoAte = agora
+        contas = Consulta("contas", "vencimento", status="Ativa", fim=(ate - timedelta(days=1)).date(),
+                          limite=LIMITE_MAXIMO)
+        async for conta in self._paginas(contas):
+            self.programarConta(conta)
+        agendamentos = Consulta("agendamentos", "data", inicio=agora.date(),
+                                fim=(ate + self.antecedencia).date(), limite=LIMITE_MAXIMO)
+        async for agendamento in self._paginas(agendamentos):
+            self.programarLembrete(agendamento, atrasado=False)
+        self._carregadoAte = ate
+
+    async def sincronizar(self):
+        """
+        Renova a trava do agendador e relê a janela ao assumir a trava, quando agendamentos ou contas
+        mudaram ou quando a janela estiver na metade.
+        """
+        lider = await self.repositorio.renovarTrava("agendador", self.dono, 3 * self.config.sincronizacao)
+        assumiu, self.lider = lider and not self.lider, lider
+        if not lider:
+            return
+        versoes = await self.repositorio.versoesDados()
+        alteradas = self._versoes is None or any(versoes.get(tabela) != self._versoes.get(tabela)
+                                                 for tabela in TABELAS_PROGRAMADAS)
+        if assumiu or alteradas or self.relogio() + self.horizonte / 2 > self._carregadoAte:
+            await self.carregar()
+
+    async def _marcarAtraso(self, identificador: int):
+        conta = await self.repositorio.obterConta(identificador)
+        if conta is None or conta.status != "Ativa" or atrasoConta(conta) > self.relogio():
+            return
+        if await self.repositorio.alterarStatusConta(identificador, "Atraso", anterior="Ativa"):
+            conta.status = "Atraso"
+            self.contasAtrasadas += 1
+            self.entregador.enviar(Notificacao("conta_atrasada", conta.paraDicionario()))
+
+    async def _lembrar(self, identificador: int, momento: datetime):
+        agendamento = await self.repositorio.obterAgendamento(identificador)
+        if agendamento is None or inicioAgendamento(agendamento) - self.antecedencia != momento:
+            return
+        if inicioAgendamento(agendamento) > self.relogio():
+            self.lembretesEnviados += 1
+            self.entregador.enviar(Notificacao("lembrete", agendamento.paraDicionario()))
+
+    async def _dispararVencidos(self):
+        """
+        Executa os eventos cujo momento já chegou, ignorando as entradas substituídas ou canceladas.
+        Retorna o momento do próximo evento, ou None.
+        """
+        agora = self.relogio()
+        while self._heap and self._heap[0][0] <= agora:
+            momento, chave = heapq.heappop(self._heap)
+            if self._programados.get(chave) != momento:
+                continue
+            del self._programados[chave]
+            if not self.lider:
+                continue
+            tipo, identificador = chave
+            try:
+                if tipo == "conta":
+                    await self._marcarAtraso(identificador)
+                else:
+                    await self._lembrar(identificador, momento)
+            except Exception:
+                self.logger.exception("falha ao executar o evento %s", chave)
+        return self._heap[0][0] if self._heap else None
+
+    async def _executar(self):
+        proximaSincronizacao = asyncio.get_running_loop().time() + self.config.sincronizacao
+        while True:
+            relogio = asyncio.get_running_loop().time()
+            if relogio >= proximaSincronizacao:
+                try:
+                    await self.sincronizar()
+                except Exception:
+                    self.logger.exception("falha ao sincronizar o agendador")
+                proximaSincronizacao = relogio + self.config.sincronizacao
+            proximo = await self._dispararVencidos()
+            espera = proximaSincronizacao - asyncio.get_running_loop().time()
+            if proximo is not None:
+                espera = min(espera, (proximo - self.relogio()).total_seconds())
+            self._acordar.clear()
+            if espera > 0:
+                try:
+                    await asyncio.wait_for(self._acordar.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+
+    def acordar(self):
+        """
+        Faz a tarefa verificar o heap imediatamente (por exemplo, depois de ajustar o relógio).
+        """
+        if self._acordar is not None:
+            self._acordar.set()
+
+    async def iniciar(self):
+        """
+        Carrega a janela de eventos e inicia as tarefas do agendador e do entregador.
+        """
+        if self._tarefa is not None:
+            return
+        self.entregador.iniciar()
+        self._acordar = asyncio.Event()
+        await self.sincronizar()
+        self._tarefa = asyncio.create_task(self._executar())
+
+    async def parar(self):
+        """
+        Interrompe a tarefa do agendador, libera a trava e entrega as notificações pendentes.
+        """
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+            if self.lider:
+                # Libera a trava para que outro worker assuma sem esperar a expiração.
+                await self.repositorio.renovarTrava("agendador", self.dono, 0)
+                self.lider = False
+        await self.entregador.parar()
@@ -0,0 +1,274 @@
+"""
+Benchmark do agendador em segundo plano.
+
+Com milhares de contas e agendamentos, compara o custo por requisição de uma solução ingênua, que
+a cada requisição percorre as contas ativas para marcar as vencidas e os agendamentos do dia para
+os lembretes, com o agendador, em que as requisições não fazem nada disso. Mede também o tempo
+para carregar a janela de eventos e marcar as contas vencidas, e a entrega das notificações de
+centenas de agendamentos feitos ao mesmo tempo, em lotes, para um destino que falha às vezes.
+
+Confere que cada conta vencida recebe exatamente uma notificação, que contas pagas e agendamentos
+excluídos ou remarcados não geram eventos, que o lembrete sai no momento certo (com um relógio
+adiantado artificialmente) e, no SQLite, que só um de dois agendadores executa os eventos e que o
+outro assume quando o primeiro para.
+
+Uso: python -m benchmarks.agendador [--backend memoria|sqlite] [--registros 100000] [--agendamentos 500]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+os.environ["BARBEARIA_LOG"] = "0"
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from agendador import Agendador, ConfiguracaoAgendador
+from modelos import Agendamento, Conta
+from notificacoes import ConfiguracaoNotificacoes, DestinoFila, EntregadorNotificacoes
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+REPETICOES = 200
+# As falhas simuladas do destino são esperadas; só os descartes interessam.
+logging.getLogger("barbearia.notificacoes").setLevel(logging.ERROR)
+
+
+class Relogio:
+    """
+    Relógio com um desvio ajustável, para simular a passagem do tempo.
+    """
+
+    def __init__(self):
+        self.desvio = timedelta()
+
+    def __call__(self):
+        return datetime.now() + self.desvio
+
+    def avancarPara(self, momento: datetime):
+        self.desvio = momento - datetime.now()
+
+
+class DestinoInstavel(DestinoFila):
+    """
+    Destino em fila que recusa a primeira tentativa de um a cada três lotes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chamadas = 0
+
+    async def entregar(self, notificacoes: list):
+        self.chamadas += 1
+        if self.chamadas % 3 == 1:
+            raise ConnectionError("destino indisponível")
+        await super().entregar(notificacoes)
+
+
+def criarAgendador(repositorio, destino, relogio, sincronizacao: float = 0.2):
+    entregador = EntregadorNotificacoes(destino, ConfiguracaoNotificacoes(esperaLote=0.05, esperaTentativa=0.01))
+    return Agendador(repositorio, entregador, ConfiguracaoAgendador(sincronizacao=sincronizacao), relogio)
+
+
+def recebidas(destino: DestinoFila):
+    notificacoes = []
+    while not destino.fila.empty():
+        notificacoes.append(destino.fila.get_nowait())
+    return notificacoes
+
+
+async def esperar(condicao, limite: float = 30.0):
+    inicio = time.perf_counter()
+    while not condicao():
+        assert time.perf_counter() - inicio < limite, "tempo esgotado esperando o agendador"
+        await asyncio.sleep(0.01)
+    return time.perf_counter() - inicio
+
+
+async def popular(repositorio, quantidade: int, gerador: random.Random):
+    """
+    Contas pagas, ativas no futuro e algumas vencidas; agendamentos espalhados por um ano.
+    Retorna os ids das contas vencidas.
+    """
+    hoje = date.today()
+    vencidas = set()
+    for i in range(quantidade):
+        vencimento = hoje + timedelta(days=gerador.randint(-365, 365))
+        if i % 100 == 0:
+            conta = Conta.deTexto(f"Conta {i}", "10.00", (hoje - timedelta(days=1 + i % 30)).isoformat())
+        else:
+            conta = Conta.deTexto(f"Conta {i}", "10.00", vencimento.isoformat(),
+                                  "Ativa" if vencimento >= hoje else "Paga")
+        await repositorio.adicionarConta(conta)
+        if conta.status == "Ativa" and conta.vencimento < hoje:
+            vencidas.add(conta.id)
+        await repositorio.adicionarAgendamento(Agendamento(
+            f"Cliente {i}", "Corte", hoje + timedelta(days=gerador.randint(2, 365)),
+            datetime.strptime(f"{9 + i % 12:02d}:00", "%H:%M").time(), barbeiro="Barbeiro"))
+    return vencidas
+
+
+async def varreduraIngenua(repositorio, agora: datetime):
+    """
+    O que cada requisição faria sem o agendador: percorrer as contas ativas e os agendamentos.
+    """
+    for conta in await repositorio.listarContasStatus(["Ativa"]):
+        if conta.vencimento < agora.date():
+            await repositorio.alterarStatusConta(conta.id, "Atraso", anterior="Ativa")
+    proximos = [agendamento for agendamento in await repositorio.listarAgendamentos(agora.date())
+                if agora <= datetime.combine(agendamento.data, agendamento.hora) <= agora + timedelta(hours=1)]
+    return proximos
+
+
+async def medirRequisicoes(cliente, repositorio, ingenua: bool):
+    latencias = []
+    for _ in range(REPETICOES):
+        inicio = time.perf_counter()
+        if ingenua:
+            await varreduraIngenua(repositorio, datetime.now())
+        assert (await cliente.get("/api/contas?limite=20")).status_code == 200
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(latencias)
+
+
+async def conferirEventos(repositorio, cliente, relogio: Relogio, destino: DestinoFila, agendador: Agendador):
+    """
+    Cancelamentos, remarcações e o lembrete no momento certo, com o relógio adiantado.
+    """
+    amanha = date.today() + timedelta(days=1)
+    entregues = agendador.entregador.entregues
+    paga = Conta.deTexto("Paga antes", "5.00", date.today().isoformat())
+    await repositorio.adicionarConta(paga)
+    agendador.programarConta(paga)
+    await repositorio.alterarStatusConta(paga.id, "Paga")
+    for hora in ("10:00", "11:00", "12:00"):
+        resposta = await cliente.post("/agendar", data={"servico": "Corte", "data": amanha.isoformat(), "hora": hora,
+                                                        "barbeiro": "Barbeiro"})
+        assert resposta.status_code == 303, resposta.text
+    feitos = sorted((await repositorio.listarAgendamentosData(amanha)), key=lambda agendamento: agendamento.hora)
+    feitos = [agendamento for agendamento in feitos if agendamento.cliente == "Bench"]
+    await repositorio.removerAgendamento(feitos[1].id)
+    resposta = await cliente.post(f"/alterar_agendamento/{feitos[2].id}", data={
+        "servico": "Corte", "data": amanha.isoformat(), "hora": "15:00", "barbeiro": "Barbeiro"})
+    assert resposta.status_code == 303, resposta.text
+    await esperar(lambda: agendador.entregador.entregues >= entregues + 3)
+    recebidas(destino)
+
+    relogio.avancarPara(datetime.combine(amanha, datetime.min.time()) + timedelta(hours=9, seconds=1))
+    agendador.acordar()
+    await esperar(lambda: agendador.lembretesEnviados >= 1)
+    # A janela avança com o relógio na próxima sincronização, e com ela o lembrete remarcado.
+    await esperar(lambda: agendador._carregadoAte >= datetime.combine(amanha, datetime.min.time()) + timedelta(hours=14))
+    relogio.avancarPara(datetime.combine(amanha, datetime.min.time()) + timedelta(hours=14, seconds=1))
+    agendador.acordar()
+    notificacoes = []
+    await esperar(lambda: notificacoes.extend(recebidas(destino))
+                  or sum(notificacao.tipo == "lembrete" for notificacao in notificacoes) >= 2)
+    await asyncio.sleep(0.5)
+    notificacoes.extend(recebidas(destino))
+    lembretes = sorted(notificacao.dados["hora"] for notificacao in notificacoes if notificacao.tipo == "lembrete")
+    assert lembretes == ["10:00", "15:00"], lembretes
+    atrasadas = [notificacao.dados["id"] for notificacao in notificacoes if notificacao.tipo == "conta_atrasada"]
+    assert paga.id not in atrasadas and (await repositorio.obterConta(paga.id)).status == "Paga"
+    relogio.desvio = timedelta()
+
+
+async def conferirTrava(caminho: str):
+    """
+    Dois agendadores no mesmo banco: só um executa os eventos, e o outro assume quando ele para.
+    """
+    repositorios = [RepositorioSQLite(caminho), RepositorioSQLite(caminho)]
+    destinos = [DestinoFila(), DestinoFila()]
+    agendadores = [criarAgendador(repositorio, destino, Relogio(), 0.1)
+                   for repositorio, destino in zip(repositorios, destinos)]
+    for agendador in agendadores:
+        await agendador.iniciar()
+    assert [agendador.lider for agendador in agendadores] == [True, False], "mais de um líder"
+    vencida = Conta.deTexto("Vencida", "1.00", (date.today() - timedelta(days=1)).isoformat())
+    await repositorios[1].adicionarConta(vencida)
+    await esperar(lambda: agendadores[0].contasAtrasadas == 1)
+    await agendadores[0].parar()
+    outra = Conta.deTexto("Vencida 2", "1.00", (date.today() - timedelta(days=1)).isoformat())
+    await repositorios[1].adicionarConta(outra)
+    segundos = await esperar(lambda: agendadores[1].contasAtrasadas == 1)
+    assert agendadores[1].lider
+    await agendadores[1].parar()
+    assert destinos[1].fila.qsize() == 1, "notificação duplicada ou perdida após a troca de líder"
+    for repositorio in repositorios:
+        await repositorio.fechar()
+    return segundos
+
+
+async def executar(backend: str, quantidade: int, agendamentos: int):
+    gerador = random.Random(19)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "bench.db")
+        repositorio = RepositorioSQLite(caminho) if backend == "sqlite" else RepositorioMemoria()
+        vencidas = await popular(repositorio, quantidade, gerador)
+        main.repositorio = repositorio
+        relogio = Relogio()
+        destino = DestinoInstavel()
+        agendador = main.agendador = criarAgendador(repositorio, destino, relogio, sincronizacao=0.5)
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            await cliente.post("/cadastro", data={"nome": "Bench", "email": "bench@barbearia",
+                                                  "usuario": "bench", "senha": "bench"})
+            assert (await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})).status_code == 303
+            print(f"backend {backend}: {quantidade} contas e {quantidade} agendamentos, {len(vencidas)} contas vencidas")
+            print(f"{'GET /api/contas (p50 ms)':<42} | {'ms':>8}")
+            ingenua = await medirRequisicoes(cliente, repositorio, True)
+            for conta in await repositorio.listarContasStatus(["Atraso"]):
+                await repositorio.alterarStatusConta(conta.id, "Ativa")
+            print(f"{'varredura a cada requisição':<42} | {ingenua:>8.3f}")
+
+            inicio = time.perf_counter()
+            await agendador.iniciar()
+            carga = time.perf_counter() - inicio
+            marcacao = await esperar(lambda: agendador.contasAtrasadas == len(vencidas)) + carga
+            print(f"{'com o agendador':<42} | {await medirRequisicoes(cliente, repositorio, False):>8.3f}")
+            print(f"\n{'agendador':<42} | {'s':>8}")
+            print(f"{'carregar a janela de eventos':<42} | {carga:>8.3f}")
+            print(f"{f'marcar {len(vencidas)} contas vencidas':<42} | {marcacao:>8.3f}")
+            await esperar(lambda: agendador.entregador.entregues == len(vencidas))
+            atrasadas = [notificacao.dados["id"] for notificacao in recebidas(destino)]
+            assert sorted(atrasadas) == sorted(vencidas), "notificações de contas vencidas incorretas"
+            assert len(await repositorio.listarContasStatus(["Atraso"])) == len(vencidas)
+
+            dia = date.today() + timedelta(days=400)
+            horas = [f"{h:02d}:{m:02d}" for h in range(9, 23) for m in (0, 30)]
+            lotes = agendador.entregador.lotes
+            inicio = time.perf_counter()
+            respostas = await asyncio.gather(*(cliente.post("/agendar", data={
+                "servico": "Barba", "data": (dia + timedelta(days=i // len(horas))).isoformat(),
+                "hora": horas[i % len(horas)], "barbeiro": "Barbeiro"}) for i in range(agendamentos)))
+            assert all(resposta.status_code == 303 for resposta in respostas)
+            await esperar(lambda: agendador.entregador.entregues == len(vencidas) + agendamentos)
+            entrega = time.perf_counter() - inicio
+            novos = recebidas(destino)
+            assert len(novos) == agendamentos and {n.tipo for n in novos} == {"agendamento_novo"}
+            assert agendador.entregador.descartadas == 0
+            print(f"{f'{agendamentos} agendamentos notificados':<42} | {entrega:>8.3f}"
+                  f"   ({agendador.entregador.lotes - lotes} lotes, {destino.chamadas} chamadas ao destino)")
+
+            await conferirEventos(repositorio, cliente, relogio, destino, agendador)
+            await agendador.parar()
+        await repositorio.fechar()
+        if backend == "sqlite":
+            segundos = await conferirTrava(os.path.join(pasta, "trava.db"))
+            print(f"{'troca de líder entre dois workers':<42} | {segundos:>8.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=("memoria", "sqlite"), default="memoria")
+    parser.add_argument("--registros", type=int, default=100_000)
+    parser.add_argument("--agendamentos", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(executar(args.backend, args.registros, args.agendamentos))
@@ -0,0 +1,87 @@
+"""
+Benchmark de vazão dos backends de armazenamento.
+
+Compara o backend em memória com o SQLite (WAL) nos endpoints de agendamento (POST /agendar)
+e de listagem (GET /agendamentos, GET /contas), usando um cliente ASGI em processo.
+
+Uso: python -m benchmarks.armazenamento [--agendamentos 2000] [--requisicoes 500]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+import httpx
+
+import main
+from modelos import Agendamento, Conta
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+HORAS = [f"{h:02d}:00" for h in range(9, 23)]
+
+
+async def popular(repositorio, quantidade: int):
+    await repositorio.adicionarUsuario({"nome": "Bench", "email": "bench@barbearia",
+                                        "usuario": "bench", "senha": "bench"})
+    inicio = date(2000, 1, 1)
+    for i in range(quantidade):
+        await repositorio.adicionarAgendamento(Agendamento.deTexto(
+            "Bench", "Corte", (inicio + timedelta(days=i // len(HORAS))).isoformat(), HORAS[i % len(HORAS)]))
+        await repositorio.adicionarConta(Conta.deTexto(f"Conta {i}", "10.00", "2030-01-01"))
+
+
+async def vazao(cliente, requisicoes: int, concorrencia: int, fazerRequisicao):
+    fila = iter(range(requisicoes))
+
+    async def trabalhador():
+        for i in fila:
+            resposta = await fazerRequisicao(cliente, i)
+            assert resposta.status_code in (200, 303), resposta.status_code
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    return requisicoes / (time.perf_counter() - inicio)
+
+
+def agendar(cliente, i):
+    dia = date(2100, 1, 1) + timedelta(days=i // len(HORAS))
+    return cliente.post("/agendar", data={"servico": "Corte", "data": dia.isoformat(),
+                                          "hora": HORAS[i % len(HORAS)]})
+
+
+async def medir(repositorio, args):
+    main.repositorio = repositorio
+    await popular(repositorio, args.agendamentos)
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})
+        resultados = {
+            "POST /agendar": await vazao(cliente, args.requisicoes, args.concorrencia, agendar),
+            "GET /agendamentos": await vazao(cliente, args.requisicoes // 10, args.concorrencia,
+                                             lambda c, i: c.get("/agendamentos")),
+            "GET /contas": await vazao(cliente, args.requisicoes // 10, args.concorrencia,
+                                       lambda c, i: c.get("/contas")),
+        }
+    await repositorio.fechar()
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agendamentos", type=int, default=2000)
+    parser.add_argument("--requisicoes", type=int, default=500)
+    parser.add_argument("--concorrencia", type=int, default=16)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        backends = {
+            "memoria": lambda: RepositorioMemoria(),
+            "sqlite": lambda: RepositorioSQLite(os.path.join(pasta, "bench.db"), 4),
+        }
+        print(f"{'backend':>8} | {'endpoint':>18} | {'req/s':>8}")
+        for nome, criar in backends.items():
+            for endpoint, valor in asyncio.run(medir(criar(), args)).items():
+                print(f"{nome:>8} | {endpoint:>18} | {valor:>8.0f}")
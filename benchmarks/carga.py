@@ -0,0 +1,361 @@
+"""
+Teste de carga da aplicação, com resultado em JSON e comparação com uma referência.
+
+Popula o repositório com dados gerados a partir de uma semente (usuários, agendamentos, produtos e
+contas, em uma escala configurável) e roda os cenários com um cliente ASGI em processo, um
+cliente (com o seu cookie) por usuário simulado:
+
+- agendar: cada usuário faz login e repete consultar os horários, agendar e listar os agendamentos;
+- painel: cada usuário faz login e atualiza a página inicial e as listagens da API;
+- relatorio: downloads dos relatórios Excel e PDF de períodos diferentes, sem acertos no cache.
+
+Também mede diretamente obterHorariosDisponiveis (sem e com o cache de disponibilidade) e os
+geradores dos relatórios. Para cada cenário registra a vazão e, para cada etapa, a quantidade, os
+erros e a latência p50/p95/p99. A tabela vai para a saída de erros e o JSON para a saída padrão
+(e para --saida). Com --comparar, o resultado é conferido contra um JSON gerado antes com a mesma
+configuração: se alguma latência subir ou alguma vazão cair além da tolerância, as regressões são
+listadas e o comando termina com status 1.
+
+Uso: python -m benchmarks.carga [--backend memoria|sqlite] [--escala 1.0] [--usuarios 200]
+     [--iteracoes 5] [--relatorios 20] [--semente 21] [--saida resultado.json]
+     [--comparar referencia.json] [--tolerancia 0.5]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ["BARBEARIA_LOG"] = "0"
+# Todos os usuários simulados fazem login do mesmo endereço ao mesmo tempo.
+os.environ.setdefault("BARBEARIA_LOGIN_TENTATIVAS_IP", "0")
+os.environ.setdefault("BARBEARIA_SENHAS_PENDENTES", "100000")
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from modelos import Agendamento, Conta, Produto
+from relatorios import ABAS, encerrarExecutor, gerarExcel, gerarPDF
+from repositorio import RepositorioMemoria, RepositorioSQLite
+from senhas import ParametrosScrypt, gerarHash
+
+# Registros de cada tabela na escala 1.
+ESCALA_BASE = {"agendamentos": 10_000, "produtos": 2_000, "contas": 5_000}
+SERVICOS = ("Corte", "Barba", "Sobrancelha", "Reflexo")
+HORAS_HISTORICO = [f"{h:02d}:{m:02d}" for h in range(9, 21) for m in (0, 15, 30, 45)]
+# Um Corte (45 minutos) por hora, para que os agendamentos do cenário nunca se sobreponham.
+HORAS_CENARIO = [f"{h:02d}:00" for h in range(9, 22)]
+DIAS_RELATORIO = 30
+DIAS_DISPONIBILIDADE = 90
+# Diferença mínima, em ms, para uma latência maior contar como regressão.
+MINIMO_REGRESSAO_MS = 5.0
+MINIMO_AMOSTRAS = 20
+
+
+async def popular(repositorio, escala: float, usuarios: int, gerador: random.Random):
+    """
+    Gera os dados a partir do gerador: usuarioN/senhaN com o hash de senha da configuração,
+    agendamentos de 180 dias antes a 180 dias depois de hoje, produtos com validades até dois anos
+    à frente e contas pagas, em atraso e ativas conforme o vencimento.
+    """
+    parametros = ParametrosScrypt.deAmbiente()
+    for i in range(usuarios):
+        await repositorio.adicionarUsuario({"nome": f"Cliente {i}", "email": f"cliente{i}@barbearia",
+                                            "usuario": f"usuario{i}", "senha": gerarHash(f"senha{i}", parametros)})
+    hoje = date.today()
+    for _ in range(int(ESCALA_BASE["agendamentos"] * escala)):
+        dia = hoje + timedelta(days=gerador.randint(-180, 180))
+        await repositorio.adicionarAgendamento(Agendamento.deTexto(
+            f"Cliente {gerador.randrange(usuarios)}", gerador.choice(SERVICOS), dia.isoformat(),
+            gerador.choice(HORAS_HISTORICO)))
+    for i in range(int(ESCALA_BASE["produtos"] * escala)):
+        await repositorio.adicionarProduto(Produto(
+            f"Produto {i}", gerador.randint(0, 100), hoje + timedelta(days=gerador.randint(-30, 720))))
+    for i in range(int(ESCALA_BASE["contas"] * escala)):
+        vencimento = hoje + timedelta(days=gerador.randint(-365, 180))
+        if vencimento >= hoje:
+            status = "Ativa"
+        else:
+            status = "Paga" if gerador.random() < 0.9 else "Atraso"
+        await repositorio.adicionarConta(Conta.deTexto(
+            f"Conta {i}", f"{gerador.randint(1_000, 500_000) / 100:.2f}", vencimento.isoformat(), status))
+
+
+def resumir(latencias: list):
+    if len(latencias) > 1:
+        percentis = statistics.quantiles(latencias, n=100, method="inclusive")
+        p50, p95, p99 = percentis[49], percentis[94], percentis[98]
+    else:
+        p50 = p95 = p99 = latencias[0]
+    return {"n": len(latencias), "min_ms": round(min(latencias), 3), "p50_ms": round(p50, 3), "p95_ms": round(p95, 3), "p99_ms": round(p99, 3),
+            "max_ms": round(max(latencias), 3)}
+
+
+class Medicoes:
+    """
+    Latências e erros de cada etapa de um cenário. Uma resposta com status fora dos esperados
+    ou uma exceção contam como erro.
+    """
+
+    def __init__(self):
+        self.latencias = {}
+        self.erros = {}
+        self.inicio = time.perf_counter()
+
+    async def requisitar(self, etapa: str, chamada, esperados: tuple = (200,)):
+        inicio = time.perf_counter()
+        try:
+            resposta = await chamada
+        except Exception:
+            resposta = None
+        self.latencias.setdefault(etapa, []).append((time.perf_counter() - inicio) * 1000)
+        if resposta is None or resposta.status_code not in esperados:
+            self.erros[etapa] = self.erros.get(etapa, 0) + 1
+        return resposta
+
+    def resultado(self):
+        duracao = time.perf_counter() - self.inicio
+        requisicoes = sum(len(latencias) for latencias in self.latencias.values())
+        return {
+            "requisicoes": requisicoes,
+            "erros": sum(self.erros.values()),
+            "duracao_s": round(duracao, 3),
+            "vazao_rps": round(requisicoes / duracao, 1),
+            "etapas": {etapa: dict(resumir(latencias), erros=self.erros.get(etapa, 0))
+                       for etapa, latencias in self.latencias.items()}
+        }
+
+
+def cliente(transporte):
+    return httpx.AsyncClient(transport=transporte, base_url="http://carga")
+
+
+async def entrar(medicoes: Medicoes, sessao: httpx.AsyncClient, i: int):
+    await medicoes.requisitar("POST /login", sessao.post("/login", data={"usuario": f"usuario{i}",
+                                                                         "senha": f"senha{i}"}), (303,))
+
+
+async def cenarioAgendar(transporte, usuarios: int, iteracoes: int):
+    """
+    login → (GET /agendar → POST /agendar → GET /agendamentos) × iteracoes, em horários distintos
+    para cada usuário e iteração, mais de um ano à frente dos dados gerados.
+    """
+    medicoes = Medicoes()
+    primeiroDia = date.today() + timedelta(days=400)
+
+    async def usuario(i: int):
+        async with cliente(transporte) as sessao:
+            await entrar(medicoes, sessao, i)
+            for iteracao in range(iteracoes):
+                vaga = i * iteracoes + iteracao
+                dia = (primeiroDia + timedelta(days=vaga // len(HORAS_CENARIO))).isoformat()
+                await medicoes.requisitar("GET /agendar", sessao.get("/agendar", params={"data": dia,
+                                                                                         "servico": "Corte"}))
+                await medicoes.requisitar("POST /agendar", sessao.post("/agendar", data={
+                    "servico": "Corte", "data": dia, "hora": HORAS_CENARIO[vaga % len(HORAS_CENARIO)]}), (303,))
+                await medicoes.requisitar("GET /agendamentos", sessao.get("/agendamentos"))
+
+    await asyncio.gather(*(usuario(i) for i in range(usuarios)))
+    return medicoes.resultado()
+
+
+async def cenarioPainel(transporte, usuarios: int, iteracoes: int):
+    """
+    login → (GET / → GET /api/agendamentos → GET /api/estoque/baixo → GET /api/contas) × iteracoes.
+    """
+    medicoes = Medicoes()
+    hoje = date.today().isoformat()
+
+    async def usuario(i: int):
+        async with cliente(transporte) as sessao:
+            await entrar(medicoes, sessao, i)
+            for _ in range(iteracoes):
+                await medicoes.requisitar("GET /", sessao.get("/"))
+                await medicoes.requisitar("GET /api/agendamentos", sessao.get(
+                    "/api/agendamentos", params={"ordem": "data", "inicio": hoje}))
+                await medicoes.requisitar("GET /api/estoque/baixo", sessao.get("/api/estoque/baixo"))
+                await medicoes.requisitar("GET /api/contas", sessao.get(
+                    "/api/contas", params={"ordem": "vencimento", "status": "Ativa"}))
+
+    await asyncio.gather(*(usuario(i) for i in range(usuarios)))
+    return medicoes.resultado()
+
+
+async def cenarioRelatorio(transporte, relatorios: int, concorrencia: int = 4):
+    """
+    Downloads alternados de Excel e PDF, cada um de um período de DIAS_RELATORIO dias diferente,
+    para que todos sejam gerados, com concorrencia usuários ao mesmo tempo.
+    """
+    medicoes = Medicoes()
+    primeiroDia = date.today() - timedelta(days=180)
+    fila = iter(range(relatorios))
+
+    async def usuario(i: int):
+        async with cliente(transporte) as sessao:
+            await entrar(medicoes, sessao, i)
+            for n in fila:
+                formato = "excel" if n % 2 == 0 else "pdf"
+                inicio = primeiroDia + timedelta(days=n)
+                await medicoes.requisitar(f"GET /relatorio/{formato}", sessao.get(
+                    f"/relatorio/{formato}", params={"inicio": inicio.isoformat(),
+                                                     "fim": (inicio + timedelta(days=DIAS_RELATORIO - 1)).isoformat()}))
+
+    await asyncio.gather(*(usuario(i) for i in range(min(concorrencia, relatorios))))
+    return medicoes.resultado()
+
+
+def medirChamadas(funcao, repeticoes: int):
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return resumir(latencias)
+
+
+async def microbenchmarks(repeticoesRelatorio: int):
+    """
+    obterHorariosDisponiveis nos próximos DIAS_DISPONIBILIDADE dias, primeiro com o cache vazio e
+    depois com ele preenchido, e os geradores de Excel (todos os dados) e PDF (um período).
+    """
+    main.repositorio.cacheDisponibilidade.limpar()
+    dias = [date.today() + timedelta(days=i) for i in range(1, DIAS_DISPONIBILIDADE + 1)]
+    resultado = {}
+    for nome in ("obterHorariosDisponiveis (sem cache)", "obterHorariosDisponiveis (com cache)"):
+        latencias = []
+        for dia in dias:
+            inicio = time.perf_counter()
+            await main.obterHorariosDisponiveis(dia, servico="Corte")
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        resultado[nome] = resumir(latencias)
+
+    dados = await main.obterDadosRelatorio(ABAS)
+    resultado["gerarExcel"] = medirChamadas(lambda: gerarExcel(dados).close(), repeticoesRelatorio)
+    inicio = date.today() - timedelta(days=DIAS_RELATORIO)
+    periodo = await main.obterDadosRelatorio(ABAS, inicio, date.today())
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "relatorio.pdf")
+        resultado["gerarPDF"] = medirChamadas(lambda: gerarPDF(periodo, caminho), repeticoesRelatorio)
+    return resultado
+
+
+def comparar(atual: dict, referencia: dict, tolerancia: float):
+    """
+    Lista as regressões do resultado atual em relação à referência: vazão de um cenário menor que
+    (1 - tolerancia) vezes a de referência, ou latência p50/p95 de uma etapa ou microbenchmark
+    maior que (1 + tolerancia) vezes a de referência e pelo menos MINIMO_REGRESSAO_MS acima dela.
+    Nos microbenchmarks vale o menor tempo das repetições, o menos afetado por ruído. O p99 fica de fora, assim como as etapas dos cenários com menos de MINIMO_AMOSTRAS requisições
+    (como os logins do cenário de relatórios): com poucas amostras elas variam demais entre execuções.
+    """
+    regressoes = []
+
+    def conferirLatencias(nome: str, agora: dict, antes: dict, campos=("p50_ms", "p95_ms")):
+        for campo in campos:
+            if agora[campo] > antes[campo] * (1 + tolerancia) and agora[campo] - antes[campo] >= MINIMO_REGRESSAO_MS:
+                regressoes.append(f"{nome} {campo[:-3]}: {antes[campo]:.3f} ms -> {agora[campo]:.3f} ms")
+
+    for cenario, antes in referencia.get("cenarios", {}).items():
+        agora = atual["cenarios"].get(cenario)
+        if agora is None:
+            continue
+        if agora["vazao_rps"] < antes["vazao_rps"] * (1 - tolerancia):
+            regressoes.append(f"{cenario} vazão: {antes['vazao_rps']:.1f} -> {agora['vazao_rps']:.1f} req/s")
+        for etapa, latencias in antes["etapas"].items():
+            if etapa in agora["etapas"] and latencias["n"] >= MINIMO_AMOSTRAS:
+                conferirLatencias(f"{cenario} {etapa}", agora["etapas"][etapa], latencias)
+    for nome, antes in referencia.get("micro", {}).items():
+        if nome in atual["micro"]:
+            conferirLatencias(nome, atual["micro"][nome], antes, ("min_ms",))
+    return regressoes
+
+
+def imprimir(resultado: dict):
+    saida = sys.stderr
+    print(f"{'cenário / etapa':<44} | {'n':>6} | {'erros':>5} | {'p50 ms':>9} | {'p95 ms':>9} | {'p99 ms':>9}",
+          file=saida)
+    for cenario, dados in resultado["cenarios"].items():
+        print(f"{cenario + ':':<44} | {dados['requisicoes']:>6} | {dados['erros']:>5} | "
+              f"{dados['vazao_rps']:>9.1f} req/s", file=saida)
+        for etapa, e in dados["etapas"].items():
+            print(f"{'  ' + etapa:<44} | {e['n']:>6} | {e['erros']:>5} | {e['p50_ms']:>9.3f} | "
+                  f"{e['p95_ms']:>9.3f} | {e['p99_ms']:>9.3f}", file=saida)
+    for nome, e in resultado["micro"].items():
+        print(f"{nome:<44} | {e['n']:>6} | {'':>5} | {e['p50_ms']:>9.3f} | {e['p95_ms']:>9.3f} | "
+              f"{e['p99_ms']:>9.3f}", file=saida)
+
+
+async def executar(args):
+    gerador = random.Random(args.semente)
+    with tempfile.TemporaryDirectory() as pasta:
+        repositorio = (RepositorioSQLite(os.path.join(pasta, "carga.db")) if args.backend == "sqlite"
+                       else RepositorioMemoria())
+        inicio = time.perf_counter()
+        await popular(repositorio, args.escala, args.usuarios, gerador)
+        carga = time.perf_counter() - inicio
+        main.repositorio = repositorio
+        transporte = httpx.ASGITransport(app=main.app)
+        resultado = {
+            "configuracao": {"backend": args.backend, "escala": args.escala, "usuarios": args.usuarios,
+                             "iteracoes": args.iteracoes, "relatorios": args.relatorios, "semente": args.semente,
+                             "registros": {tabela: int(quantidade * args.escala)
+                                           for tabela, quantidade in ESCALA_BASE.items()}},
+            "ambiente": {"python": platform.python_version(), "plataforma": platform.platform(),
+                         "cpus": os.cpu_count()},
+            "populacao_s": round(carga, 3),
+            "cenarios": {
+                "agendar": await cenarioAgendar(transporte, args.usuarios, args.iteracoes),
+                "painel": await cenarioPainel(transporte, args.usuarios, args.iteracoes),
+                "relatorio": await cenarioRelatorio(transporte, args.relatorios),
+            },
+            "micro": await microbenchmarks(args.repeticoes)
+        }
+        await repositorio.fechar()
+    encerrarExecutor()
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=("memoria", "sqlite"), default="memoria")
+    parser.add_argument("--escala", type=float, default=1.0)
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--iteracoes", type=int, default=5)
+    parser.add_argument("--relatorios", type=int, default=20)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=21)
+    parser.add_argument("--saida")
+    parser.add_argument("--comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.5)
+    args = parser.parse_args()
+
+    resultado = asyncio.run(executar(args))
+    imprimir(resultado)
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    print(texto)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto + "\n")
+    erros = sum(cenario["erros"] for cenario in resultado["cenarios"].values())
+    if erros:
+        print(f"\n{erros} requisições com erro", file=sys.stderr)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            referencia = json.load(arquivo)
+        if referencia.get("configuracao") != resultado["configuracao"]:
+            print("\naviso: a referência foi gerada com outra configuração", file=sys.stderr)
+        regressoes = comparar(resultado, referencia, args.tolerancia)
+        for regressao in regressoes:
+            print(f"regressão: {regressao}", file=sys.stderr)
+        if regressoes:
+            sys.exit(1)
+        print(f"\nsem regressões (tolerância de {args.tolerancia:.0%})", file=sys.stderr)
+    if erros:
+        sys.exit(1)
@@ -0,0 +1,167 @@
+"""
+Benchmark da agenda com vários barbeiros e serviços de durações diferentes.
+
+Preenche a agenda de 20 barbeiros durante 1 ano (cerca de dois terços de cada dia ocupados) e
+mede a latência de: horários livres de um serviço em um dia, somando todos os barbeiros, sem
+cache; GET /api/disponibilidade com janelas de 7, 30 e 90 dias, com o cache vazio, com o cache
+cheio e logo depois de um agendamento no meio da janela (que invalida apenas aquele dia); e a
+recusa de um agendamento em um horário ocupado. Antes de medir, confere os horários livres de
+alguns dias contra uma busca exaustiva, também depois de agendar e cancelar.
+
+Uso: python -m benchmarks.disponibilidade [--backend memoria|sqlite] [--barbeiros 20] [--dias 365]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ["BARBEARIA_LOG"] = "0"
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from agenda import ConfiguracaoAgenda, horaDeMinutos, minutos
+from modelos import Agendamento, formatarHora
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+INICIO = date(2100, 1, 1)
+
+
+async def popular(repositorio, agenda: ConfiguracaoAgenda, quantidadeDias: int):
+    """
+    Preenche cada barbeiro, dia a dia, com serviços aleatórios separados por folgas aleatórias.
+    """
+    aleatorio = random.Random(42)
+    servicos = agenda.servicos
+    abertura, fechamento = minutos(agenda.abertura), minutos(agenda.fechamento)
+    total = 0
+    for dia in (INICIO + timedelta(days=i) for i in range(quantidadeDias)):
+        for barbeiro in agenda.barbeiros:
+            inicio = abertura + agenda.passo * aleatorio.randrange(3)
+            while True:
+                servico = aleatorio.choice(servicos)
+                if inicio + agenda.duracao(servico) > fechamento:
+                    break
+                await repositorio.adicionarAgendamento(Agendamento(
+                    f"Cliente {total}", servico, dia, horaDeMinutos(inicio), barbeiro=barbeiro))
+                total += 1
+                inicio += agenda.duracao(servico) + agenda.passo * aleatorio.choice((0, 0, 1, 2, 4))
+    return total
+
+
+async def conferir(repositorio, agenda: ConfiguracaoAgenda, dia: date, duracao: int):
+    agendamentos = [ag for ag in await repositorio.listarAgendamentos(dia, dia)]
+    esperado = {}
+    for inicio in agenda.inicios(duracao):
+        livres = [barbeiro for barbeiro in agenda.barbeiros
+                  if not any(ag.barbeiro == barbeiro and agenda.intervaloDe(ag)[0] < inicio + duracao
+                             and agenda.intervaloDe(ag)[1] > inicio for ag in agendamentos)]
+        if livres:
+            esperado[horaDeMinutos(inicio)] = tuple(livres)
+    assert (await repositorio.horariosLivres(dia, dia, duracao))[dia] == esperado, "horários livres incorretos"
+
+
+async def medir(funcao, repeticoes: int):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        await funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+async def medirJanela(cliente, repositorio, agenda: ConfiguracaoAgenda, dia: date, janela: int, repeticoes: int):
+    """
+    Mede GET /api/disponibilidade em uma janela de dias: com o cache vazio, com o cache cheio e
+    logo depois de um agendamento no dia do meio da janela. Retorna as três latências em ms.
+    """
+    duracao = agenda.duracao("Corte")
+    parametros = {"inicio": dia.isoformat(), "fim": (dia + timedelta(days=janela - 1)).isoformat(),
+                  "servico": "Corte"}
+
+    async def consultar():
+        inicio = time.perf_counter()
+        resposta = await cliente.get("/api/disponibilidade", params=parametros)
+        decorrido = time.perf_counter() - inicio
+        assert resposta.status_code == 200 and len(resposta.json()["dias"]) == janela, resposta.status_code
+        return decorrido
+
+    frio = 0
+    for _ in range(repeticoes):
+        repositorio.cacheDisponibilidade.limpar()
+        frio += await consultar()
+    quente = sum([await consultar() for _ in range(repeticoes)])
+
+    meio = dia + timedelta(days=janela // 2)
+    aposAgendar = 0
+    for _ in range(repeticoes):
+        livres = (await repositorio.horariosLivres(meio, meio, duracao))[meio]
+        hora, barbeiros = next(iter(livres.items()))
+        agendamento = Agendamento("Bench", "Corte", meio, hora, barbeiro=barbeiros[0])
+        assert await repositorio.agendarSeLivre(agendamento)
+        resposta = await cliente.get("/api/disponibilidade", params={**parametros, "horarios": "true"})
+        horarios = next(item for item in resposta.json()["dias"] if item["data"] == meio.isoformat())["horarios"]
+        assert barbeiros[0] not in horarios.get(formatarHora(hora), ()), "agendamento não refletido no cache"
+        aposAgendar += await consultar()
+        assert await repositorio.removerAgendamento(agendamento.id)
+    await conferir(repositorio, agenda, meio, duracao)
+    return frio / repeticoes * 1000, quente / repeticoes * 1000, aposAgendar / repeticoes * 1000
+
+
+async def executar(repositorio, agenda: ConfiguracaoAgenda, quantidadeDias: int, repeticoes: int):
+    inicio = time.perf_counter()
+    total = await popular(repositorio, agenda, quantidadeDias)
+    print(f"{total} agendamentos de {len(agenda.barbeiros)} barbeiros em {quantidadeDias} dias "
+          f"({time.perf_counter() - inicio:.1f} s para preencher)")
+    duracao = agenda.duracao("Reflexo")
+    for deslocamento in (0, quantidadeDias // 2, quantidadeDias - 1):
+        await conferir(repositorio, agenda, INICIO + timedelta(days=deslocamento), duracao)
+
+    dia = INICIO + timedelta(days=quantidadeDias // 2)
+    ocupado = (await repositorio.listarAgendamentosData(dia))[0]
+
+    async def umDia():
+        repositorio.cacheDisponibilidade.limpar()
+        await repositorio.horariosLivres(dia, dia, duracao)
+
+    async def conflito():
+        assert not await repositorio.agendarSeLivre(Agendamento("Bench", ocupado.servico, ocupado.data, ocupado.hora,
+                                                                barbeiro=ocupado.barbeiro))
+
+    print(f"{'operação':<40} | {'latência (ms)':>13}")
+    for nome, funcao in (("horários livres de 1 dia, sem cache", umDia),
+                         ("recusa de agendamento em conflito", conflito)):
+        print(f"{nome:<40} | {await medir(funcao, repeticoes):>13.3f}")
+
+    main.repositorio = repositorio
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await cliente.post("/cadastro", data={"nome": "Bench", "email": "bench@barbearia",
+                                              "usuario": "bench", "senha": "bench"})
+        assert (await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})).status_code == 303
+        print(f"\n{'GET /api/disponibilidade':<24} | {'sem cache':>9} | {'com cache':>9} | {'após agendar':>12}")
+        for janela in (7, 30, 90):
+            frio, quente, aposAgendar = await medirJanela(cliente, repositorio, agenda, dia, janela,
+                                                          max(1, repeticoes // 10))
+            print(f"{f'{janela} dias':<24} | {frio:>9.2f} | {quente:>9.2f} | {aposAgendar:>12.2f}")
+    await repositorio.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="memoria", choices=["memoria", "sqlite"])
+    parser.add_argument("--barbeiros", type=int, default=20)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--repeticoes", type=int, default=100)
+    args = parser.parse_args()
+
+    agenda = ConfiguracaoAgenda(barbeiros=tuple(f"Barbeiro {i + 1}" for i in range(args.barbeiros)))
+    with tempfile.TemporaryDirectory() as pasta:
+        if args.backend == "sqlite":
+            repositorio = RepositorioSQLite(os.path.join(pasta, "disponibilidade.db"), agenda=agenda)
+        else:
+            repositorio = RepositorioMemoria(agenda)
+        asyncio.run(executar(repositorio, agenda, args.dias, args.repeticoes))
@@ -0,0 +1,127 @@
+"""
+Benchmark dos arquivos estáticos.
+
+Simula um navegador com cache HTTP carregando páginas seguidas e conta as requisições e os bytes
+dos arquivos estáticos por página. Antes, com o StaticFiles nos endereços fixos, o navegador
+revalida cada arquivo a cada página (304 pelo ETag); depois, com os endereços versionados e
+Cache-Control immutable, só a primeira página busca os arquivos, comprimidos. Confere também que as
+variantes comprimidas correspondem ao original e que o endereço muda quando o conteúdo muda.
+
+Uso: python -m benchmarks.estaticos [--paginas 100]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import gzip
+import os
+import re
+import tempfile
+import time
+
+os.environ["BARBEARIA_LOG"] = "0"
+
+import httpx
+from fastapi import FastAPI
+from fastapi.staticfiles import StaticFiles
+
+import main
+from estaticos import ArquivosEstaticos, brotli
+
+ACEITA_CODIFICACAO = "gzip, deflate, br" if brotli is not None else "gzip, deflate"
+
+
+class Navegador:
+    """
+    Cache HTTP simplificado de um navegador: reaproveita respostas imutáveis sem consultar o
+    servidor e revalida as demais com If-None-Match.
+    """
+
+    def __init__(self, cliente):
+        self.cliente = cliente
+        self.cache = {}
+        self.requisicoes = 0
+        self.bytes = 0
+        self.segundos = 0.0
+
+    async def carregar(self, url: str):
+        guardado = self.cache.get(url)
+        if guardado is not None and guardado[1]:
+            return
+        cabecalhos = {"accept-encoding": ACEITA_CODIFICACAO}
+        if guardado is not None:
+            cabecalhos["if-none-match"] = guardado[0]
+        inicio = time.perf_counter()
+        resposta = await self.cliente.get(url, headers=cabecalhos)
+        self.segundos += time.perf_counter() - inicio
+        self.requisicoes += 1
+        self.bytes += resposta.num_bytes_downloaded
+        assert resposta.status_code in (200, 304), (url, resposta.status_code)
+        if resposta.status_code == 200:
+            imutavel = "immutable" in resposta.headers.get("cache-control", "")
+            self.cache[url] = (resposta.headers.get("etag"), imutavel)
+
+
+async def navegar(appPagina, appEstaticos, paginas: int, enderecosFixos: bool):
+    """
+    Carrega a página de login repetidamente e retorna o navegador, com as contagens dos estáticos.
+    """
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=appPagina), base_url="http://bench") as pagina, \
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=appEstaticos), base_url="http://bench") as estaticos:
+        navegador = Navegador(estaticos)
+        for _ in range(paginas):
+            html = (await pagina.get("/login")).text
+            urls = re.findall(r'"(/static/[^"]+)"', html)
+            if enderecosFixos:
+                urls = [re.sub(r"\.[0-9a-f]{12}(\.\w+)$", r"\1", url) for url in urls]
+            for url in urls:
+                await navegador.carregar(url)
+        return navegador, len(urls)
+
+
+def conferirVariantes(estaticos: ArquivosEstaticos):
+    print(f"{'arquivo':<14} | {'original':>8} | {'gzip':>8} | {'brotli':>8}")
+    for registro in sorted(estaticos, key=lambda registro: registro.nome):
+        nome, variantes = registro.nome, registro.variantes
+        if "gzip" in variantes:
+            assert gzip.decompress(variantes["gzip"]) == variantes["identity"], nome
+        if "br" in variantes:
+            assert brotli.decompress(variantes["br"]) == variantes["identity"], nome
+        tamanhos = [len(variantes[codificacao]) if codificacao in variantes else "-"
+                    for codificacao in ("identity", "gzip", "br")]
+        print(f"{nome:<14} | " + " | ".join(f"{tamanho:>8}" for tamanho in tamanhos))
+
+
+def conferirVersionamento():
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "app.js")
+        with open(caminho, "w") as arquivo:
+            arquivo.write("console.log(1);")
+        antes = ArquivosEstaticos(pasta).url("app.js")
+        with open(caminho, "w") as arquivo:
+            arquivo.write("console.log(2);")
+        depois = ArquivosEstaticos(pasta).url("app.js")
+    assert antes != depois, "o endereço não mudou com o conteúdo"
+
+
+async def executar(paginas: int):
+    conferirVariantes(main.estaticos)
+    conferirVersionamento()
+
+    antigo = FastAPI()
+    antigo.mount("/static", StaticFiles(directory="static"), name="static")
+    print(f"\n{f'{paginas} páginas seguidas':<25} | {'requisições':>11} | {'bytes':>8} | {'ms nos estáticos':>16}")
+    for nome, appEstaticos, enderecosFixos in (("antes (endereços fixos)", antigo, True),
+                                              ("depois (versionados)", main.app, False)):
+        navegador, arquivos = await navegar(main.app, appEstaticos, paginas, enderecosFixos)
+        print(f"{nome:<25} | {navegador.requisicoes:>11} | {navegador.bytes:>8} | {navegador.segundos * 1000:>16.1f}")
+        if not enderecosFixos:
+            assert navegador.requisicoes == arquivos, "arquivos versionados buscados mais de uma vez"
+        else:
+            assert navegador.requisicoes == arquivos * paginas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--paginas", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(executar(args.paginas))
@@ -0,0 +1,127 @@
+"""
+Benchmark da exclusão e da alteração de registros pelo id.
+
+Preenche uma tabela de contas com 1 milhão de registros e exclui 100 mil deles, escolhidos ao
+acaso, pelo id (removerConta), e altera o status de outros 100 mil (alterarStatusConta). Para
+comparação, mede também a exclusão pela posição na lista, como era feito antes dos ids estáveis:
+list.pop(posicao) em memória e SELECT ... OFFSET seguido de DELETE no SQLite, com menos operações,
+já que cada uma custa proporcionalmente ao tamanho da tabela. Por fim, confere que as contas
+excluídas não existem mais e que as demais continuam lá.
+
+Uso: python -m benchmarks.exclusao [--backend memoria|sqlite] [--registros 1000000] [--exclusoes 100000]
+                                   [--exclusoes-posicao 1000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from modelos import Conta
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+INICIO = date(2020, 1, 1)
+
+
+async def popular(repositorio, quantidade: int):
+    for i in range(quantidade):
+        await repositorio.adicionarConta(Conta.deTexto(f"Conta {i}", "10.00",
+                                                       (INICIO + timedelta(days=i % 3650)).isoformat()))
+
+
+async def medirOperacoes(operacao, identificadores: list):
+    """
+    Executa a operação para cada id e retorna as latências em microssegundos.
+    """
+    latencias = []
+    for identificador in identificadores:
+        inicio = time.perf_counter()
+        assert await operacao(identificador), identificador
+        latencias.append((time.perf_counter() - inicio) * 1_000_000)
+    return latencias
+
+
+def excluirPorPosicaoLista(quantidade: int, exclusoes: int):
+    lista = list(range(quantidade))
+    aleatorio = random.Random(7)
+    latencias = []
+    for _ in range(exclusoes):
+        posicao = aleatorio.randrange(len(lista))
+        inicio = time.perf_counter()
+        lista.pop(posicao)
+        latencias.append((time.perf_counter() - inicio) * 1_000_000)
+    return latencias
+
+
+def excluirPorPosicaoSQLite(repositorio, exclusoes: int, restantes: int):
+    aleatorio = random.Random(7)
+    latencias = []
+    with repositorio.pool.conexao() as conexao:
+        for _ in range(exclusoes):
+            posicao = aleatorio.randrange(restantes)
+            inicio = time.perf_counter()
+            with conexao:
+                linha = conexao.execute("SELECT id FROM contas ORDER BY id LIMIT 1 OFFSET ?", (posicao,)).fetchone()
+                conexao.execute("DELETE FROM contas WHERE id = ?", (linha["id"],))
+            latencias.append((time.perf_counter() - inicio) * 1_000_000)
+            restantes -= 1
+    return latencias
+
+
+def resumir(nome: str, latencias: list):
+    percentis = statistics.quantiles(latencias, n=100)
+    print(f"{nome:<36} | {len(latencias):>8} | {statistics.fmean(latencias):>10.1f} | {percentis[98]:>10.1f}")
+
+
+async def executar(repositorio, quantidade: int, exclusoes: int, exclusoesPosicao: int):
+    inicio = time.perf_counter()
+    await popular(repositorio, quantidade)
+    print(f"{quantidade} contas ({time.perf_counter() - inicio:.1f} s para preencher)")
+
+    ids = list(range(1, quantidade + 1))
+    random.Random(42).shuffle(ids)
+    excluidos, alterados = ids[:exclusoes], ids[exclusoes:2 * exclusoes]
+
+    print(f"{'operação':<36} | {'operações':>8} | {'média (µs)':>10} | {'p99 (µs)':>10}")
+    resumir("excluir pelo id", await medirOperacoes(repositorio.removerConta, excluidos))
+    resumir("alterar status pelo id",
+            await medirOperacoes(lambda identificador: repositorio.alterarStatusConta(identificador, "Paga"),
+                                 alterados))
+
+    for identificador in excluidos[:1000]:
+        assert await repositorio.obterConta(identificador) is None, identificador
+        assert not await repositorio.removerConta(identificador), "conta excluída duas vezes"
+    for identificador in alterados[:1000]:
+        assert (await repositorio.obterConta(identificador)).status == "Paga", identificador
+    for identificador in ids[2 * exclusoes:2 * exclusoes + 1000]:
+        assert (await repositorio.obterConta(identificador)).status == "Ativa", identificador
+    assert len(await repositorio.listarContas()) == quantidade - exclusoes
+
+    if exclusoesPosicao:
+        if isinstance(repositorio, RepositorioSQLite):
+            latencias = excluirPorPosicaoSQLite(repositorio, exclusoesPosicao, quantidade - exclusoes)
+        else:
+            latencias = excluirPorPosicaoLista(quantidade, exclusoesPosicao)
+        resumir("excluir pela posição (antes)", latencias)
+    await repositorio.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="memoria", choices=["memoria", "sqlite"])
+    parser.add_argument("--registros", type=int, default=1_000_000)
+    parser.add_argument("--exclusoes", type=int, default=100_000)
+    parser.add_argument("--exclusoes-posicao", type=int, default=1000)
+    args = parser.parse_args()
+    if 2 * args.exclusoes > args.registros:
+        parser.error("--exclusoes deve ser no máximo metade de --registros")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        if args.backend == "sqlite":
+            repositorio = RepositorioSQLite(os.path.join(pasta, "exclusao.db"))
+        else:
+            repositorio = RepositorioMemoria()
+        asyncio.run(executar(repositorio, args.registros, args.exclusoes, args.exclusoes_posicao))
@@ -0,0 +1,170 @@
+"""
+Benchmark do resumo financeiro das contas.
+
+Preenche a tabela de contas com 1 milhão de registros, com vencimentos espalhados por dez anos e
+valores com centavos, e compara o custo do resumo (totais por status, fluxo mensal e projeção)
+calculado percorrendo todas as contas, como seria sem os totais mantidos a cada escrita, com o
+calculado a partir dos totais por mês e status. Mede também o GET /api/financeiro e o custo de
+cadastrar, alterar o status e excluir uma conta com os totais sendo atualizados.
+
+Depois de milhares de alterações ao acaso, confere que os totais são exatamente iguais aos da
+varredura, centavo a centavo, e mostra o total exato ao lado da mesma soma feita em float.
+
+Uso: python -m benchmarks.financeiro [--backend memoria|sqlite] [--registros 1000000] [--alteracoes 10000]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+os.environ["BARBEARIA_LOG"] = "0"
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from financeiro import STATUS_CONTAS, TotaisContas, resumirFinanceiro, valorParaCentavos
+from modelos import Conta
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+INICIO = date.today().replace(day=1) - timedelta(days=365 * 8)
+DIAS = 365 * 10
+REPETICOES_VARREDURA = 3
+REPETICOES_TOTAIS = 200
+LOTE_SQLITE = 50_000
+
+
+def gerarConta(gerador: random.Random, i: int):
+    return Conta(f"Conta {i}", Decimal(gerador.randint(1, 2_000_000)).scaleb(-2),
+                 INICIO + timedelta(days=gerador.randrange(DIAS)), gerador.choice(STATUS_CONTAS))
+
+
+async def popular(repositorio, quantidade: int, gerador: random.Random):
+    """
+    No SQLite, insere em lotes direto na tabela, como uma importação: os triggers dos totais
+    continuam sendo executados a cada linha.
+    """
+    if isinstance(repositorio, RepositorioSQLite):
+        with repositorio.pool.conexao() as conexao:
+            for inicio in range(0, quantidade, LOTE_SQLITE):
+                contas = [gerarConta(gerador, i) for i in range(inicio, min(inicio + LOTE_SQLITE, quantidade))]
+                with conexao:
+                    conexao.executemany(
+                        "INSERT INTO contas (descricao, valor, vencimento, status, centavos) VALUES (?, ?, ?, ?, ?)",
+                        [(conta.descricao, str(conta.valor), conta.vencimento.isoformat(), conta.status,
+                          valorParaCentavos(conta.valor)) for conta in contas])
+        return
+    for i in range(quantidade):
+        await repositorio.adicionarConta(gerarConta(gerador, i))
+
+
+async def resumoVarrendo(repositorio, hoje: date):
+    return resumirFinanceiro(TotaisContas.deContas(await repositorio.listarContas()).consultar(), hoje)
+
+
+async def resumoPelosTotais(repositorio, hoje: date):
+    return resumirFinanceiro(await repositorio.totaisContas(), hoje)
+
+
+async def milissegundos(funcao, repeticoes: int):
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        await funcao()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(latencias)
+
+
+async def microssegundosPorOperacao(operacoes: list):
+    inicio = time.perf_counter()
+    for operacao in operacoes:
+        await operacao()
+    return (time.perf_counter() - inicio) / len(operacoes) * 1_000_000
+
+
+async def alterar(repositorio, quantidade: int, alteracoes: int, gerador: random.Random):
+    """
+    Cadastra, muda o status e exclui contas ao acaso e retorna o custo médio de cada operação.
+    """
+    novas = [gerarConta(gerador, quantidade + i) for i in range(alteracoes)]
+    cadastrar = await microssegundosPorOperacao([lambda conta=conta: repositorio.adicionarConta(conta)
+                                                 for conta in novas])
+    ids = gerador.sample(range(1, quantidade + 1), 2 * alteracoes)
+    status = await microssegundosPorOperacao(
+        [lambda identificador=identificador, novo=gerador.choice(STATUS_CONTAS):
+         repositorio.alterarStatusConta(identificador, novo) for identificador in ids[:alteracoes]])
+    excluir = await microssegundosPorOperacao(
+        [lambda identificador=identificador: repositorio.removerConta(identificador)
+         for identificador in ids[alteracoes:]])
+    return cadastrar, status, excluir
+
+
+async def medirApi(repositorio):
+    main.repositorio = repositorio
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await cliente.post("/cadastro", data={"nome": "Bench", "email": "bench@barbearia",
+                                              "usuario": "bench", "senha": "bench"})
+        assert (await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})).status_code == 303
+
+        async def consultar():
+            resposta = await cliente.get("/api/financeiro", params={"meses": 12})
+            assert resposta.status_code == 200, resposta.text
+            return resposta
+
+        resposta = await consultar()
+        return await milissegundos(consultar, REPETICOES_TOTAIS // 4), resposta.json()
+
+
+async def executar(backend: str, quantidade: int, alteracoes: int):
+    gerador = random.Random(22)
+    hoje = date.today()
+    with tempfile.TemporaryDirectory() as pasta:
+        repositorio = (RepositorioSQLite(os.path.join(pasta, "bench.db")) if backend == "sqlite"
+                       else RepositorioMemoria())
+        inicio = time.perf_counter()
+        await popular(repositorio, quantidade, gerador)
+        print(f"backend {backend}: {quantidade} contas em {len(await repositorio.totaisContas())} grupos "
+              f"(mês, status) ({time.perf_counter() - inicio:.1f} s para preencher)")
+
+        print(f"{'resumo financeiro (p50)':<40} | {'ms':>10}")
+        varredura = await milissegundos(lambda: resumoVarrendo(repositorio, hoje), REPETICOES_VARREDURA)
+        totais = await milissegundos(lambda: resumoPelosTotais(repositorio, hoje), REPETICOES_TOTAIS)
+        print(f"{'varrendo todas as contas':<40} | {varredura:>10.3f}")
+        print(f"{'pelos totais por mês e status':<40} | {totais:>10.3f}   ({varredura / totais:.0f}x)")
+        api, json = await medirApi(repositorio)
+        print(f"{'GET /api/financeiro':<40} | {api:>10.3f}")
+
+        cadastrar, status, excluir = await alterar(repositorio, quantidade, alteracoes, gerador)
+        print(f"\n{'escrita com os totais (média)':<40} | {'µs':>10}")
+        print(f"{'cadastrar conta':<40} | {cadastrar:>10.1f}")
+        print(f"{'alterar status':<40} | {status:>10.1f}")
+        print(f"{'excluir conta':<40} | {excluir:>10.1f}")
+
+        contas = await repositorio.listarContas()
+        esperado = TotaisContas.deContas(contas).consultar()
+        assert await repositorio.totaisContas() == esperado, "totais diferentes da varredura"
+        resumo = await resumoPelosTotais(repositorio, hoje)
+        assert resumo == await resumoVarrendo(repositorio, hoje)
+        exato = sum((conta.valor for conta in contas), Decimal("0.00"))
+        total = sum((resumo.totais[nome].valor for nome in ("ativas", "atrasadas", "pagas")), Decimal("0.00"))
+        assert total == exato, f"{total} != {exato}"
+        assert json["totais"]["emAberto"]["quantidade"] > 0
+        flutuante = sum(float(conta.valor) for conta in contas)
+        print(f"\ntotal exato: R$ {exato} (soma em float: {flutuante!r})")
+        await repositorio.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["memoria", "sqlite"], default="memoria")
+    parser.add_argument("--registros", type=int, default=1_000_000)
+    parser.add_argument("--alteracoes", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(executar(args.backend, args.registros, args.alteracoes))
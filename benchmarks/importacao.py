@@ -0,0 +1,203 @@
+"""
+Benchmark da importação e da exportação em massa.
+
+Envia pelo POST /api/importar/contas um CSV de 1 milhão de contas, gerado em pedaços enquanto é
+enviado (o arquivo nunca existe inteiro, nem no cliente), e mede as linhas por segundo e o
+crescimento do pico de memória do processo, que no SQLite deve ficar abaixo de um limite fixo,
+qualquer que seja o tamanho do arquivo. Compara com cadastrar as contas uma a uma e exporta a
+tabela inteira pelo GET /api/exportar/contas, também em streaming e com a memória limitada.
+
+Depois importa agendamentos em JSONL com horários repetidos de propósito e confere que só essas
+linhas são recusadas por conflito, e que importar o mesmo arquivo de novo recusa todas.
+
+Uso: python -m benchmarks.importacao [--backend memoria|sqlite] [--registros 1000000] [--agendamentos 20000]
+Requer o pacote httpx. No backend em memória as contas importadas ficam no próprio processo, então
+o crescimento da memória inclui os registros gravados, e não só a importação.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+os.environ["BARBEARIA_LOG"] = "0"
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from agenda import horaDeMinutos, minutos
+from modelos import Conta, formatarHora
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+TAMANHO_PEDACO = 64 * 1024
+INICIO = date.today() + timedelta(days=1)
+REGISTROS_UM_A_UM = 20_000
+# Contas importadas antes da medição, para que o pico de memória inicial já inclua o que não depende
+# do tamanho do arquivo (threads, cache do SQLite, primeira execução de cada caminho).
+REGISTROS_AQUECIMENTO = 20_000
+# Crescimento máximo do pico de memória no SQLite, qualquer que seja o tamanho do arquivo.
+LIMITE_CRESCIMENTO_MB = 32
+# A cada quantas linhas de agendamento uma repete o horário da anterior.
+CONFLITO_A_CADA = 10
+
+
+def picoMemoriaMB():
+    """
+    Pico de memória residente do processo (ru_maxrss, em KB no Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def gerarCSVContas(quantidade: int, tamanho: list):
+    """
+    Produz o CSV em pedaços de TAMANHO_PEDACO bytes, somando o total enviado em tamanho[0].
+    """
+    gerador = random.Random(23)
+    status = ("Ativa", "Atraso", "Paga")
+    linhas = ["descricao,valor,vencimento,status\n"]
+    acumulado = len(linhas[0])
+    for i in range(quantidade):
+        linha = (f"Conta {i},{gerador.randint(1, 2_000_000) / 100:.2f},"
+                 f"{(INICIO + timedelta(days=gerador.randrange(3650))).isoformat()},{gerador.choice(status)}\n")
+        linhas.append(linha)
+        acumulado += len(linha)
+        if acumulado >= TAMANHO_PEDACO:
+            pedaco = "".join(linhas).encode()
+            tamanho[0] += len(pedaco)
+            yield pedaco
+            linhas, acumulado = [], 0
+    if linhas:
+        pedaco = "".join(linhas).encode()
+        tamanho[0] += len(pedaco)
+        yield pedaco
+
+
+def gerarAgendamentos(quantidade: int, agenda):
+    """
+    Retorna as linhas JSONL dos agendamentos, um após o outro na grade do dia, e os números das
+    linhas que repetem o horário da anterior.
+    """
+    duracao = agenda.duracao("Corte")
+    porDia = (minutos(agenda.fechamento) - minutos(agenda.abertura)) // duracao
+    linhas, conflitos = [], set()
+    posicao = 0
+    for numero in range(1, quantidade + 1):
+        if numero % CONFLITO_A_CADA == 0:
+            conflitos.add(numero)
+            posicao -= 1
+        dia, slot = divmod(posicao, porDia)
+        linhas.append(json.dumps({"cliente": f"Cliente {numero}", "servico": "Corte",
+                                  "data": (INICIO + timedelta(days=dia)).isoformat(),
+                                  "hora": formatarHora(horaDeMinutos(minutos(agenda.abertura) + slot * duracao)),
+                                  "barbeiro": agenda.barbeiros[0]}) + "\n")
+        posicao += 1
+    return "".join(linhas).encode(), conflitos
+
+
+async def cadastrarUmAUm(repositorio, quantidade: int):
+    gerador = random.Random(1)
+    inicio = time.perf_counter()
+    for i in range(quantidade):
+        await repositorio.adicionarConta(Conta(f"Conta {i}", Decimal(gerador.randint(1, 2_000_000)).scaleb(-2),
+                                               INICIO + timedelta(days=gerador.randrange(3650))))
+    return quantidade / (time.perf_counter() - inicio)
+
+
+async def exportarDireto(caminho: str, cookies: dict):
+    """
+    Chama o GET de exportação diretamente no app ASGI, contando e descartando os pedaços conforme
+    são enviados: o ASGITransport do httpx junta a resposta inteira antes de devolvê-la, o que
+    esconderia se a exportação acumula a tabela em memória. Retorna (linhas, bytes).
+    """
+    contagem = [0, 0]
+    desconexao = asyncio.get_running_loop().create_future()
+    cookie = "; ".join(f"{nome}={valor}" for nome, valor in cookies.items())
+    escopo = {"type": "http", "http_version": "1.1", "method": "GET", "scheme": "http", "path": caminho,
+              "raw_path": caminho.encode(), "query_string": b"", "root_path": "", "client": ("127.0.0.1", 1),
+              "server": ("bench", 80), "headers": [(b"host", b"bench"), (b"cookie", cookie.encode())]}
+    pedidos = iter([{"type": "http.request", "body": b"", "more_body": False}])
+
+    async def receber():
+        return next(pedidos, None) or await desconexao
+
+    async def enviar(mensagem):
+        if mensagem["type"] == "http.response.start":
+            assert mensagem["status"] == 200, mensagem
+        elif mensagem["type"] == "http.response.body":
+            contagem[0] += mensagem.get("body", b"").count(b"\n")
+            contagem[1] += len(mensagem.get("body", b""))
+
+    await main.app(escopo, receber, enviar)
+    return contagem
+
+
+async def executar(backend: str, quantidade: int, agendamentos: int):
+    with tempfile.TemporaryDirectory() as pasta:
+        repositorio = (RepositorioSQLite(os.path.join(pasta, "bench.db")) if backend == "sqlite"
+                       else RepositorioMemoria())
+        main.repositorio = repositorio
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+            await cliente.post("/cadastro", data={"nome": "Bench", "email": "bench@barbearia",
+                                                  "usuario": "bench", "senha": "bench"})
+            assert (await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})).status_code == 303
+
+            resposta = await cliente.post("/api/importar/contas",
+                                          content=gerarCSVContas(REGISTROS_AQUECIMENTO, [0]))
+            assert resposta.json()["importados"] == REGISTROS_AQUECIMENTO
+            tamanho = [0]
+            memoriaAntes = picoMemoriaMB()
+            inicio = time.perf_counter()
+            resposta = await cliente.post("/api/importar/contas", content=gerarCSVContas(quantidade, tamanho))
+            duracao = time.perf_counter() - inicio
+            assert resposta.status_code == 200, resposta.text
+            resultado = resposta.json()
+            assert resultado["importados"] == quantidade and not resultado["erros"], resultado
+            crescimento = picoMemoriaMB() - memoriaAntes
+            print(f"backend {backend}: {quantidade} contas, {tamanho[0] / 2**20:.1f} MB de CSV")
+            print(f"{'operação':<40} | {'linhas/s':>10}")
+            print(f"{'POST /api/importar/contas (CSV)':<40} | {quantidade / duracao:>10.0f}   ({duracao:.1f} s)")
+            print(f"{'adicionarConta, uma a uma':<40} | {await cadastrarUmAUm(repositorio, REGISTROS_UM_A_UM):>10.0f}")
+
+            inicio = time.perf_counter()
+            linhas, bytesExportados = await exportarDireto("/api/exportar/contas", dict(cliente.cookies))
+            duracao = time.perf_counter() - inicio
+            assert linhas == REGISTROS_AQUECIMENTO + quantidade + REGISTROS_UM_A_UM + 1, linhas
+            print(f"{'GET /api/exportar/contas (CSV)':<40} | {(linhas - 1) / duracao:>10.0f}   ({duracao:.1f} s, "
+                  f"{bytesExportados / 2**20:.1f} MB)")
+            crescimentoExportacao = picoMemoriaMB() - memoriaAntes
+            print(f"\npico de memória: +{crescimento:.1f} MB na importação de {tamanho[0] / 2**20:.1f} MB, "
+                  f"+{crescimentoExportacao:.1f} MB até o fim da exportação")
+            if backend == "sqlite":
+                assert crescimentoExportacao < LIMITE_CRESCIMENTO_MB, "memória proporcional ao arquivo"
+
+            conteudo, conflitos = gerarAgendamentos(agendamentos, repositorio.agenda)
+            inicio = time.perf_counter()
+            resposta = await cliente.post("/api/importar/agendamentos", params={"formato": "jsonl"}, content=conteudo)
+            duracao = time.perf_counter() - inicio
+            resultado = resposta.json()
+            recusadas = {erro["linha"] for erro in resultado["erros"]}
+            assert recusadas <= conflitos, "linhas sem conflito recusadas"
+            assert len(recusadas) + resultado["errosOmitidos"] == len(conflitos), "conflitos aceitos"
+            assert resultado["importados"] == agendamentos - len(conflitos)
+            print(f"\n{agendamentos} agendamentos (JSONL): {agendamentos / duracao:.0f} linhas/s, "
+                  f"{len(conflitos)} conflitos recusados")
+            resultado = (await cliente.post("/api/importar/agendamentos", params={"formato": "jsonl"},
+                                            content=conteudo)).json()
+            assert resultado["importados"] == 0, "agendamentos repetidos aceitos na segunda importação"
+        await repositorio.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["memoria", "sqlite"], default="sqlite")
+    parser.add_argument("--registros", type=int, default=1_000_000)
+    parser.add_argument("--agendamentos", type=int, default=20_000)
+    args = parser.parse_args()
+    asyncio.run(executar(args.backend, args.registros, args.agendamentos))
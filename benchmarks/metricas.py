@@ -0,0 +1,175 @@
+"""
+Benchmark do custo das métricas.
+
+Mede o custo de observar um histograma e de cronometrar um bloco, o acréscimo do middleware de
+métricas por requisição (em volta de um app ASGI mínimo, para isolar o custo) e o tempo de gerar
+o texto do GET /metricas com muitas séries. Depois faz requisições à aplicação e confere, pelo
+próprio GET /metricas, os contadores por rota e status, os baldes acumulados dos histogramas, a
+duração da disponibilidade e dos templates e o atraso do event loop causado por uma chamada
+bloqueante.
+
+Uso: python -m benchmarks.metricas [--requisicoes 20000]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ["BARBEARIA_LOG"] = "0"
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+os.environ["BARBEARIA_METRICAS_TOKEN"] = "bench"
+
+import httpx
+
+import main
+from metricas import MetricasRequisicoes, RegistroMetricas
+
+REPETICOES = 200_000
+CABECALHO = {"Authorization": "Bearer bench"}
+
+
+def nanossegundosPorChamada(funcao, repeticoes: int = REPETICOES):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes * 1e9
+
+
+async def appMinimo(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def microsegundosPorRequisicao(app, requisicoes: int):
+    """
+    Chama o app ASGI diretamente, sem cliente HTTP, para que o custo medido seja só o do app.
+    """
+    async def receber():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def enviar(mensagem):
+        pass
+
+    inicio = time.perf_counter()
+    for _ in range(requisicoes):
+        await app({"type": "http", "method": "GET", "path": "/", "app": main.app, "endpoint": main.index},
+                  receber, enviar)
+    return (time.perf_counter() - inicio) / requisicoes * 1e6
+
+
+def lerMetricas(texto: str):
+    """
+    Lê o formato de texto do Prometheus em {(nome, rotulos): valor}, com os rótulos como frozenset.
+    """
+    valores = {}
+    for linha in texto.splitlines():
+        if not linha or linha.startswith("#"):
+            continue
+        serie, valor = linha.rsplit(" ", 1)
+        nome, _, rotulos = serie.partition("{")
+        pares = frozenset(tuple(par.split("=", 1)) for par in rotulos.rstrip("}").split(",") if par)
+        valores[(nome, pares)] = float(valor)
+    return valores
+
+
+def rotulos(**pares):
+    return frozenset((nome, f'"{valor}"') for nome, valor in pares.items())
+
+
+def conferirHistogramas(valores: dict):
+    """
+    Confere que os baldes de cada série são acumulados e terminam em _count.
+    """
+    baldes = {}
+    for (nome, pares), valor in valores.items():
+        if nome.endswith("_bucket"):
+            limite = dict(pares)["le"].strip('"')
+            chave = (nome[:-len("_bucket")], pares - {("le", dict(pares)["le"])})
+            baldes.setdefault(chave, []).append((float(limite), valor))
+    assert baldes, "nenhum histograma exportado"
+    for (nome, pares), series in baldes.items():
+        contagens = [valor for _, valor in sorted(series)]
+        assert contagens == sorted(contagens), f"baldes não acumulados em {nome}"
+        assert contagens[-1] == valores[(nome + "_count", pares)], f"+Inf diferente de _count em {nome}"
+
+
+async def conferirAplicacao():
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        assert (await cliente.get("/metricas")).status_code == 303, "métricas sem autenticação"
+        assert (await cliente.get("/metricas", headers={"Authorization": "Bearer x"})).status_code == 303
+        await cliente.post("/cadastro", data={"nome": "Bench", "email": "bench@barbearia",
+                                              "usuario": "bench", "senha": "bench"})
+        assert (await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})).status_code == 303
+        antes = lerMetricas((await cliente.get("/metricas", headers=CABECALHO)).text)
+
+        for identificador in range(10):
+            assert (await cliente.get("/agendar")).status_code == 200
+            assert (await cliente.get(f"/alterar_conta/{identificador + 1000}")).status_code == 303
+            assert (await cliente.get("/nao-existe")).status_code == 404
+
+        tarefa = asyncio.create_task(main.metricas.monitorarLoop(0.01))
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)
+        await asyncio.sleep(0.05)
+        tarefa.cancel()
+
+        resposta = await cliente.get("/metricas", headers=CABECALHO)
+        assert resposta.headers["content-type"].startswith("text/plain; version=0.0.4")
+        depois = lerMetricas(resposta.text)
+
+    def diferenca(nome, **pares):
+        chave = (nome, rotulos(**pares))
+        return depois.get(chave, 0) - antes.get(chave, 0)
+
+    requisicoes = "barbearia_requisicoes_total"
+    assert diferenca(requisicoes, metodo="GET", rota="/agendar", status="200") == 10
+    assert diferenca(requisicoes, metodo="GET", rota="/alterar_conta/{identificador}", status="303") == 10
+    assert diferenca(requisicoes, metodo="GET", rota="desconhecida", status="404") == 10
+    assert diferenca("barbearia_requisicao_duracao_segundos_count", metodo="GET", rota="/agendar") == 10
+    assert diferenca("barbearia_operacao_duracao_segundos_count", operacao="disponibilidade") == 10
+    assert diferenca("barbearia_template_duracao_segundos_count", template="agendar.html") == 10
+    assert depois[("barbearia_requisicoes_em_andamento", frozenset())] == 1, "requisições em andamento"
+    atraso = depois[("barbearia_event_loop_atraso_maximo_segundos", frozenset())]
+    assert 0.15 <= atraso < 1, f"atraso do event loop não detectado: {atraso}"
+    conferirHistogramas(depois)
+    return atraso
+
+
+async def executar(requisicoes: int):
+    registro = RegistroMetricas()
+    histograma = registro.histograma("bench_segundos", "Benchmark.", ("operacao",))
+    print(f"{'operação':<40} | {'custo':>12}")
+    print(f"{'Histograma.observar':<40} | {nanossegundosPorChamada(lambda: histograma.observar(0.003, 'x')):>9.0f} ns")
+
+    def cronometrar():
+        with histograma.cronometrar("x"):
+            pass
+    print(f"{'Histograma.cronometrar (bloco vazio)':<40} | {nanossegundosPorChamada(cronometrar):>9.0f} ns")
+
+    semMetricas = await microsegundosPorRequisicao(appMinimo, requisicoes)
+    comMetricas = await microsegundosPorRequisicao(MetricasRequisicoes(appMinimo, registro), requisicoes)
+    print(f"{'requisição ASGI sem métricas':<40} | {semMetricas:>9.2f} µs")
+    print(f"{'requisição ASGI com métricas':<40} | {comMetricas:>9.2f} µs")
+    print(f"{'acréscimo do middleware':<40} | {comMetricas - semMetricas:>9.2f} µs")
+    assert comMetricas - semMetricas < 50, "middleware de métricas caro demais"
+
+    for rota in range(100):
+        for status in ("200", "303", "404"):
+            registro.requisicoes.incrementar("GET", f"/rota/{rota}", status)
+        registro.duracaoRequisicoes.observar(0.01, "GET", f"/rota/{rota}")
+    inicio = time.perf_counter()
+    texto = registro.exportar()
+    print(f"{'GET /metricas, 100 rotas':<40} | {(time.perf_counter() - inicio) * 1000:>9.2f} ms"
+          f"   ({len(texto.splitlines())} linhas)")
+
+    atraso = await conferirAplicacao()
+    print(f"{'atraso do event loop com time.sleep(0.2)':<40} | {atraso * 1000:>9.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requisicoes", type=int, default=20_000)
+    args = parser.parse_args()
+    asyncio.run(executar(args.requisicoes))
@@ -0,0 +1,67 @@
+"""
+Microbenchmark dos modelos de registro.
+
+Compara registros em dicionários de strings, formatados com strptime/strftime a cada
+exibição, com os modelos tipados de modelos.py, convertidos uma vez na entrada. Mede a memória
+por registro (tracemalloc) e a vazão de uma listagem que formata data e hora de todos os registros.
+
+Uso: python -m benchmarks.modelos [--registros 1000000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from modelos import Agendamento
+
+HORAS = [f"{h:02d}:00" for h in range(9, 23)]
+
+
+def gerarTextos(quantidade: int):
+    inicio = date(2000, 1, 1)
+    for i in range(quantidade):
+        yield (f"Cliente {i}", "Corte", (inicio + timedelta(days=i // len(HORAS))).isoformat(),
+               HORAS[i % len(HORAS)])
+
+
+def criarDicionarios(quantidade: int):
+    return [{"cliente": cliente, "servico": servico, "data": data, "hora": hora, "situacao": "Ativo"}
+            for cliente, servico, data, hora in gerarTextos(quantidade)]
+
+
+def criarModelos(quantidade: int):
+    return [Agendamento.deTexto(*campos) for campos in gerarTextos(quantidade)]
+
+
+def listarDicionarios(registros: list):
+    return [(ag["cliente"], datetime.strptime(ag["data"], "%Y-%m-%d").strftime("%d/%m/%Y"),
+             datetime.strptime(ag["hora"], "%H:%M").strftime("%H:%M")) for ag in registros]
+
+
+def listarModelos(registros: list):
+    return [(ag.cliente, ag.dataFormatada, ag.horaFormatada) for ag in registros]
+
+
+def medir(criar, listar, quantidade: int):
+    gc.collect()
+    tracemalloc.start()
+    registros = criar(quantidade)
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    inicio = time.perf_counter()
+    listar(registros)
+    duracao = time.perf_counter() - inicio
+    return memoria / quantidade, quantidade / duracao
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--registros", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(f"{'formato':>11} | {'bytes/registro':>14} | {'listagem (registros/s)':>22}")
+    for nome, criar, listar in (("dicionário", criarDicionarios, listarDicionarios),
+                                ("modelo", criarModelos, listarModelos)):
+        porRegistro, vazao = medir(criar, listar, args.registros)
+        print(f"{nome:>11} | {porRegistro:>14.0f} | {vazao:>22,.0f}")
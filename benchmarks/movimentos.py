@@ -0,0 +1,184 @@
+"""
+Benchmark do livro de movimentações de estoque.
+
+Cadastra os produtos e registra milhões de vendas, saídas e entradas em lotes (uma chamada de
+registrarMovimentos por lote), comparando a vazão com uma chamada por movimentação. Depois mede a
+latência das consultas que antes exigiam percorrer o estoque inteiro: estoque baixo (comparado com
+a varredura completa), produtos vencendo e o histórico de um produto, pela API. Confere que o saldo
+de cada produto amostrado é a soma das suas movimentações, que o estoque baixo coincide com a
+varredura e que um lote com saldo insuficiente não grava nada.
+
+Uso: python -m benchmarks.movimentos [--backend memoria|sqlite] [--produtos 10000] [--movimentos N]
+     [--lote 1000]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ["BARBEARIA_LOG"] = "0"
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from modelos import Movimento, Produto
+from movimentos import EstoqueInsuficiente
+from repositorio import LIMITE_ESTOQUE_CRITICO, RepositorioMemoria, RepositorioSQLite
+
+MOVIMENTOS_PADRAO = {"memoria": 2_000_000, "sqlite": 1_000_000}
+AMOSTRA = 100
+REPETICOES = 200
+
+
+def gerarMovimentos(saldos: dict, quantidade: int, gerador: random.Random):
+    """
+    Gera movimentações aleatórias que nunca deixam o saldo negativo, atualizando saldos: vendas e
+    saídas de poucas unidades e, quando o produto acaba, uma entrada de reposição.
+    """
+    produtos = list(saldos)
+    movimentos = []
+    for _ in range(quantidade):
+        produto = gerador.choice(produtos)
+        tipo = "venda" if gerador.random() < 0.9 else "saida"
+        unidades = gerador.randint(1, 3)
+        if saldos[produto] < unidades:
+            tipo, unidades = "entrada", gerador.randint(20, 60)
+        movimento = Movimento(produto, tipo, unidades)
+        saldos[produto] += movimento.variacao
+        movimentos.append(movimento)
+    return movimentos
+
+
+async def popular(repositorio, produtos: int, gerador: random.Random):
+    hoje = date.today()
+    saldos = {}
+    for i in range(produtos):
+        produto = Produto(f"Produto {i}", gerador.randint(0, 40), hoje + timedelta(days=gerador.randint(-30, 720)))
+        await repositorio.adicionarProduto(produto)
+        saldos[produto.id] = produto.quantidade
+    return saldos
+
+
+async def medirLatencia(consulta, repeticoes: int = REPETICOES):
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        await consulta()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(latencias)
+
+
+async def conferir(repositorio, saldos: dict, gerador: random.Random):
+    """
+    Confere os saldos amostrados contra o livro e o estoque baixo contra a varredura completa.
+    """
+    for produto in gerador.sample(list(saldos), min(AMOSTRA, len(saldos))):
+        historico = await repositorio.listarMovimentos(produto, limite=10 ** 9)
+        registrado = (await repositorio.obterProduto(produto)).quantidade
+        assert registrado == saldos[produto] == sum(movimento.variacao for movimento in historico), produto
+        assert all(a.id > b.id for a, b in zip(historico, historico[1:])), "histórico fora de ordem"
+        if historico:
+            assert historico[0].saldo == registrado, "saldo corrente diferente do produto"
+    varredura = sorted((p.quantidade, p.id) for p in await repositorio.listarEstoque()
+                       if p.quantidade < LIMITE_ESTOQUE_CRITICO)
+    indice = [(p.quantidade, p.id) for p in await repositorio.listarEstoqueCritico()]
+    assert indice == varredura, "estoque baixo diferente da varredura"
+    assert [(p.quantidade, p.id) for p in await repositorio.listarEstoqueCritico(maximo=10)] == varredura[:10]
+
+    antes = await repositorio.listarMovimentos(limite=1)
+    vazio = next(iter(saldos))
+    lote = [Movimento(vazio, "entrada", 1), Movimento(vazio, "venda", saldos[vazio] + 2)]
+    try:
+        await repositorio.registrarMovimentos(lote)
+        raise AssertionError("lote com saldo insuficiente aceito")
+    except EstoqueInsuficiente:
+        pass
+    assert (await repositorio.listarMovimentos(limite=1))[0].id == antes[0].id, "lote recusado gravou movimentações"
+    assert (await repositorio.obterProduto(vazio)).quantidade == saldos[vazio], "lote recusado alterou o saldo"
+
+
+async def executar(backend: str, produtos: int, quantidade: int, tamanhoLote: int):
+    gerador = random.Random(18)
+    with tempfile.TemporaryDirectory() as pasta:
+        repositorio = (RepositorioSQLite(os.path.join(pasta, "bench.db")) if backend == "sqlite"
+                       else RepositorioMemoria())
+        saldos = await popular(repositorio, produtos, gerador)
+
+        individuais = min(quantidade // 20, 50_000)
+        movimentos = gerarMovimentos(saldos, individuais, gerador)
+        inicio = time.perf_counter()
+        for movimento in movimentos:
+            await repositorio.registrarMovimentos([movimento])
+        porSegundoIndividual = individuais / (time.perf_counter() - inicio)
+
+        restantes = quantidade - individuais
+        duracao = 0.0
+        while restantes > 0:
+            lote = gerarMovimentos(saldos, min(tamanhoLote, restantes), gerador)
+            inicio = time.perf_counter()
+            await repositorio.registrarMovimentos(lote)
+            duracao += time.perf_counter() - inicio
+            restantes -= len(lote)
+        porSegundoLote = (quantidade - individuais) / duracao
+        print(f"backend {backend}: {produtos} produtos, {quantidade} movimentações")
+        print(f"{'ingestão':<32} | {'movimentações/s':>15}")
+        print(f"{'uma por chamada':<32} | {porSegundoIndividual:>15,.0f}")
+        print(f"{f'lotes de {tamanhoLote}':<32} | {porSegundoLote:>15,.0f}")
+
+        await conferir(repositorio, saldos, gerador)
+
+        async def varredura():
+            return sorted((p for p in await repositorio.listarEstoque() if p.quantidade < LIMITE_ESTOQUE_CRITICO),
+                          key=lambda p: p.quantidade)
+
+        print(f"\n{'consulta (p50 ms)':<32} | {'ms':>8}")
+        print(f"{'estoque baixo, varredura':<32} | {await medirLatencia(varredura, REPETICOES // 10):>8.3f}")
+        print(f"{'estoque baixo, índice':<32} | {await medirLatencia(repositorio.listarEstoqueCritico):>8.3f}")
+
+        main.repositorio = repositorio
+        transporte = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+            await cliente.post("/cadastro", data={"nome": "Bench", "email": "bench@barbearia",
+                                                  "usuario": "bench", "senha": "bench"})
+            assert (await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})).status_code == 303
+            produto = gerador.choice(list(saldos))
+            consultas = (("GET /api/estoque/baixo", "/api/estoque/baixo?limite=100"),
+                         ("GET /api/estoque/vencendo", "/api/estoque/vencendo?dias=30"),
+                         ("GET /api/movimentos?produto", f"/api/movimentos?produto={produto}&limite=50"),
+                         ("GET /api/movimentos", "/api/movimentos?limite=50"))
+            for nome, url in consultas:
+                assert (await cliente.get(url)).status_code == 200, url
+
+                async def consultar(url=url):
+                    return await cliente.get(url)
+                print(f"{nome:<32} | {await medirLatencia(consultar):>8.3f}")
+
+            hoje, limite = date.today(), date.today() + timedelta(days=30)
+            vencendo = (await cliente.get("/api/estoque/vencendo?dias=30&limite=100")).json()["itens"]
+            esperado = sorted((p for p in await repositorio.listarEstoque() if p.validade and hoje <= p.validade <= limite),
+                              key=lambda p: (p.validade, p.id))[:100]
+            assert [item["id"] for item in vencendo] == [p.id for p in esperado], "vencendo diferente da varredura"
+
+            lote = [{"produto": produto, "tipo": "entrada", "quantidade": 5}] * tamanhoLote
+            inicio = time.perf_counter()
+            resposta = await cliente.post("/api/movimentos", json={"movimentos": lote})
+            print(f"{f'POST /api/movimentos ({tamanhoLote})':<32} | {(time.perf_counter() - inicio) * 1000:>8.3f}")
+            assert resposta.status_code == 200 and resposta.json()["saldos"][str(produto)] == \
+                saldos[produto] + 5 * tamanhoLote, resposta.text
+        await repositorio.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=("memoria", "sqlite"), default="memoria")
+    parser.add_argument("--produtos", type=int, default=10_000)
+    parser.add_argument("--movimentos", type=int, default=None)
+    parser.add_argument("--lote", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(executar(args.backend, args.produtos, args.movimentos or MOVIMENTOS_PADRAO[args.backend], args.lote))
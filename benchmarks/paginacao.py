@@ -0,0 +1,83 @@
+"""
+Microbenchmark das listagens paginadas.
+
+Mede a latência e o tamanho da resposta de GET /contas (HTML) e GET /api/contas (JSON), ordenadas
+por vencimento, na primeira página e em uma página do meio da tabela, conforme a tabela cresce.
+Com a paginação por cursor, latência e tamanho devem ficar estáveis.
+
+Uso: python -m benchmarks.paginacao [--backend memoria|sqlite] [--tamanhos 1000,10000,100000,1000000]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ["BARBEARIA_LOG"] = "0"
+
+import httpx
+
+import main
+from modelos import Conta
+from paginacao import chaveOrdenacao, codificarCursor
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+
+async def popular(repositorio, quantidade: int):
+    await repositorio.adicionarUsuario({"nome": "Bench", "email": "bench@barbearia",
+                                        "usuario": "bench", "senha": "bench"})
+    inicio = date(2020, 1, 1)
+    meio = None
+    for i in range(quantidade):
+        conta = Conta.deTexto(f"Conta {i}", "10.00", (inicio + timedelta(days=i % 3650)).isoformat(),
+                              "Ativa" if i % 2 else "Paga")
+        await repositorio.adicionarConta(conta)
+        if i == quantidade // 2:
+            meio = conta
+    return codificarCursor(chaveOrdenacao("contas", "vencimento", meio))
+
+
+async def medir(cliente, caminho: str, repeticoes: int):
+    resposta = await cliente.get(caminho)
+    assert resposta.status_code == 200
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        await cliente.get(caminho)
+    return (time.perf_counter() - inicio) / repeticoes * 1000, len(resposta.content)
+
+
+async def executar(repositorio, quantidade: int, repeticoes: int):
+    main.repositorio = repositorio
+    cursor = await popular(repositorio, quantidade)
+    transporte = httpx.ASGITransport(app=main.app)
+    resultados = []
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})
+        for caminho in ("/contas", "/api/contas"):
+            for pagina, consulta in (("primeira", "?ordem=vencimento"),
+                                     ("meio", f"?ordem=vencimento&apos={cursor}")):
+                latencia, tamanho = await medir(cliente, caminho + consulta, repeticoes)
+                resultados.append((caminho, pagina, latencia, tamanho))
+    await repositorio.fechar()
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="memoria", choices=["memoria", "sqlite"])
+    parser.add_argument("--tamanhos", default="1000,10000,100000,1000000")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'registros':>10} | {'endpoint':>11} | {'página':>8} | {'latência (ms)':>13} | {'bytes':>7}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for quantidade in map(int, args.tamanhos.split(",")):
+            if args.backend == "sqlite":
+                repositorio = RepositorioSQLite(os.path.join(pasta, f"paginacao{quantidade}.db"))
+            else:
+                repositorio = RepositorioMemoria()
+            for caminho, pagina, latencia, tamanho in asyncio.run(executar(repositorio, quantidade,
+                                                                           args.repeticoes)):
+                print(f"{quantidade:>10} | {caminho:>11} | {pagina:>8} | {latencia:>13.2f} | {tamanho:>7}")
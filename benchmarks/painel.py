@@ -0,0 +1,76 @@
+"""
+Microbenchmark da página inicial.
+
+Mede a latência de GET / conforme o histórico cresce, mantendo fixa a quantidade de itens
+exibidos (agendamentos de hoje, produtos com estoque crítico e contas em aberto). Com as
+visões mantidas pelo repositório, a latência deve ficar estável.
+
+Uso: python -m benchmarks.painel [--backend memoria|sqlite] [--tamanhos 1000,10000,100000,1000000]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ["BARBEARIA_LOG"] = "0"
+
+import httpx
+
+import main
+from modelos import Agendamento, Conta, Produto
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+HORAS = [f"{h:02d}:00" for h in range(9, 23)]
+EXIBIDOS = 10
+
+
+async def popular(repositorio, quantidade: int):
+    await repositorio.adicionarUsuario({"nome": "Bench", "email": "bench@barbearia",
+                                        "usuario": "bench", "senha": "bench"})
+    hoje = date.today()
+    inicio = hoje - timedelta(days=quantidade // len(HORAS) + 1)
+    for i in range(quantidade):
+        dia = hoje if i < EXIBIDOS else inicio + timedelta(days=i // len(HORAS))
+        await repositorio.adicionarAgendamento(Agendamento.deTexto(
+            f"Cliente {i}", "Corte", dia.isoformat(), HORAS[i % len(HORAS)]))
+        await repositorio.adicionarProduto(Produto.deTexto(
+            f"Produto {i}", 1 if i < EXIBIDOS else 50, "2030-01-01"))
+        await repositorio.adicionarConta(Conta.deTexto(
+            f"Conta {i}", "10.00", "2030-01-01", "Ativa" if i < EXIBIDOS else "Paga"))
+
+
+async def medir(repositorio, quantidade: int, repeticoes: int):
+    main.repositorio = repositorio
+    await popular(repositorio, quantidade)
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})
+        await cliente.get("/")
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            resposta = await cliente.get("/")
+            assert resposta.status_code == 200
+        duracao = time.perf_counter() - inicio
+    await repositorio.fechar()
+    return duracao / repeticoes * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="memoria", choices=["memoria", "sqlite"])
+    parser.add_argument("--tamanhos", default="1000,10000,100000,1000000")
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'registros':>10} | {'GET / (ms)':>10}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for quantidade in map(int, args.tamanhos.split(",")):
+            if args.backend == "sqlite":
+                repositorio = RepositorioSQLite(os.path.join(pasta, f"painel{quantidade}.db"))
+            else:
+                repositorio = RepositorioMemoria()
+            latencia = asyncio.run(medir(repositorio, quantidade, args.repeticoes))
+            print(f"{quantidade:>10} | {latencia:>10.2f}")
@@ -0,0 +1,60 @@
+"""
+Benchmark do custo do registro de requisições.
+
+Mede requisições por segundo com o middleware de log desligado e ligado em cada modo de
+captura de corpo, usando um cliente ASGI em processo.
+
+Uso: python -m benchmarks.registro [--requisicoes 2000]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+os.environ["BARBEARIA_LOG"] = "0"
+
+import httpx
+
+import main
+from registro import ConfiguracaoRegistro, RegistroRequisicoes, configurarRegistro, encerrarRegistro
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+async def vazao(app, requisicoes: int, concorrencia: int):
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        fila = iter(range(requisicoes))
+
+        async def trabalhador():
+            for i in fila:
+                if i % 2:
+                    await cliente.get("/login")
+                else:
+                    await cliente.post("/cadastro", data={"nome": "Bench", "email": "b@b",
+                                                          "usuario": f"u{i}", "senha": "x" * 2048})
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+        return requisicoes / (time.perf_counter() - inicio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{'configuração':>24} | {'req/s':>8}")
+    print(f"{'desligado':>24} | {asyncio.run(vazao(main.app, args.requisicoes, args.concorrencia)):>8.0f}")
+    with tempfile.TemporaryDirectory() as pasta:
+        for modo in ("desligado", "limitado", "amostra"):
+            config = ConfiguracaoRegistro(arquivo=os.path.join(pasta, f"{modo}.log"), modoCorpo=modo)
+            listener = configurarRegistro(config)
+            app = RegistroRequisicoes(main.app, config)
+            resultado = asyncio.run(vazao(app, args.requisicoes, args.concorrencia))
+            encerrarRegistro(listener)
+            print(f"{'ligado, corpo ' + modo:>24} | {resultado:>8.0f}")
@@ -0,0 +1,70 @@
+"""
+Benchmark da geração de relatórios.
+
+Mede latência e pico de memória (tracemalloc) da geração do relatório Excel com 100 mil
+linhas por aba e do relatório PDF com 10 mil, 100 mil e 500 mil linhas.
+
+Uso: python -m benchmarks.relatorios [--linhas 100000] [--linhas-pdf 10000,100000,500000]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from modelos import Agendamento, Conta, Produto
+from relatorios import gerarExcel, gerarPDF
+
+HORAS = [f"{h:02d}:00" for h in range(9, 23)]
+
+
+def gerarDados(linhas: int):
+    inicio = date(2000, 1, 1)
+    datas = [(inicio + timedelta(days=i // len(HORAS))).isoformat() for i in range(linhas)]
+    return {
+        "agendamentos": [Agendamento.deTexto(f"Cliente {i}", "Corte", datas[i], HORAS[i % len(HORAS)])
+                         for i in range(linhas)],
+        "estoque": [Produto.deTexto(f"Produto {i}", i % 50, datas[i]) for i in range(linhas)],
+        "contas": [Conta.deTexto(f"Conta {i}", "150.00", datas[i]) for i in range(linhas)],
+    }
+
+
+def medir(gerador, dados):
+    inicio = time.perf_counter()
+    arquivo = gerador(dados)
+    duracao = time.perf_counter() - inicio
+    tamanho = len(arquivo.read())
+    arquivo.close()
+
+    tracemalloc.start()
+    gerador(dados).close()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico, tamanho
+
+
+def gerarPDFTemporario(dados):
+    descritor, caminho = tempfile.mkstemp(suffix=".pdf")
+    os.close(descritor)
+    gerarPDF(dados, caminho)
+    arquivo = open(caminho, "rb")
+    os.remove(caminho)
+    return arquivo
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=100_000)
+    parser.add_argument("--linhas-pdf", default="10000,100000,500000")
+    args = parser.parse_args()
+
+    dados = gerarDados(args.linhas)
+    print(f"{'relatório':>10} | {'linhas/aba':>10} | {'tempo (s)':>9} | {'pico (MiB)':>10} | {'arquivo (KiB)':>13}")
+    duracao, pico, tamanho = medir(gerarExcel, dados)
+    print(f"{'excel':>10} | {args.linhas:>10} | {duracao:>9.2f} | {pico / 2**20:>10.1f} | {tamanho / 1024:>13.0f}")
+
+    for linhas in map(int, args.linhas_pdf.split(",")):
+        dados = {"agendamentos": gerarDados(linhas)["agendamentos"]}
+        duracao, pico, tamanho = medir(gerarPDFTemporario, dados)
+        print(f"{'pdf':>10} | {linhas:>10} | {duracao:>9.2f} | {pico / 2**20:>10.1f} | {tamanho / 1024:>13.0f}")
@@ -0,0 +1,173 @@
+"""
+Teste de estresse do agendamento concorrente e das reservas temporárias de horário.
+
+Dispara milhares de POST /agendar simultâneos, de vários usuários logados, para o mesmo horário, e
+confere que exatamente um foi aceito e que o horário ficou com um único agendamento. Com o backend
+SQLite, --processos N repete o teste com N processos, cada um com sua própria aplicação, gravando
+no mesmo arquivo, como workers diferentes. Por fim, confere que a reserva de um usuário bloqueia o
+horário para os outros e que o libera ao expirar.
+
+Uso: python -m benchmarks.reservas [--backend memoria|sqlite] [--requisicoes 2000] [--usuarios 200]
+                                   [--processos 1]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from datetime import date
+
+os.environ["BARBEARIA_LOG"] = "0"
+# Muitos usuários fazem login do mesmo endereço ao mesmo tempo: sem limite por IP nem na fila de
+# hashes, e com hash de senha barato.
+os.environ.setdefault("BARBEARIA_LOGIN_TENTATIVAS_IP", "0")
+os.environ.setdefault("BARBEARIA_SENHAS_PENDENTES", "100000")
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from repositorio import RepositorioMemoria, RepositorioSQLite
+
+DIA = date(2100, 1, 1)
+HORA = "10:00"
+
+
+async def logar(cliente, nome: str):
+    await cliente.post("/cadastro", data={"nome": nome, "email": f"{nome}@barbearia",
+                                          "usuario": nome, "senha": nome})
+    resposta = await cliente.post("/login", data={"usuario": nome, "senha": nome})
+    assert resposta.status_code == 303 and resposta.headers["location"] == "/", resposta.status_code
+
+
+async def disputar(repositorio, requisicoes: int, usuarios: int, prefixo: str = "usuario"):
+    """
+    Loga os usuários e dispara as requisições ao mesmo tempo; retorna os status e a duração.
+    """
+    main.repositorio = repositorio
+    transporte = httpx.ASGITransport(app=main.app)
+    clientes = [httpx.AsyncClient(transport=transporte, base_url="http://bench") for _ in range(usuarios)]
+    for i, cliente in enumerate(clientes):
+        await logar(cliente, f"{prefixo}{i}")
+    dados = {"servico": "Corte", "data": DIA.isoformat(), "hora": HORA}
+    inicio = time.perf_counter()
+    respostas = await asyncio.gather(*(clientes[i % usuarios].post("/agendar", data=dados)
+                                       for i in range(requisicoes)))
+    duracao = time.perf_counter() - inicio
+    for cliente in clientes:
+        await cliente.aclose()
+    return [resposta.status_code for resposta in respostas], duracao
+
+
+def conferir(status: list, agendamentos: list):
+    aceitos = status.count(303)
+    assert aceitos == 1, f"{aceitos} agendamentos aceitos para o mesmo horário"
+    assert status.count(409) == len(status) - 1, set(status)
+    assert len([ag for ag in agendamentos if ag.data == DIA]) == 1, "horário com mais de um agendamento"
+
+
+async def executar(repositorio, requisicoes: int, usuarios: int):
+    status, duracao = await disputar(repositorio, requisicoes, usuarios)
+    conferir(status, await repositorio.listarAgendamentos())
+    await repositorio.fechar()
+    return requisicoes / duracao
+
+
+def processo(caminho: str, indice: int, requisicoes: int, usuarios: int, barreira, fila):
+    async def rodar():
+        repositorio = RepositorioSQLite(caminho)
+        main.repositorio = repositorio
+        transporte = httpx.ASGITransport(app=main.app)
+        clientes = [httpx.AsyncClient(transport=transporte, base_url="http://bench") for _ in range(usuarios)]
+        for i, cliente in enumerate(clientes):
+            await logar(cliente, f"p{indice}u{i}")
+        barreira.wait()
+        dados = {"servico": "Corte", "data": DIA.isoformat(), "hora": HORA}
+        respostas = await asyncio.gather(*(clientes[i % usuarios].post("/agendar", data=dados)
+                                           for i in range(requisicoes)))
+        for cliente in clientes:
+            await cliente.aclose()
+        await repositorio.fechar()
+        return [resposta.status_code for resposta in respostas]
+
+    fila.put(asyncio.run(rodar()))
+
+
+def executarProcessos(caminho: str, processos: int, requisicoes: int, usuarios: int):
+    RepositorioSQLite(caminho).pool.fechar()
+    contexto = multiprocessing.get_context("spawn")
+    barreira = contexto.Barrier(processos + 1)
+    fila = contexto.Queue()
+    filhos = [contexto.Process(target=processo, args=(caminho, i, requisicoes // processos, usuarios, barreira, fila))
+              for i in range(processos)]
+    for filho in filhos:
+        filho.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    status = [codigo for _ in filhos for codigo in fila.get()]
+    duracao = time.perf_counter() - inicio
+    for filho in filhos:
+        filho.join()
+    repositorio = RepositorioSQLite(caminho)
+    conferir(status, asyncio.run(repositorio.listarAgendamentos()))
+    asyncio.run(repositorio.fechar())
+    return len(status) / duracao
+
+
+async def conferirReservas(repositorio):
+    """
+    Um usuário reserva o horário: outro não o vê nem consegue agendá-lo até a reserva expirar.
+    """
+    main.repositorio = repositorio
+    main.duracaoReserva = 0.5
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as dono, \
+            httpx.AsyncClient(transport=transporte, base_url="http://bench") as outro:
+        await logar(dono, "dono")
+        await logar(outro, "outro")
+        dados = {"data": DIA.isoformat(), "hora": HORA}
+        assert (await dono.post("/api/reservas", data=dados)).status_code == 200
+        assert (await dono.post("/api/reservas", data=dados)).status_code == 200, "o dono renova a própria reserva"
+        assert (await outro.post("/api/reservas", data=dados)).status_code == 409
+        pagina = (await outro.get(f"/agendar?data={DIA.isoformat()}")).text
+        assert f'value="{HORA}"' not in pagina, "horário reservado exibido para outro usuário"
+        assert f'value="{HORA}"' in (await dono.get(f"/agendar?data={DIA.isoformat()}")).text
+        resposta = await outro.post("/agendar", data={"servico": "Corte", **dados})
+        assert resposta.status_code == 409
+        await asyncio.sleep(0.6)
+        resposta = await outro.post("/agendar", data={"servico": "Corte", **dados})
+        assert resposta.status_code == 303, "o horário não foi liberado quando a reserva expirou"
+        assert (await dono.post("/api/reservas", data=dados)).status_code == 409
+    await repositorio.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", default="memoria", choices=["memoria", "sqlite"])
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--processos", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        def criar(nome: str):
+            if args.backend == "sqlite":
+                return RepositorioSQLite(os.path.join(pasta, f"{nome}.db"))
+            return RepositorioMemoria()
+
+        if args.processos > 1:
+            if args.backend != "sqlite":
+                parser.error("--processos requer --backend sqlite")
+            vazao = executarProcessos(os.path.join(pasta, "processos.db"), args.processos,
+                                      args.requisicoes, args.usuarios)
+            descricao = f"{args.processos} processos"
+        else:
+            vazao = asyncio.run(executar(criar("concorrencia"), args.requisicoes, args.usuarios))
+            descricao = "1 processo"
+        print(f"{args.requisicoes} POST /agendar simultâneos no mesmo horário ({descricao}): "
+              f"1 aceito, {args.requisicoes - 1} recusados ({vazao:.0f} req/s)")
+
+        asyncio.run(conferirReservas(criar("reservas")))
+        print("reservas: o horário reservado fica bloqueado para os outros usuários e é liberado ao expirar")
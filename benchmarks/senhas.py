@@ -0,0 +1,119 @@
+"""
+Latência dos demais endpoints durante uma rajada de logins.
+
+Enquanto vários clientes fazem login sem parar, um cliente já logado consulta GET /api/agendamentos
+e mede a latência (p50 e p99). Compara o serviço de senhas com o pool de processos a uma versão
+ingênua que calcula o scrypt dentro do event loop, e por fim simula um ataque de força bruta de um
+único IP, conferindo que o limitador de tentativas recusa a rajada com 429.
+
+Uso: python -m benchmarks.senhas [--segundos 5] [--simultaneos 8]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ["BARBEARIA_LOG"] = "0"
+
+import httpx
+
+import main
+from repositorio import RepositorioMemoria
+from senhas import LimitadorTentativas, ServicoSenhas, gerarHash
+
+
+class SenhasNoEventLoop(ServicoSenhas):
+    """
+    Versão ingênua, apenas para comparação: calcula o hash dentro do event loop.
+    """
+
+    async def _rodar(self, funcao, *args):
+        return funcao(*args)
+
+
+async def sondar(cliente, fim: float, parar: asyncio.Event, minimo: int = 20):
+    latencias = []
+    while time.perf_counter() < fim or len(latencias) < minimo:
+        inicio = time.perf_counter()
+        resposta = await cliente.get("/api/agendamentos")
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        assert resposta.status_code == 200
+        await asyncio.sleep(0.01)
+    parar.set()
+    return latencias
+
+
+async def logarSemParar(transporte, usuario: str, senha: str, parar: asyncio.Event):
+    status = []
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        while not parar.is_set():
+            resposta = await cliente.post("/login", data={"usuario": usuario, "senha": senha})
+            status.append(resposta.status_code)
+            # Como um cliente de rede, cede o event loop entre uma tentativa e outra.
+            await asyncio.sleep(0)
+    return status
+
+
+async def cenario(servico, segundos: float, atacantes: list, limitar: bool):
+    """
+    Roda a sonda durante segundos (e por pelo menos 20 requisições) enquanto cada atacante
+    (usuario, senha, ip) faz login sem parar.
+    Retorna as latências da sonda e os status dos logins.
+    """
+    main.senhas = servico
+    main.limitadorUsuarios = LimitadorTentativas(5 if limitar else 0, 60)
+    main.limitadorIPs = LimitadorTentativas(20 if limitar else 0, 60)
+    transporte = httpx.ASGITransport(app=main.app, client=("10.0.0.1", 1))
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as sonda:
+        resposta = await sonda.post("/login", data={"usuario": "sonda", "senha": "sonda"})
+        assert resposta.status_code == 303
+        parar = asyncio.Event()
+        latencias, *status = await asyncio.gather(
+            sondar(sonda, time.perf_counter() + segundos, parar),
+            *(logarSemParar(httpx.ASGITransport(app=main.app, client=(ip, 1)), usuario, senha, parar)
+              for usuario, senha, ip in atacantes))
+    servico.fechar()
+    return latencias, [codigo for lista in status for codigo in lista]
+
+
+def resumir(nome: str, latencias: list, status: list):
+    percentis = statistics.quantiles(latencias, n=100)
+    logins = status.count(303)
+    recusados = status.count(429)
+    print(f"{nome:<32} | {percentis[49]:>8.1f} | {percentis[98]:>8.1f} | {logins:>7} | {recusados:>9}")
+
+
+async def executar(segundos: float, simultaneos: int):
+    main.repositorio = RepositorioMemoria()
+    parametros = main.senhas.parametros
+    hashSenha = gerarHash("senha", parametros)
+    await main.repositorio.adicionarUsuario({"nome": "Sonda", "email": "sonda@barbearia", "usuario": "sonda",
+                                             "senha": gerarHash("sonda", parametros)})
+    for i in range(simultaneos):
+        await main.repositorio.adicionarUsuario({"nome": f"Cliente {i}", "email": f"{i}@barbearia",
+                                                 "usuario": f"usuario{i}", "senha": hashSenha})
+    legitimos = [(f"usuario{i}", "senha", f"10.1.0.{i}") for i in range(simultaneos)]
+
+    print(f"{'cenário':<32} | {'p50 (ms)':>8} | {'p99 (ms)':>8} | {'logins':>7} | {'recusados':>9}")
+    latencias, status = await cenario(ServicoSenhas(parametros), segundos, [], limitar=True)
+    resumir("sem logins", latencias, status)
+    latencias, status = await cenario(SenhasNoEventLoop(parametros), segundos, legitimos, limitar=False)
+    resumir("rajada, hash no event loop", latencias, status)
+    latencias, status = await cenario(ServicoSenhas(parametros), segundos, legitimos, limitar=False)
+    resumir("rajada, pool de processos", latencias, status)
+
+    forcaBruta = [("usuario0", f"errada{i}", "10.2.0.1") for i in range(simultaneos)]
+    latencias, status = await cenario(ServicoSenhas(parametros), segundos, forcaBruta, limitar=True)
+    resumir("força bruta de um IP, limitada", latencias, status)
+    assert status.count(303) == 0
+    assert len(status) - status.count(429) <= 5, "o limitador deixou passar mais tentativas que o permitido"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segundos", type=float, default=5)
+    parser.add_argument("--simultaneos", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(executar(args.segundos, args.simultaneos))
@@ -0,0 +1,94 @@
+"""
+Teste de concorrência e microbenchmark das sessões de login.
+
+Simula centenas de usuários, cada um com seu próprio cookie, que fazem login e agendam ao mesmo
+tempo, e confere que cada agendamento ficou no nome de quem o fez e que o logout encerra apenas
+a própria sessão. Também mede o custo de validar uma sessão com 100 mil sessões ativas.
+
+Uso: python -m benchmarks.sessoes [--sessoes memoria|sqlite] [--usuarios 300]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ["BARBEARIA_LOG"] = "0"
+# Muitos usuários fazem login do mesmo endereço ao mesmo tempo: sem limite por IP nem na fila de
+# hashes, e com hash de senha barato.
+os.environ.setdefault("BARBEARIA_LOGIN_TENTATIVAS_IP", "0")
+os.environ.setdefault("BARBEARIA_SENHAS_PENDENTES", "100000")
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from repositorio import RepositorioMemoria
+from sessoes import SessoesMemoria, SessoesSQLite
+
+HORAS = [f"{h:02d}:00" for h in range(9, 23)]
+
+
+async def usuarioSimulado(transporte, i: int):
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await cliente.post("/cadastro", data={"nome": f"Cliente {i}", "email": f"{i}@barbearia",
+                                              "usuario": f"usuario{i}", "senha": f"senha{i}"})
+        resposta = await cliente.post("/login", data={"usuario": f"usuario{i}", "senha": f"senha{i}"})
+        assert resposta.status_code == 303 and resposta.headers["location"] == "/", resposta.status_code
+        dia = date(2100, 1, 1) + timedelta(days=i // len(HORAS))
+        resposta = await cliente.post("/agendar", data={"servico": "Corte", "data": dia.isoformat(),
+                                                        "hora": HORAS[i % len(HORAS)]})
+        assert resposta.status_code == 303 and resposta.headers["location"] == "/agendamentos"
+        await cliente.post("/logout")
+        resposta = await cliente.get("/perfil")
+        assert resposta.status_code == 303, "a sessão continuou válida depois do logout"
+        return dia, HORAS[i % len(HORAS)], f"Cliente {i}"
+
+
+async def simular(armazenamento, usuarios: int):
+    main.repositorio = RepositorioMemoria()
+    main.sessoes = armazenamento
+    transporte = httpx.ASGITransport(app=main.app)
+    inicio = time.perf_counter()
+    esperados = await asyncio.gather(*(usuarioSimulado(transporte, i) for i in range(usuarios)))
+    duracao = time.perf_counter() - inicio
+    agendados = {(ag.dataFormatada, ag.horaFormatada): ag.cliente
+                 for ag in await main.repositorio.listarAgendamentos()}
+    for dia, hora, cliente in esperados:
+        assert agendados[(dia.strftime("%d/%m/%Y"), hora)] == cliente, "agendamento no nome de outro usuário"
+    return usuarios / duracao
+
+
+async def medirValidacao(armazenamento, quantidade: int, repeticoes: int):
+    tokens = [await armazenamento.criar(f"usuario{i}") for i in range(quantidade)]
+    inicio = time.perf_counter()
+    for i in range(repeticoes):
+        assert await armazenamento.obter(tokens[i * 7919 % quantidade]) is not None
+    return (time.perf_counter() - inicio) / repeticoes * 1_000_000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessoes", default="memoria", choices=["memoria", "sqlite"])
+    parser.add_argument("--usuarios", type=int, default=300)
+    parser.add_argument("--ativas", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        def criar(nome: str):
+            if args.sessoes == "sqlite":
+                return SessoesSQLite(os.path.join(pasta, f"{nome}.db"))
+            return SessoesMemoria()
+
+        armazenamento = criar("concorrencia")
+        vazao = asyncio.run(simular(armazenamento, args.usuarios))
+        asyncio.run(armazenamento.fechar())
+        print(f"{args.usuarios} usuários simultâneos: todos os agendamentos conferem ({vazao:.0f} usuários/s)")
+
+        armazenamento = criar("validacao")
+        custo = asyncio.run(medirValidacao(armazenamento, args.ativas, args.repeticoes))
+        asyncio.run(armazenamento.fechar())
+        print(f"validação de sessão com {args.ativas} sessões ativas: {custo:.1f} µs")
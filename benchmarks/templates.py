@@ -0,0 +1,114 @@
+"""
+Benchmark da renderização dos templates.
+
+Mede o início a frio (criar o ambiente do Jinja2 e carregar todos os templates) sem cache de
+bytecode, compilando tudo, e com o cache de bytecode já preenchido por outro "worker". Depois
+preenche o estoque, as contas e os agendamentos e mede GET /estoque, /contas e /agendamentos com
+páginas de 100 itens em três configurações: como antes (auto-reload ligado e sem cache de
+fragmentos), com o cache de fragmentos e com o cache de fragmentos e a resposta em partes. Confere
+que as três produzem o mesmo HTML e que uma alteração aparece na próxima requisição.
+
+Uso: python -m benchmarks.templates [--registros 10000] [--repeticoes 200]
+Requer o pacote httpx.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+os.environ["BARBEARIA_LOG"] = "0"
+os.environ.setdefault("BARBEARIA_SCRYPT_N", "1024")
+
+import httpx
+
+import main
+from modelos import Agendamento, Conta, Produto
+from renderizacao import ConfiguracaoTemplates, criarTemplates, precompilar
+from repositorio import RepositorioMemoria
+
+PAGINAS = ("/estoque?limite=100", "/contas?limite=100", "/agendamentos?limite=100")
+
+
+def medirInicio(config: ConfiguracaoTemplates, repeticoes: int):
+    """
+    Cria um ambiente novo e carrega todos os templates, repetidamente; retorna a média em ms.
+    """
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        precompilar(criarTemplates(config))
+    return (time.perf_counter() - inicio) / repeticoes * 1000
+
+
+async def popular(repositorio, quantidade: int):
+    for i in range(quantidade):
+        await repositorio.adicionarProduto(Produto.deTexto(f"Produto {i}", i % 50, f"2030-{i % 12 + 1:02d}-01"))
+        await repositorio.adicionarConta(Conta.deTexto(f"Conta {i}", "10.00", f"2030-{i % 12 + 1:02d}-10"))
+        await repositorio.adicionarAgendamento(Agendamento.deTexto(f"Cliente {i}", "Corte", f"2030-{i % 12 + 1:02d}-15",
+                                                                   f"{9 + i % 12:02d}:00"))
+
+
+async def medirPaginas(cliente, config: ConfiguracaoTemplates, repeticoes: int):
+    """
+    Usa a configuração na aplicação e mede cada página; retorna as latências em ms e o HTML de cada página.
+    """
+    main.configTemplates = config
+    main.templates = criarTemplates(config, estatico=main.estaticos.url)
+    precompilar(main.templates)
+    latencias, htmls = {}, {}
+    for pagina in PAGINAS:
+        htmls[pagina] = (await cliente.get(pagina)).text
+        latencias[pagina] = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resposta = await cliente.get(pagina)
+            latencias[pagina].append((time.perf_counter() - inicio) * 1000)
+            assert resposta.status_code == 200 and resposta.text == htmls[pagina], pagina
+    return latencias, htmls
+
+
+async def executar(quantidade: int, repeticoes: int):
+    with tempfile.TemporaryDirectory() as pasta:
+        semCache = ConfiguracaoTemplates(pastaBytecode=None, recarregar=True, limiteFragmentos=0)
+        comCache = ConfiguracaoTemplates(pastaBytecode=pasta)
+        precompilar(criarTemplates(comCache))
+        assert os.listdir(pasta), "o cache de bytecode não foi gravado"
+        print(f"{'início a frio (todos os templates)':<40} | {'ms':>8}")
+        print(f"{'sem cache de bytecode':<40} | {medirInicio(semCache, repeticoes // 10 or 1):>8.2f}")
+        print(f"{'com cache de bytecode':<40} | {medirInicio(comCache, repeticoes // 10 or 1):>8.2f}")
+
+    main.repositorio = RepositorioMemoria()
+    await popular(main.repositorio, quantidade)
+    transporte = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as cliente:
+        await cliente.post("/cadastro", data={"nome": "Bench", "email": "bench@barbearia",
+                                              "usuario": "bench", "senha": "bench"})
+        assert (await cliente.post("/login", data={"usuario": "bench", "senha": "bench"})).status_code == 303
+
+        configuracoes = (("antes", semCache),
+                         ("cache de fragmentos", ConfiguracaoTemplates(pastaBytecode=None)),
+                         ("fragmentos, em partes", ConfiguracaoTemplates(pastaBytecode=None, emPartes=True)))
+        print(f"\n{'página (p50 ms)':<26} | " + " | ".join(f"{nome:>21}" for nome, _ in configuracoes))
+        resultados = []
+        for _, config in configuracoes:
+            resultados.append(await medirPaginas(cliente, config, repeticoes))
+        for pagina in PAGINAS:
+            assert len({htmls[pagina] for _, htmls in resultados}) == 1, f"HTML diferente em {pagina}"
+            print(f"{pagina:<26} | " + " | ".join(f"{statistics.median(latencias[pagina]):>21.3f}"
+                                                   for latencias, _ in resultados))
+
+        assert (await cliente.post("/alterar_estoque/1", data={"nome": "Alterado", "quantidade": "7",
+                                                                "validade": "2030-01-01"})).status_code == 303
+        assert "Alterado" in (await cliente.get(PAGINAS[0])).text, "fragmento desatualizado após alteração"
+        cache = main.templates.env.cacheFragmentos
+        print(f"\ncache de fragmentos: {cache.acertos} acertos, {cache.falhas} falhas, {cache.bytesUsados} bytes")
+    await main.repositorio.fechar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--registros", type=int, default=10_000)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(executar(args.registros, args.repeticoes))
@@ -0,0 +1,65 @@
+import threading
+from collections import OrderedDict
+
+
+class CacheVersionado:
+    """
+    Cache LRU limitado em bytes, em que cada entrada guarda a versão dos dados que a gerou.
+
+    Uma entrada só é devolvida enquanto a versão informada na consulta for a mesma com que foi
+    guardada; quando os dados mudam, a entrada antiga é descartada na próxima consulta. Ao passar
+    de limiteBytes, as entradas usadas há mais tempo são removidas primeiro.
+    """
+
+    def __init__(self, limiteBytes: int, limiteEntrada: int = None):
+        self.limiteBytes = limiteBytes
+        self.limiteEntrada = limiteEntrada or limiteBytes
+        self.bytesUsados = 0
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, versao):
+        """
+        Retorna o valor guardado para a chave se ele corresponder à versão informada, ou None.
+        """
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is None or entrada[0] != versao:
+                if entrada is not None:
+                    self._remover(chave)
+                self.falhas += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.acertos += 1
+            return entrada[1]
+
+    def guardar(self, chave, versao, valor, tamanho: int = None):
+        """
+        Guarda o valor para a chave e versão informadas, removendo as entradas menos usadas se
+        o limite for ultrapassado. Valores maiores que limiteEntrada não são guardados.
+        """
+        tamanho = len(valor) if tamanho is None else tamanho
+        if tamanho > self.limiteEntrada:
+            return False
+        with self._trava:
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = (versao, valor, tamanho)
+            self.bytesUsados += tamanho
+            while self.bytesUsados > self.limiteBytes:
+                self._remover(next(iter(self._entradas)))
+        return True
+
+    def limpar(self):
+        with self._trava:
+            self._entradas.clear()
+            self.bytesUsados = 0
+
+    def _remover(self, chave):
+        _, _, tamanho = self._entradas.pop(chave)
+        self.bytesUsados -= tamanho
+
+    def __len__(self):
+        return len(self._entradas)
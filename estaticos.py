@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+# Formatos já comprimidos, que não ganham nada com gzip ou brotli.
+EXTENSOES_COMPRIMIDAS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".woff", ".woff2", ".gz", ".br", ".zip"}
+TAMANHO_MINIMO_COMPRESSAO = 256
+TAMANHO_HASH = 12
+
+
+@dataclass(slots=True)
+class Arquivo:
+    """
+    Um arquivo estático carregado na inicialização: o conteúdo em cada codificação disponível
+    ("identity", "gzip" e, com o pacote brotli, "br"), o tipo de mídia e o hash do conteúdo.
+    """
+    nome: str
+    nomeVersionado: str
+    tipo: str
+    hash: str
+    variantes: dict
+
+
+def versionar(nome: str, hash: str):
+    """
+    Insere o hash no nome do arquivo, antes da extensão: "js/script.js" vira "js/script.<hash>.js".
+    """
+    raiz, extensao = os.path.splitext(nome)
+    return f"{raiz}.{hash}{extensao}"
+
+
+def comprimir(nome: str, conteudo: bytes):
+    """
+    Gera as variantes comprimidas do conteúdo, mantendo apenas as menores que o original.
+    """
+    variantes = {"identity": conteudo}
+    if len(conteudo) < TAMANHO_MINIMO_COMPRESSAO or os.path.splitext(nome)[1].lower() in EXTENSOES_COMPRIMIDAS:
+        return variantes
+    candidatas = {"gzip": gzip.compress(conteudo, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        candidatas["br"] = brotli.compress(conteudo, quality=11)
+    for codificacao, comprimido in candidatas.items():
+        if len(comprimido) < len(conteudo):
+            variantes[codificacao] = comprimido
+    return variantes
+
+
+def codificacoesAceitas(cabecalho: str):
+    """
+    Lê o Accept-Encoding e retorna as codificações aceitas (com q maior que zero).
+    """
+    aceitas = set()
+    for item in cabecalho.split(","):
+        nome, _, parametros = item.partition(";")
+        peso = 1.0
+        parametros = parametros.strip().lower()
+        if parametros.startswith("q="):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        if nome.strip() and peso > 0:
+            aceitas.add(nome.strip().lower())
+    if "*" in aceitas:
+        aceitas.update(("br", "gzip"))
+    return aceitas
+
+
+class ArquivosEstaticos:
+    """
+    Arquivos estáticos com nomes versionados pelo hash do conteúdo, variantes comprimidas e
+    cache de longa duração.
+
+    Na inicialização, cada arquivo da pasta é lido uma vez, ganha um nome com os primeiros
+    caracteres do seu SHA-256 e tem as variantes gzip e brotli calculadas. Os templates usam
+    url(nome), que devolve o endereço versionado: como o endereço muda sempre que o conteúdo
+    muda, ele é servido com Cache-Control immutable e o navegador não precisa revalidá-lo a cada
+    página. O nome original continua disponível, com revalidação pelo ETag. A variante enviada é
+    escolhida pelo Accept-Encoding, preferindo brotli.
+
+    Arquivos adicionados à pasta depois da inicialização só são servidos após reiniciar.
+    """
+
+    def __init__(self, pasta: str, prefixo: str = "/static"):
+        self.pasta = pasta
+        self.prefixo = prefixo
+        self._porCaminho = {}
+        self._porNome = {}
+        for raiz, _, nomes in os.walk(pasta):
+            for nome in sorted(nomes):
+                caminho = os.path.join(raiz, nome)
+                self._carregar(os.path.relpath(caminho, pasta).replace(os.sep, "/"), caminho)
+
+    def _carregar(self, nome: str, caminho: str):
+        with open(caminho, "rb") as arquivo:
+            conteudo = arquivo.read()
+        hash = hashlib.sha256(conteudo).hexdigest()[:TAMANHO_HASH]
+        tipo = mimetypes.guess_type(nome)[0] or "application/octet-stream"
+        if tipo.startswith("text/") or tipo in ("application/javascript", "image/svg+xml"):
+            tipo += "; charset=utf-8"
+        registro = Arquivo(nome, versionar(nome, hash), tipo, hash, comprimir(nome, conteudo))
+        self._porNome[nome] = registro
+        self._porCaminho[nome] = (registro, False)
+        self._porCaminho[registro.nomeVersionado] = (registro, True)
+
+    def url(self, nome: str):
+        """
+        Retorna o endereço versionado do arquivo, para uso nos templates.
+        Lança ValueError se o arquivo não existir na pasta.
+        """
+        registro = self._porNome.get(nome)
+        if registro is None:
+            raise ValueError(f"Arquivo estático desconhecido: {nome}")
+        return f"{self.prefixo}/{registro.nomeVersionado}"
+
+    def responder(self, caminho: str, aceitaCodificacao: str = "", seNenhumCorresponder: str = "",
+                  cabeca: bool = False):
+        """
+        Monta a resposta do arquivo no caminho (relativo à pasta), na melhor codificação aceita.
+
+        Responde 304 se o ETag da variante estiver em If-None-Match e 404 se o caminho não for de
+        um arquivo carregado. Com cabeca (requisições HEAD), envia apenas os cabeçalhos.
+        """
+        encontrado = self._porCaminho.get(caminho)
+        if encontrado is None:
+            return Response("Arquivo não encontrado.", status_code=404, media_type="text/plain")
+        registro, versionado = encontrado
+        aceitas = codificacoesAceitas(aceitaCodificacao) if len(registro.variantes) > 1 else ()
+        codificacao = next((nome for nome in ("br", "gzip") if nome in aceitas and nome in registro.variantes),
+                           "identity")
+        conteudo = registro.variantes[codificacao]
+        etag = f'"{registro.hash}-{codificacao}"'
+        cabecalhos = {"ETag": etag, "Cache-Control": CACHE_IMUTAVEL if versionado else CACHE_REVALIDAR}
+        if len(registro.variantes) > 1:
+            cabecalhos["Vary"] = "Accept-Encoding"
+        if codificacao != "identity":
+            cabecalhos["Content-Encoding"] = codificacao
+        if etag in seNenhumCorresponder:
+            return Response(status_code=304, headers=cabecalhos)
+        if cabeca:
+            cabecalhos["Content-Length"] = str(len(conteudo))
+            return Response(media_type=registro.tipo, headers=cabecalhos)
+        return Response(conteudo, media_type=registro.tipo, headers=cabecalhos)
+
+    def __iter__(self):
+        return iter(self._porNome.values())
+
+    def __len__(self):
+        return len(self._porNome)
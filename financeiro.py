@@ -0,0 +1,225 @@
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+
+from modelos import CENTAVOS, Conta
+
+STATUS_CONTAS = ("Ativa", "Atraso", "Paga")
+STATUS_CONTAS_ABERTAS = ("Ativa", "Atraso")
+ZERO = Decimal("0.00")
+# Meses da projeção de vencimentos, contando o atual, e o máximo aceito na API.
+MESES_PROJECAO = 3
+MESES_PROJECAO_MAXIMO = 24
+# Meses do fluxo antes e depois do mês atual quando nenhum limite é informado, e máximo do fluxo.
+MESES_FLUXO_PADRAO = 12
+MESES_FLUXO_MAXIMO = 240
+
+
+def mesDe(data: date):
+    """
+    Retorna o mês de uma data como texto YYYY-MM, a chave dos totais mensais.
+    """
+    return f"{data.year:04d}-{data.month:02d}"
+
+
+def lerMes(texto: str):
+    """
+    Valida um mês YYYY-MM e o retorna normalizado.
+    Lança ValueError se o texto não for um mês válido.
+    """
+    try:
+        return mesDe(date.fromisoformat(f"{texto.strip()}-01"))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Mês inválido: {texto}")
+
+
+def somarMeses(mes: str, quantidade: int):
+    """
+    Retorna o mês (YYYY-MM) quantidade meses depois de mes, ou antes, se quantidade for negativa.
+    """
+    indice = int(mes[:4]) * 12 + int(mes[5:7]) - 1 + quantidade
+    return f"{indice // 12:04d}-{indice % 12 + 1:02d}"
+
+
+def mesesEntre(inicio: str, fim: str):
+    """
+    Quantidade de meses de inicio a fim, inclusive (zero ou negativa se fim for anterior).
+    """
+    return (int(fim[:4]) - int(inicio[:4])) * 12 + int(fim[5:7]) - int(inicio[5:7]) + 1
+
+
+def centavosParaValor(centavos: int):
+    """
+    Converte uma soma em centavos, como as guardadas no SQLite, em Decimal com duas casas.
+    """
+    return Decimal(centavos).scaleb(-2).quantize(CENTAVOS)
+
+
+def valorParaCentavos(valor: Decimal):
+    """
+    Converte um valor com duas casas no inteiro de centavos guardado no SQLite, sem passar por float.
+    """
+    return int(valor.scaleb(2))
+
+
+@dataclass(slots=True)
+class Total:
+    """
+    Soma exata, em Decimal, e quantidade de um grupo de contas.
+    """
+    valor: Decimal = ZERO
+    quantidade: int = 0
+
+    def somar(self, valor: Decimal, quantidade: int = 1):
+        self.valor += valor
+        self.quantidade += quantidade
+
+    @property
+    def valorFormatado(self):
+        return f"{self.valor:.2f}"
+
+    def paraDicionario(self):
+        return {"valor": str(self.valor), "quantidade": self.quantidade}
+
+
+class TotaisContas:
+    """
+    Totais das contas por (mês de vencimento, status), mantidos a cada escrita.
+
+    Cadastrar, alterar, excluir ou mudar o status de uma conta soma ou subtrai o valor dela no
+    total do seu mês e status, então os resumos financeiros custam proporcionalmente à quantidade
+    de meses com contas, e não à quantidade de contas.
+    """
+
+    def __init__(self):
+        self._totais = {}
+
+    @classmethod
+    def deContas(cls, contas):
+        """
+        Monta os totais de uma lista de contas, como as de um relatório.
+        """
+        totais = cls()
+        for conta in contas:
+            totais.somar(conta)
+        return totais
+
+    def somar(self, conta: Conta, sinal: int = 1):
+        """
+        Soma a conta ao total do seu mês e status; com sinal -1, retira-a.
+        """
+        chave = (mesDe(conta.vencimento), conta.status)
+        total = self._totais.get(chave)
+        if total is None:
+            total = self._totais[chave] = Total()
+        total.somar(conta.valor * sinal, sinal)
+        if not total.quantidade:
+            del self._totais[chave]
+
+    def consultar(self):
+        """
+        Retorna {(mês, status): Total} com uma cópia de cada total.
+        """
+        return {chave: Total(total.valor, total.quantidade) for chave, total in self._totais.items()}
+
+
+@dataclass(slots=True)
+class MesFinanceiro:
+    """
+    Contas com vencimento em um mês: total previsto, pago, em aberto e atrasado.
+    """
+    mes: str
+    previsto: Total = field(default_factory=Total)
+    pago: Total = field(default_factory=Total)
+    emAberto: Total = field(default_factory=Total)
+    atrasado: Total = field(default_factory=Total)
+
+    def somar(self, status: str, total: Total):
+        self.previsto.somar(total.valor, total.quantidade)
+        if status == "Paga":
+            self.pago.somar(total.valor, total.quantidade)
+        elif status in STATUS_CONTAS_ABERTAS:
+            self.emAberto.somar(total.valor, total.quantidade)
+            if status == "Atraso":
+                self.atrasado.somar(total.valor, total.quantidade)
+
+    def paraDicionario(self):
+        return {"mes": self.mes, "previsto": self.previsto.paraDicionario(), "pago": self.pago.paraDicionario(),
+                "emAberto": self.emAberto.paraDicionario(), "atrasado": self.atrasado.paraDicionario()}
+
+
+@dataclass(slots=True)
+class ResumoFinanceiro:
+    """
+    Totais por status, fluxo de caixa mensal pelo vencimento e projeção dos próximos vencimentos.
+
+    Em totais, "emAberto" soma as contas ativas e atrasadas. Cada item da projeção traz o que
+    vence no mês e ainda não foi pago (no mês atual, inclusive o que já está atrasado) e o
+    acumulado até ele.
+    """
+    totais: dict
+    fluxo: list
+    projecao: list
+
+    def paraDicionario(self):
+        return {
+            "totais": {nome: total.paraDicionario() for nome, total in self.totais.items()},
+            "fluxo": [mes.paraDicionario() for mes in self.fluxo],
+            "projecao": [{"mes": mes, **total.paraDicionario(), "acumulado": str(acumulado)}
+                         for mes, total, acumulado in self.projecao]
+        }
+
+
+def resumirFinanceiro(totais: dict, hoje: date, inicio: str = None, fim: str = None,
+                      meses: int = MESES_PROJECAO):
+    """
+    Monta o ResumoFinanceiro a partir dos totais por (mês, status), sem olhar as contas.
+
+    O fluxo vai de inicio a fim (meses YYYY-MM, inclusive), com todos os meses do intervalo,
+    mesmo os sem contas. Sem nenhum dos dois, cobre os MESES_FLUXO_PADRAO meses antes e depois
+    do mês de hoje; com só um, vai dele até o primeiro ou o último mês com contas, no máximo
+    MESES_FLUXO_MAXIMO meses. Em qualquer caso, os meses sem informar ficam dentro dos meses com
+    contas, então uma conta com vencimento muito distante não alonga o fluxo padrão. A projeção
+    cobre meses meses a partir do mês de hoje. Os totais por status consideram todos os meses.
+    """
+    porStatus = {status: Total() for status in STATUS_CONTAS}
+    emAberto = Total()
+    porMes = {}
+    for (mes, status), total in totais.items():
+        if status in porStatus:
+            porStatus[status].somar(total.valor, total.quantidade)
+        if status in STATUS_CONTAS_ABERTAS:
+            emAberto.somar(total.valor, total.quantidade)
+        porMes.setdefault(mes, []).append((status, total))
+
+    if porMes and (inicio is None or fim is None):
+        if inicio is None and fim is None:
+            inicio = max(min(porMes), somarMeses(mesDe(hoje), -MESES_FLUXO_PADRAO))
+            fim = min(max(porMes), somarMeses(mesDe(hoje), MESES_FLUXO_PADRAO))
+        elif fim is None:
+            fim = min(max(porMes), somarMeses(inicio, MESES_FLUXO_MAXIMO - 1))
+        else:
+            inicio = max(min(porMes), somarMeses(fim, 1 - MESES_FLUXO_MAXIMO))
+    fluxo = []
+    mes = inicio
+    while inicio is not None and fim is not None and mes <= fim:
+        financeiro = MesFinanceiro(mes)
+        for status, total in porMes.get(mes, ()):
+            financeiro.somar(status, total)
+        fluxo.append(financeiro)
+        mes = somarMeses(mes, 1)
+
+    projecao = []
+    acumulado = ZERO
+    for posicao in range(meses):
+        mes = somarMeses(mesDe(hoje), posicao)
+        aVencer = Total()
+        for status, total in porMes.get(mes, ()):
+            if status in STATUS_CONTAS_ABERTAS:
+                aVencer.somar(total.valor, total.quantidade)
+        acumulado += aVencer.valor
+        projecao.append((mes, aVencer, acumulado))
+
+    return ResumoFinanceiro({"ativas": porStatus["Ativa"], "atrasadas": porStatus["Atraso"],
+                             "pagas": porStatus["Paga"], "emAberto": emAberto},
+                            fluxo, projecao)
@@ -0,0 +1,317 @@
+import asyncio
+import codecs
+import csv
+import io
+import json
+from datetime import date
+
+from agenda import minutos
+from financeiro import STATUS_CONTAS
+from modelos import Agendamento, Conta, Produto, lerData
+from paginacao import Consulta
+
+FORMATOS = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+# Colunas de cada tabela na importação e na exportação em CSV (que acrescenta o id no início).
+COLUNAS = {
+    "agendamentos": ("cliente", "servico", "data", "hora", "situacao", "barbeiro"),
+    "estoque": ("nome", "quantidade", "validade"),
+    "contas": ("descricao", "valor", "vencimento", "status"),
+}
+# Colunas de texto livre, que no CSV exportado são protegidas contra fórmulas de planilha.
+COLUNAS_TEXTO = {"cliente", "servico", "situacao", "barbeiro", "nome", "descricao"}
+# Caracteres iniciais que fazem uma planilha interpretar a célula como fórmula.
+INICIOS_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+# Inícios que recebem o apóstrofo na exportação CSV: os de fórmula e o próprio apóstrofo, para que
+# um texto que já começa com ele volte igual na importação.
+INICIOS_PROTEGIDOS = INICIOS_FORMULA + ("'",)
+OBRIGATORIAS = {
+    "agendamentos": ("cliente", "servico", "data", "hora"),
+    "estoque": ("nome", "quantidade"),
+    "contas": ("descricao", "valor", "vencimento"),
+}
+TAMANHO_LOTE = 5000
+TAMANHO_PAGINA_EXPORTACAO = 1000
+LIMITE_ERROS = 1000
+# Maior linha aceita sem quebra; acima disso o arquivo é recusado em vez de acumulado em memória.
+LIMITE_LINHA = 1024 * 1024
+
+
+class ErroImportacao(ValueError):
+    """
+    O arquivo inteiro é inválido (formato, codificação ou cabeçalho), e não apenas uma linha.
+    """
+
+
+async def lerLinhas(pedacos):
+    """
+    Decodifica os pedaços de bytes em UTF-8, conforme chegam, e produz (número, linha) para cada
+    linha, sem a quebra. Só a linha incompleta do fim de cada pedaço fica guardada.
+    Lança ErroImportacao se o texto não for UTF-8 ou uma linha passar de LIMITE_LINHA.
+    """
+    decodificador = codecs.getincrementaldecoder("utf-8-sig")()
+    resto = ""
+    numero = 0
+    try:
+        async for pedaco in pedacos:
+            texto = resto + decodificador.decode(pedaco)
+            linhas = texto.split("\n")
+            resto = linhas.pop()
+            if len(resto) > LIMITE_LINHA:
+                raise ErroImportacao(f"Linha {numero + 1} maior que {LIMITE_LINHA} caracteres.")
+            for linha in linhas:
+                numero += 1
+                yield numero, linha.removesuffix("\r")
+        resto += decodificador.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise ErroImportacao(f"O arquivo deve estar em UTF-8 (erro depois da linha {numero}).")
+    if resto:
+        yield numero + 1, resto.removesuffix("\r")
+
+
+async def lerCSV(pedacos):
+    """
+    Lê um CSV com cabeçalho e produz (linha, campos, erro) para cada registro, com os campos em um
+    dicionário pelo nome da coluna. Um campo entre aspas pode ter quebras de linha: as linhas são
+    juntadas até o número de aspas ficar par, e a linha informada é a do início do registro.
+    Lança ErroImportacao se um registro passar de LIMITE_LINHA caracteres, como acontece com uma
+    aspa sem fechamento no meio do arquivo.
+    """
+    cabecalho = None
+    partes, inicio, aspas, tamanho = [], None, 0, 0
+    async for numero, linha in lerLinhas(pedacos):
+        if not partes:
+            inicio = numero
+        partes.append(linha)
+        aspas += linha.count('"')
+        tamanho += len(linha)
+        if aspas % 2:
+            if tamanho > LIMITE_LINHA:
+                raise ErroImportacao(f"Registro da linha {inicio} maior que {LIMITE_LINHA} caracteres "
+                                     "(aspas sem fechamento?).")
+            continue
+        # Sem aspas, o registro do dialeto padrão do csv é exatamente a linha separada por vírgulas.
+        registro = next(csv.reader(["\n".join(partes)]), []) if aspas else linha.split(",")
+        partes, aspas, tamanho = [], 0, 0
+        if not any(campo.strip() for campo in registro):
+            continue
+        if cabecalho is None:
+            cabecalho = [campo.strip().lower() for campo in registro]
+            yield inicio, cabecalho, None
+        elif len(registro) != len(cabecalho):
+            yield inicio, None, f"Esperados {len(cabecalho)} campos, encontrados {len(registro)}."
+        else:
+            yield inicio, dict(zip(cabecalho, registro)), None
+    if partes:
+        yield inicio, None, "Aspas sem fechamento no fim do arquivo."
+
+
+async def lerJSONL(pedacos):
+    """
+    Lê JSON Lines e produz (linha, campos, erro) para cada objeto; linhas em branco são ignoradas.
+    """
+    async for numero, linha in lerLinhas(pedacos):
+        if not linha.strip():
+            continue
+        try:
+            campos = json.loads(linha)
+        except ValueError:
+            yield numero, None, "JSON inválido."
+            continue
+        if isinstance(campos, dict):
+            yield numero, campos, None
+        else:
+            yield numero, None, "Cada linha deve ser um objeto JSON."
+
+
+def protegerFormula(texto: str):
+    """
+    Acrescenta um apóstrofo antes de um texto que uma planilha abriria como fórmula (como
+    "=cmd()"), como recomendado contra injeção de CSV, ou que já comece com um apóstrofo.
+    removerProtecao desfaz a troca sem perder nenhum texto.
+    """
+    return "'" + texto if texto.startswith(INICIOS_PROTEGIDOS) else texto
+
+
+def removerProtecao(texto: str):
+    """
+    Retira o apóstrofo que protegerFormula acrescentou; textos que ele não alteraria ficam como estão.
+    """
+    return texto[1:] if texto.startswith("'") and texto[1:].startswith(INICIOS_PROTEGIDOS) else texto
+
+
+def _texto(campos: dict, coluna: str, protegido: bool):
+    valor = campos.get(coluna)
+    if valor is None:
+        return ""
+    if protegido and coluna in COLUNAS_TEXTO:
+        return removerProtecao(str(valor)).strip()
+    return str(valor).strip()
+
+
+def converterRegistro(tabela: str, campos: dict, agenda, protegido: bool = False):
+    """
+    Converte os campos de uma linha no registro da tabela, com as mesmas validações dos formulários.
+    Colunas desconhecidas (como o id de uma exportação) são ignoradas. Com protegido (linhas de
+    CSV), o apóstrofo acrescentado por protegerFormula na exportação é retirado dos textos.
+    Lança ValueError com a mensagem do erro se a linha for inválida.
+    """
+    valores = {coluna: _texto(campos, coluna, protegido) for coluna in COLUNAS[tabela]}
+    vazias = [coluna for coluna in OBRIGATORIAS[tabela] if not valores[coluna]]
+    if vazias:
+        raise ValueError(f"Campo obrigatório vazio: {', '.join(vazias)}.")
+    if tabela == "agendamentos":
+        try:
+            agendamento = Agendamento.deTexto(valores["cliente"], valores["servico"], valores["data"], valores["hora"],
+                                              valores["situacao"] or "Ativo", valores["barbeiro"] or None)
+        except ValueError:
+            raise ValueError("Data ou hora inválida.")
+        if agendamento.barbeiro is not None and agendamento.barbeiro not in agenda.barbeiros:
+            raise ValueError(f"Barbeiro inválido: {agendamento.barbeiro}.")
+        if not agenda.cabe(minutos(agendamento.hora), agenda.duracao(agendamento.servico)):
+            raise ValueError("Horário fora do funcionamento.")
+        return agendamento
+    if tabela == "estoque":
+        try:
+            quantidade = int(valores["quantidade"])
+        except ValueError:
+            raise ValueError(f"Quantidade inválida: {valores['quantidade']}.")
+        if quantidade < 0:
+            raise ValueError(f"Quantidade inválida: {quantidade}.")
+        try:
+            return Produto(valores["nome"], quantidade, lerData(valores["validade"]) if valores["validade"] else None)
+        except ValueError:
+            raise ValueError("Validade inválida.")
+    status = valores["status"] or "Ativa"
+    if status not in STATUS_CONTAS:
+        raise ValueError(f"Status inválido: {status}.")
+    try:
+        return Conta.deTexto(valores["descricao"], valores["valor"], valores["vencimento"], status)
+    except ValueError:
+        raise ValueError("Valor ou vencimento inválido.")
+
+
+class Importacao:
+    """
+    Resultado de uma importação: linhas lidas, registros importados e os erros por linha.
+
+    Guarda no máximo LIMITE_ERROS erros; os demais só são contados, para que um arquivo inteiro
+    inválido não ocupe memória proporcional ao seu tamanho. Os conflitos só são conhecidos ao
+    aplicar o lote, então os erros são ordenados pela linha ao montar o resultado.
+    """
+
+    def __init__(self, tabela: str):
+        self.tabela = tabela
+        self.linhas = 0
+        self.importados = 0
+        self.erros = []
+        self.errosOmitidos = 0
+
+    def registrarErro(self, linha: int, mensagem: str):
+        if len(self.erros) < LIMITE_ERROS:
+            self.erros.append({"linha": linha, "erro": mensagem})
+        else:
+            self.errosOmitidos += 1
+
+    def paraDicionario(self):
+        return {"tabela": self.tabela, "linhas": self.linhas, "importados": self.importados,
+                "erros": sorted(self.erros, key=lambda erro: erro["linha"]), "errosOmitidos": self.errosOmitidos}
+
+
+async def importar(repositorio, tabela: str, formato: str, pedacos, tamanhoLote: int = TAMANHO_LOTE):
+    """
+    Importa um arquivo CSV ou JSONL recebido em pedaços de bytes (como request.stream()).
+
+    As linhas são lidas e validadas conforme chegam e aplicadas em lotes de tamanhoLote com
+    importarLote, então a memória usada depende do lote, e não do tamanho do arquivo. Enquanto
+    um lote é gravado, o seguinte já vai sendo lido; só um lote é gravado por vez, na ordem do
+    arquivo, então os conflitos são os mesmos de uma importação linha a linha. Linhas
+    inválidas e agendamentos em conflito com os já gravados (ou com outra linha do arquivo) são
+    registrados como erros e não impedem as demais; os lotes já aplicados continuam gravados.
+    Lança ErroImportacao se o arquivo inteiro for inválido: formato desconhecido, texto fora de
+    UTF-8 ou, no CSV, cabeçalho sem as colunas obrigatórias (nesse caso, nada é importado).
+    """
+    if formato not in FORMATOS:
+        raise ErroImportacao(f"Formato inválido: {formato}. Use {', '.join(FORMATOS)}.")
+    resultado = Importacao(tabela)
+    lote, gravando = [], None
+
+    async def aplicar(lote: list):
+        aceitos = await repositorio.importarLote(tabela, [registro for _, registro in lote])
+        for (linha, _), aceito in zip(lote, aceitos):
+            if aceito:
+                resultado.importados += 1
+            else:
+                resultado.registrarErro(linha, "Horário em conflito com outro agendamento.")
+
+    registros = lerCSV(pedacos) if formato == "csv" else lerJSONL(pedacos)
+    if formato == "csv":
+        async for linha, cabecalho, erro in registros:
+            if cabecalho is None:
+                raise ErroImportacao(f"Cabeçalho inválido na linha {linha}: {erro}")
+            faltando = [coluna for coluna in OBRIGATORIAS[tabela] if coluna not in cabecalho]
+            if faltando:
+                raise ErroImportacao(f"Colunas obrigatórias ausentes no cabeçalho: {', '.join(faltando)}.")
+            break
+    try:
+        async for linha, campos, erro in registros:
+            resultado.linhas += 1
+            if erro is None:
+                try:
+                    lote.append((linha, converterRegistro(tabela, campos, repositorio.agenda, formato == "csv")))
+                except ValueError as excecao:
+                    erro = str(excecao)
+            if erro is not None:
+                resultado.registrarErro(linha, erro)
+            if len(lote) >= tamanhoLote:
+                if gravando is not None:
+                    await gravando
+                gravando, lote = asyncio.ensure_future(aplicar(lote)), []
+    finally:
+        if gravando is not None:
+            await gravando
+    if lote:
+        await aplicar(lote)
+    return resultado
+
+
+def _linhaCSV(valores: list):
+    saida = io.StringIO()
+    csv.writer(saida, lineterminator="\n").writerow(valores)
+    return saida.getvalue()
+
+
+async def exportar(repositorio, tabela: str, formato: str, inicio: date = None, fim: date = None,
+                   tamanhoPagina: int = TAMANHO_PAGINA_EXPORTACAO):
+    """
+    Produz o conteúdo da tabela em CSV (com cabeçalho e o id na primeira coluna) ou JSONL, em
+    pedaços de bytes de uma página cada. As páginas são lidas pela listagem paginada por id, com
+    cursor, então a memória usada depende do tamanho da página, e não da tabela, e os registros
+    gravados durante a exportação não fazem nenhum outro ser repetido ou pulado. inicio e fim
+    filtram pela data, validade ou vencimento, como nas listagens. No CSV, os textos passam por
+    protegerFormula; o CSV exportado pode ser importado de novo.
+    """
+    colunas = ("id",) + COLUNAS[tabela]
+    if formato == "csv":
+        yield _linhaCSV(colunas).encode()
+    apos = None
+    while True:
+        pagina = await repositorio.listarPagina(Consulta(tabela, inicio=inicio, fim=fim, apos=apos,
+                                                         limite=tamanhoPagina))
+        if not pagina.itens:
+            break
+        saida = io.StringIO()
+        if formato == "csv":
+            escritor = csv.writer(saida, lineterminator="\n")
+            for registro in pagina.itens:
+                dicionario = registro.paraDicionario()
+                escritor.writerow(["" if dicionario[coluna] is None
+                                   else protegerFormula(dicionario[coluna]) if coluna in COLUNAS_TEXTO
+                                   else dicionario[coluna] for coluna in colunas])
+        else:
+            for registro in pagina.itens:
+                saida.write(json.dumps(registro.paraDicionario(), ensure_ascii=False))
+                saida.write("\n")
+        yield saida.getvalue().encode()
+        if pagina.proximo is None:
+            break
+        apos = (pagina.itens[-1].id,)
@@ -1,116 +1,278 @@
-from fastapi import FastAPI, Request, Form, Depends, HTTPException
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi import FastAPI, Request, Form, Depends, HTTPException, Body
+from fastapi.responses import HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi import status
 from datetime import datetime, time, timedelta, date
-from openpyxl import Workbook
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from contextlib import asynccontextmanager
+import asyncio
 import os
-import logging
+import anyio
+
+from agendador import Agendador, ConfiguracaoAgendador
+from cache import CacheVersionado
+from estaticos import ArquivosEstaticos
+from financeiro import (MESES_FLUXO_MAXIMO, MESES_PROJECAO, MESES_PROJECAO_MAXIMO, STATUS_CONTAS,
+                        STATUS_CONTAS_ABERTAS, lerMes, mesesEntre, resumirFinanceiro)
+from importacao import COLUNAS, FORMATOS, ErroImportacao, exportar, importar
+from metricas import TIPO_MIDIA_PROMETHEUS, ConfiguracaoMetricas, MetricasRequisicoes, RegistroMetricas
+from registro import ConfiguracaoRegistro, RegistroRequisicoes, configurarRegistro, encerrarRegistro
+from renderizacao import ConfiguracaoTemplates, criarTemplates, precompilar, responderTemplate
+from relatorios import (ABAS, TIPOS_MIDIA, encerrarExecutor, gerarEtag, gerarExcel, gerarPDFEmProcesso,
+                        lerAbas, lerEmPedacos, lerSeCouber)
+from modelos import Agendamento, Conta, Movimento, Produto, formatarHora, lerData
+from movimentos import LIMITE_MOVIMENTOS, EstoqueInsuficiente
+from notificacoes import ConfiguracaoNotificacoes, criarEntregador
+from paginacao import LIMITE_MAXIMO, LIMITE_PADRAO, Consulta, Pagina
+from repositorio import LIMITE_ESTOQUE_CRITICO, criarRepositorio
+from senhas import LimitadorTentativas, criarServicoSenhas
+from sessoes import NOME_COOKIE, criarArmazenamentoSessoes
+
+repositorio = criarRepositorio()
+sessoes = criarArmazenamentoSessoes()
+cookieSeguro = os.environ.get("BARBEARIA_COOKIE_SEGURO", "0") == "1"
+duracaoReserva = float(os.environ.get("BARBEARIA_RESERVA_SEGUNDOS", "300"))
+senhas = criarServicoSenhas()
+janelaLogin = float(os.environ.get("BARBEARIA_LOGIN_JANELA", "60"))
+limitadorUsuarios = LimitadorTentativas(int(os.environ.get("BARBEARIA_LOGIN_TENTATIVAS", "5")), janelaLogin)
+limitadorIPs = LimitadorTentativas(int(os.environ.get("BARBEARIA_LOGIN_TENTATIVAS_IP", "20")), janelaLogin)
+configRegistro = ConfiguracaoRegistro.deAmbiente()
+configMetricas = ConfiguracaoMetricas.deAmbiente()
+metricas = RegistroMetricas()
+configAgendador = ConfiguracaoAgendador.deAmbiente()
+agendador = Agendador(repositorio, criarEntregador(ConfiguracaoNotificacoes.deAmbiente()), configAgendador)
+# Janela padrão e máxima, em dias, da consulta de disponibilidade (o formulário aceita até 3 meses).
+DIAS_DISPONIBILIDADE_PADRAO = 60
+DIAS_DISPONIBILIDADE_MAXIMO = 92
+# Janela padrão, em dias, dos produtos a vencer, e máximo de movimentações por lote na API.
+DIAS_VENCIMENTO_PADRAO = 30
+MOVIMENTOS_POR_LOTE = 10000
+LIMITE_MAXIMO_MOVIMENTOS = 500
+ROTULOS_MOVIMENTO = {"venda": "Venda", "entrada": "Entrada", "saida": "Saída", "ajuste": "Ajuste"}
+configTemplates = ConfiguracaoTemplates.deAmbiente()
+cacheRelatorios = CacheVersionado(int(os.environ.get("BARBEARIA_CACHE_RELATORIOS_MB", "64")) * 1024 * 1024,
+                                  limiteEntrada=16 * 1024 * 1024)
+
+
+@asynccontextmanager
+async def cicloDeVida(app: FastAPI):
+    """
+    Controla a inicialização e o encerramento da aplicação, iniciando a escrita dos logs, a
+    medição do atraso do event loop e o agendador em segundo plano, pré-compilando os templates e,
+    no encerramento, entregando as notificações pendentes e fechando as conexões do repositório,
+    das sessões e os pools de processos dos relatórios e das senhas.
+    """
+    listenerRegistro = configurarRegistro(configRegistro) if configRegistro.ativo else None
+    monitorLoop = (asyncio.create_task(metricas.monitorarLoop(configMetricas.intervaloLoop))
+                   if configMetricas.ativo else None)
+    precompilar(templates)
+    if configAgendador.ativo:
+        await agendador.iniciar()
+    yield
+    if monitorLoop is not None:
+        monitorLoop.cancel()
+    await agendador.parar()
+    await repositorio.fechar()
+    await sessoes.fechar()
+    encerrarExecutor()
+    senhas.fechar()
+    if listenerRegistro is not None:
+        encerrarRegistro(listenerRegistro)
+
 
 app = FastAPI(docs_url="/documentacao-endpoint",
               redoc_url="/documentacao-sistema",
-              openapi_url="/minha-openapi.json")
-templates = Jinja2Templates(directory="templates")
-app.mount("/static", StaticFiles(directory="static"), name="static")
+              openapi_url="/minha-openapi.json",
+              lifespan=cicloDeVida)
+estaticos = ArquivosEstaticos("static")
+templates = criarTemplates(configTemplates, estatico=estaticos.url, metricas=metricas.histograma(
+    "barbearia_template_duracao_segundos", "Duração da renderização de cada template.", ("template",))
+    if configMetricas.ativo else None)
+if configRegistro.ativo:
+    app.add_middleware(RegistroRequisicoes, config=configRegistro)
+if configMetricas.ativo:
+    app.add_middleware(MetricasRequisicoes, metricas=metricas)
+
+
+def consultasCaches():
+    caches = {"relatorios": cacheRelatorios, "fragmentos": templates.env.cacheFragmentos,
+              "disponibilidade": repositorio.cacheDisponibilidade}
+    valores = {}
+    for nome, cache in caches.items():
+        if cache is not None:
+            valores[(nome, "acerto")] = cache.acertos
+            valores[(nome, "falha")] = cache.falhas
+    return valores
+
+
+metricas.coletada("barbearia_cache_consultas_total", "Consultas aos caches, por resultado.",
+                  ("cache", "resultado"), "counter", consultasCaches)
+metricas.coletada("barbearia_notificacoes_total", "Notificações entregues e descartadas.", ("resultado",), "counter",
+                  lambda: {("entregue",): agendador.entregador.entregues,
+                           ("descartada",): agendador.entregador.descartadas})
+
+
+@app.api_route("/static/{caminho:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def arquivoEstatico(caminho: str, request: Request):
+    """
+    Serve os arquivos estáticos, pelo nome versionado (com cache imutável) ou pelo nome original
+    (revalidado pelo ETag), na melhor compressão aceita pelo navegador.
+    """
+    return estaticos.responder(caminho, request.headers.get("accept-encoding", ""),
+                               request.headers.get("if-none-match", ""), cabeca=request.method == "HEAD")
 
-agendamentos = []
-estoque = []
-contas = []
-usuarios = {}
-loginUsuario = None
-horarioInicial = datetime.strptime("09:00", "%H:%M").time()
-horarioFinal = datetime.strptime("22:00", "%H:%M").time()
-intervaloHoras = 1
 
-logging.basicConfig(filename="logs.log",
-                    format="%(asctime)s - %(levelname)s - %(message)s",
-                    level=logging.INFO)
+async def verificarLogin(request: Request):
+    """
+    Verifica se o usuário está logado pelo cookie de sessão e retorna o usuário, caso contrário,
+    redireciona para a página de login.
+    Lança uma exceção HTTPException se o login não for realizado ou a sessão tiver expirado.
+    """
+    usuario = await sessoes.obter(request.cookies.get(NOME_COOKIE))
+    if usuario is None:
+        raise HTTPException(status_code=303,
+                            detail="Redirecionando para login",
+                            headers={"Location": "/login"})
+    return usuario
+
+
+def parametrosListagem(ordem: str = "id",
+                       decrescente: bool = False,
+                       inicio: str = None,
+                       fim: str = None,
+                       status: str = None,
+                       prefixo: str = None,
+                       apos: str = None,
+                       limite: int = LIMITE_PADRAO):
+    """
+    Dependência com os parâmetros de ordenação, filtro e paginação comuns às listagens.
+    Campos vazios do formulário de filtros são tratados como ausentes.
+    Lança uma exceção HTTPException 400 se alguma data for inválida.
+    """
+    try:
+        inicio = lerData(inicio) if inicio else None
+        fim = lerData(fim) if fim else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data inválida no filtro.")
+    return {
+        "ordem": ordem,
+        "decrescente": decrescente,
+        "inicio": inicio,
+        "fim": fim,
+        "status": status or None,
+        "prefixo": prefixo or None,
+        "apos": apos or None,
+        "limite": limite
+    }
 
 
-@app.middleware("http")
-async def logRequests(request: Request, call_next):
+async def obterPagina(tabela: str, parametros: dict, cliente: str = None):
     """
-    Middleware para registrar detalhes das requisições HTTP e respostas geradas.
-    Loga o método da requisição, a URL, o corpo da requisição (se houver) e o status da resposta.
+    Busca no repositório uma página da tabela com os parâmetros da listagem.
+    Lança uma exceção HTTPException 400 se a ordenação, o cursor ou os filtros forem inválidos.
     """
-    logging.info(f"Recebida requisição: {request.method} {request.url}")
-    if request.method in ["POST", "PUT", "DELETE", "PATCH", "GET"]:
-        body = await request.body()
-        logging.info(
-            f"Corpo da requisição: {body.decode('utf-8') if body else 'Sem corpo'}"
-        )
+    try:
+        consulta = Consulta.deParametros(tabela, cliente=cliente, **parametros)
+    except ValueError as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+    return await repositorio.listarPagina(consulta)
 
-    response = await call_next(request)
-    logging.info(f"Resposta gerada: status {response.status_code}")
-    return response
+
+def contextoPagina(request: Request, pagina: Pagina, parametros: dict):
+    """
+    Monta as variáveis de template da paginação: os filtros atuais e os links da primeira e da
+    próxima página, que preservam os filtros da requisição.
+    """
+    url = request.url.remove_query_params(["apos", "mensagem"])
+    proximo = url.include_query_params(apos=pagina.proximo)
+    return {
+        "pagina": pagina,
+        "filtros": parametros,
+        "linkPrimeira": f"{url.path}?{url.query}" if parametros["apos"] else None,
+        "linkProximo": f"{proximo.path}?{proximo.query}" if pagina.proximo else None
+    }
 
 
-def verificarLogin(request: Request):
+async def contextoFragmento(request: Request, tabela: str, *extras):
     """
-    Verifica se o usuário está logado, caso contrário, redireciona para a página de login.
-    Lança uma exceção HTTPException se o login não for realizado.
+    Monta a chave e a versão do fragmento em cache com a tabela da listagem.
+
+    A chave reúne o caminho e os parâmetros da requisição (exceto a mensagem, que fica fora da
+    tabela), o repositório e os extras, como o usuário; a versão é o contador de alterações da
+    tabela, lido antes da consulta da página, de modo que uma escrita concorrente apenas força uma
+    nova renderização na próxima requisição.
     """
-    global loginUsuario
-    if loginUsuario is None:
-        raise HTTPException(status_code=303,
-                            detail="Redirecionando para login",
-                            headers={"Location": "/login"})
+    versao = (await repositorio.versoesDados())[tabela]
+    url = request.url.remove_query_params("mensagem")
+    return {
+        "fragmentoChave": (url.path, url.query, repositorio.identificador, *extras),
+        "fragmentoVersao": versao
+    }
 
 
-def obterHorariosDisponiveis(data: str):
+@metricas.cronometrado("disponibilidade")
+async def obterHorariosDisponiveis(data: date, usuario: str = None, servico: str = None, barbeiro: str = None):
     """
     Obtém os horários disponíveis para agendamento em uma data específica.
-    Verifica se o horário está ocupado e retorna os horários disponíveis.
+    Considera a duração do serviço e os intervalos já agendados ou reservados por outros usuários
+    de cada barbeiro (ou apenas do escolhido), e retorna os horários em que ao menos um deles está
+    livre, formatados como HH:MM.
     """
-    dataSelecionada = datetime.strptime(data, "%Y-%m-%d").date()
-    horaAtual = datetime.combine(dataSelecionada, horarioInicial)
-    horariosDisponiveis = []
-    hoje = datetime.now().date()
-    horaAtualAgora = datetime.now().time()
+    duracao = repositorio.agenda.duracao(servico)
+    livres = (await repositorio.horariosLivres(data, data, duracao, usuario, barbeiro))[data]
+    return [formatarHora(hora) for hora in horariosFuturos(data, livres, datetime.now())]
 
-    while horaAtual.time() <= horarioFinal:
-        ocupado = any(agendamento["data"] == data
-                      and agendamento["hora"] == horaAtual.strftime("%H:%M")
-                      for agendamento in agendamentos)
 
-        if not ocupado and (dataSelecionada != hoje
-                            or horaAtual.time() > horaAtualAgora):
-            horariosDisponiveis.append(horaAtual.strftime("%H:%M"))
+def horariosFuturos(data: date, livres: dict, agora: datetime):
+    """
+    Filtra os horários livres de uma data ({hora: barbeiros}) que ainda não passaram: nenhum em
+    datas passadas e, hoje, apenas os posteriores ao horário atual. Como depende da hora da consulta,
+    o filtro é aplicado sobre o resultado do cache, e não guardado nele.
+    """
+    if data < agora.date():
+        return {}
+    if data > agora.date():
+        return livres
+    return {hora: barbeiros for hora, barbeiros in livres.items() if hora > agora.time()}
 
-        horaAtual += timedelta(hours=intervaloHoras)
 
-    return horariosDisponiveis
+async def paginaAgendar(request: Request, usuario: str, data: date, servico: str = None, barbeiro: str = None,
+                        mensagem: str = None, status_code: int = 200):
+    """
+    Monta a página de agendamento com os serviços, os barbeiros e os horários disponíveis.
+    """
+    agenda = repositorio.agenda
+    return templates.TemplateResponse(
+        "agendar.html", {
+            "request": request,
+            "data": data.isoformat(),
+            "servicos": [(nome, agenda.duracao(nome)) for nome in agenda.servicos],
+            "servico": servico,
+            "barbeiros": agenda.barbeiros,
+            "barbeiro": barbeiro,
+            "horariosDisponiveis": await obterHorariosDisponiveis(data, usuario, servico, barbeiro),
+            "hoje": date.today().isoformat(),
+            "mensagem": mensagem
+        }, status_code=status_code)
 
 
 @app.get("/", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
 async def index(request: Request):
     """
-    Endpoint que exibe a página inicial com agendamentos do dia, estoque crítico e contas a vencer.
+    Endpoint que exibe a página inicial com agendamentos do dia, estoque crítico, contas a vencer
+    e o resumo financeiro (totais em aberto, atrasados e pagos e os vencimentos dos próximos meses).
     """
     hoje = datetime.now().date()
-    agendamentosDia = [
-        ag for ag in agendamentos
-        if datetime.strptime(ag["data"], "%Y-%m-%d").date() == hoje
-    ]
-    estoqueCritico = [prod for prod in estoque if int(prod["quantidade"]) < 5]
-    contasVencer = [conta for conta in contas if conta["status"] in ["Ativa", "Atraso"]]
-
-    agendamentosDia = [{
-        "cliente": ag["cliente"],
-        "servico": ag["servico"],
-        "data": datetime.strptime(ag["data"], "%Y-%m-%d").strftime("%d/%m/%Y"),
-        "hora": ag["hora"]
-    } for ag in agendamentosDia]
+    agendamentosDia = await repositorio.listarAgendamentosData(hoje)
+    estoqueCritico = await repositorio.listarEstoqueCritico()
+    contasVencer = await repositorio.listarContasStatus(STATUS_CONTAS_ABERTAS)
+    financeiro = resumirFinanceiro(await repositorio.totaisContas(), hoje)
 
     return templates.TemplateResponse(
         "index.html", {
             "request": request,
             "agendamentosDia": agendamentosDia,
             "estoqueCritico": estoqueCritico,
-            "contasVencer": contasVencer
+            "contasVencer": contasVencer,
+            "financeiro": financeiro
         })
 
 
@@ -122,17 +284,42 @@ async def loginPagina(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 
+def recusarTentativa(request: Request, template: str):
+    """
+    Resposta 429 para tentativas acima do limite ou com o pool de senhas sobrecarregado.
+    """
+    resposta = templates.TemplateResponse(template, {
+        "request": request,
+        "error": "Muitas tentativas. Tente novamente em instantes."
+    }, status_code=429)
+    resposta.headers["Retry-After"] = str(int(janelaLogin))
+    return resposta
+
+
 @app.post("/login")
 async def realizarLogin(request: Request,
                         usuario: str = Form(...),
                         senha: str = Form(...)):
     """
-    Endpoint que processa o login do usuário.
+    Endpoint que processa o login do usuário, criando uma sessão e enviando seu token em um cookie.
+
+    A senha é conferida com o hash scrypt no pool de processos do serviço de senhas. As tentativas
+    são limitadas por IP e por usuário, e recusadas com 429 quando o pool já tem hashes demais na
+    fila, para que uma rajada de força bruta não o esgote. Senhas em texto puro ou com parâmetros
+    de hash antigos são convertidas no login.
     """
-    global loginUsuario
-    if usuario in usuarios and usuarios[usuario]["senha"] == senha:
-        loginUsuario = usuario
-        return RedirectResponse("/", status_code=303)
+    ip = request.client.host if request.client else ""
+    if not limitadorIPs.permitir(ip) or not limitadorUsuarios.permitir(usuario) or senhas.ocupado:
+        return recusarTentativa(request, "login.html")
+    dadosUsuario = await repositorio.obterUsuario(usuario)
+    valida, novoHash = await senhas.verificar(senha, dadosUsuario["senha"] if dadosUsuario else None)
+    if valida:
+        if novoHash is not None:
+            await repositorio.alterarSenha(usuario, novoHash)
+        resposta = RedirectResponse("/", status_code=303)
+        resposta.set_cookie(NOME_COOKIE, await sessoes.criar(usuario), httponly=True, samesite="lax",
+                            secure=cookieSeguro)
+        return resposta
     return templates.TemplateResponse("login.html", {
         "request": request,
         "error": "Usuário ou senha inválidos."
@@ -154,148 +341,283 @@ async def realizarCadastro(request: Request,
                            usuario: str = Form(...),
                            senha: str = Form(...)):
     """
-    Endpoint que processa o cadastro de um novo usuário.
+    Endpoint que processa o cadastro de um novo usuário, guardando apenas o hash da senha.
+    Um nome de usuário já cadastrado é recusado com 409, sem alterar a conta existente.
     """
-    usuarios[usuario] = {
+    ip = request.client.host if request.client else ""
+    if not limitadorIPs.permitir(ip) or senhas.ocupado:
+        return recusarTentativa(request, "cadastro.html")
+    if await repositorio.obterUsuario(usuario) is None and await repositorio.adicionarUsuario({
         "nome": nome,
         "email": email,
         "usuario": usuario,
-        "senha": senha
-    }
-    return RedirectResponse("/login", status_code=303)
+        "senha": await senhas.gerar(senha)
+    }):
+        return RedirectResponse("/login", status_code=303)
+    return templates.TemplateResponse("cadastro.html", {
+        "request": request,
+        "error": "Usuário já existe."
+    }, status_code=409)
 
 
 @app.post("/logout", dependencies=[Depends(verificarLogin)])
-async def logout():
+async def logout(request: Request):
     """
-    Endpoint para realizar o logout do usuário.
+    Endpoint para realizar o logout do usuário, encerrando a sessão e apagando o cookie.
     """
-    global loginUsuario
-    loginUsuario = None
-    return RedirectResponse("/login", status_code=303)
+    await sessoes.remover(request.cookies.get(NOME_COOKIE))
+    resposta = RedirectResponse("/login", status_code=303)
+    resposta.delete_cookie(NOME_COOKIE)
+    return resposta
 
 
-@app.get("/agendar", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def agendar(request: Request, data: str = None):
+@app.get("/agendar", response_class=HTMLResponse)
+async def agendar(request: Request, data: date = None, servico: str = None, barbeiro: str = None,
+                  usuario: str = Depends(verificarLogin)):
     """
-    Endpoint para exibir a página de agendamento, com horários disponíveis para a data selecionada.
+    Endpoint para exibir a página de agendamento, com horários disponíveis para a data, o serviço
+    e o barbeiro selecionados.
     """
-    data = data or datetime.now().strftime("%Y-%m-%d")
-    horariosDisponiveis = obterHorariosDisponiveis(data)
-    hoje = date.today().isoformat()
-    return templates.TemplateResponse(
-        "agendar.html", {
-            "request": request,
-            "data": data,
-            "horariosDisponiveis": horariosDisponiveis,
-            "hoje": hoje
-        })
+    if barbeiro not in repositorio.agenda.barbeiros:
+        barbeiro = None
+    return await paginaAgendar(request, usuario, data or datetime.now().date(), servico, barbeiro)
 
 
-@app.post("/agendar", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+@app.post("/agendar", response_class=HTMLResponse)
 async def realizarAgendamento(request: Request,
                               servico: str = Form(...),
                               data: str = Form(...),
-                              hora: str = Form(...)):
+                              hora: str = Form(...),
+                              barbeiro: str = Form(""),
+                              usuario: str = Depends(verificarLogin)):
     """
     Endpoint para processar o agendamento de um serviço para um cliente.
+
+    A data e a hora são validadas e convertidas uma única vez, ao criar o agendamento. Sem
+    barbeiro escolhido, o agendamento fica com o primeiro barbeiro livre durante toda a duração
+    do serviço. A verificação do intervalo e a gravação são atômicas (agendarSeLivre): entre
+    requisições simultâneas que se sobrepõem no mesmo barbeiro, apenas uma é aceita. Depois de
+    gravado, o agendamento gera a notificação de novo agendamento e tem o lembrete programado.
     """
-    for agendamento in agendamentos:
-        if agendamento["data"] == data and agendamento["hora"] == hora:
-            return templates.TemplateResponse(
-                "agendar.html", {
-                    "request": request,
-                    "data": data,
-                    "horariosDisponiveis": obterHorariosDisponiveis(data),
-                    "hoje": date.today().isoformat(),
-                    "mensagem": "Horário indisponível para a data selecionada."
-                })
-    nomeCliente = usuarios[loginUsuario]["nome"]
-    novoAgendamento = {
-        "cliente": nomeCliente,
-        "servico": servico,
-        "data": data,
-        "hora": hora,
-        "situacao": "Ativo"
-    }
-    agendamentos.append(novoAgendamento)
+    nomeCliente = (await repositorio.obterUsuario(usuario))["nome"]
+    barbeiro = barbeiro or None
+    try:
+        novoAgendamento = Agendamento.deTexto(nomeCliente, servico, data, hora, barbeiro=barbeiro)
+    except ValueError:
+        return await paginaAgendar(request, usuario, date.today(), servico, mensagem="Data ou hora inválida.",
+                                   status_code=400)
+    if barbeiro is not None and barbeiro not in repositorio.agenda.barbeiros:
+        return await paginaAgendar(request, usuario, novoAgendamento.data, servico,
+                                   mensagem="Barbeiro inválido.", status_code=400)
+    if not await repositorio.agendarSeLivre(novoAgendamento, usuario):
+        return await paginaAgendar(request, usuario, novoAgendamento.data, servico, barbeiro,
+                                   mensagem="Horário indisponível para a data selecionada.", status_code=409)
+    agendador.notificarAgendamento(novoAgendamento)
     return RedirectResponse(url="/agendamentos", status_code=303)
 
 
+@app.post("/api/reservas")
+async def reservarHorario(data: str = Form(...),
+                          hora: str = Form(...),
+                          servico: str = Form(""),
+                          barbeiro: str = Form(""),
+                          usuario: str = Depends(verificarLogin)):
+    """
+    Reserva temporariamente um horário para o usuário logado enquanto ele preenche o agendamento.
+
+    A reserva cobre a duração do serviço, com o barbeiro escolhido ou o primeiro livre, dura
+    BARBEARIA_RESERVA_SEGUNDOS (300 por padrão) e substitui a reserva anterior do mesmo usuário;
+    se ele abandonar o formulário, o horário volta a ficar disponível quando ela expira. Enquanto
+    isso, o intervalo não aparece para os outros usuários e POST /agendar o recusa para eles.
+    Responde 409 se o horário já estiver agendado ou reservado por outro usuário.
+    """
+    try:
+        reserva = Agendamento.deTexto(usuario, servico, data, hora, barbeiro=barbeiro or None)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data ou hora inválida.")
+    if reserva.barbeiro is not None and reserva.barbeiro not in repositorio.agenda.barbeiros:
+        raise HTTPException(status_code=400, detail="Barbeiro inválido.")
+    if not await repositorio.reservarHorario(reserva, usuario, duracaoReserva):
+        raise HTTPException(status_code=409, detail="Horário indisponível.")
+    return {"data": reserva.data.isoformat(), "hora": formatarHora(reserva.hora), "barbeiro": reserva.barbeiro,
+            "duracao": reserva.duracao, "expiraEm": duracaoReserva}
+
+
+@app.get("/api/disponibilidade")
+async def apiDisponibilidade(inicio: str = None,
+                             fim: str = None,
+                             servico: str = None,
+                             barbeiro: str = None,
+                             horarios: bool = False,
+                             usuario: str = Depends(verificarLogin)):
+    """
+    Retorna em JSON a disponibilidade de um serviço em cada dia de um período, para o calendário
+    da página de agendamento: a quantidade de horários livres por dia e, com horarios=true, os
+    horários com os barbeiros livres em cada um.
+
+    O período vai de inicio (hoje, por padrão) a fim (inclusive; por padrão, 60 dias) e pode ter até
+    92 dias. Os dias vêm do cache de disponibilidade do repositório, que recalcula apenas as datas
+    alteradas por agendamentos ou cancelamentos desde a última consulta; os horários de hoje que já
+    passaram são descartados na resposta. Responde 400 se o período ou o barbeiro forem inválidos.
+    """
+    try:
+        inicio = lerData(inicio) if inicio else date.today()
+        fim = lerData(fim) if fim else inicio + timedelta(days=DIAS_DISPONIBILIDADE_PADRAO - 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data inválida.")
+    if fim < inicio or (fim - inicio).days >= DIAS_DISPONIBILIDADE_MAXIMO:
+        raise HTTPException(status_code=400,
+                            detail=f"O período deve ter de 1 a {DIAS_DISPONIBILIDADE_MAXIMO} dias.")
+    if barbeiro and barbeiro not in repositorio.agenda.barbeiros:
+        raise HTTPException(status_code=400, detail="Barbeiro inválido.")
+    duracao = repositorio.agenda.duracao(servico)
+    with metricas.duracaoOperacoes.cronometrar("disponibilidade_periodo"):
+        livres = await repositorio.horariosLivres(inicio, fim, duracao, usuario, barbeiro or None)
+    agora = datetime.now()
+    resultado = []
+    for data, horariosDia in livres.items():
+        horariosDia = horariosFuturos(data, horariosDia, agora)
+        dia = {"data": data.isoformat(), "livres": len(horariosDia)}
+        if horarios:
+            dia["horarios"] = {formatarHora(hora): barbeiros for hora, barbeiros in horariosDia.items()}
+        resultado.append(dia)
+    return {"servico": servico, "duracao": duracao, "barbeiro": barbeiro or None, "dias": resultado}
+
+
 @app.get("/agendamentos", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def listarAgendamento(request: Request):
+async def listarAgendamento(request: Request, mensagem: str = None, parametros: dict = Depends(parametrosListagem)):
     """
     Exibe a lista de agendamentos existentes na página de agendamentos.
 
-    A função formata os dados de agendamentos e os envia para a página de agendamentos, exibindo as informações
-    de cliente, serviço, data e hora do agendamento.
+    A função envia uma página de agendamentos para a página de agendamentos, exibindo as informações
+    de cliente, serviço, data e hora do agendamento. Aceita ordenação por "id" (ordem de cadastro) ou
+    "data", filtro por período e o cursor "apos" da próxima página. Uma mensagem opcional pode ser
+    exibida, como confirmação de uma exclusão.
     """
-    agendamentosFormatados = [{
-        "cliente": ag["cliente"],
-        "servico": ag["servico"],
-        "data": datetime.strptime(ag["data"], "%Y-%m-%d").strftime("%d/%m/%Y"),
-        "hora": ag["hora"],
-        "situacao": ag["situacao"]
-    } for ag in agendamentos]
-
-    return templates.TemplateResponse("agendamentos.html", {
+    fragmento = await contextoFragmento(request, "agendamentos")
+    pagina = await obterPagina("agendamentos", parametros)
+    return responderTemplate(templates, "agendamentos.html", {
         "request": request,
-        "agendamentos": agendamentosFormatados
-    })
+        **contextoPagina(request, pagina, parametros),
+        **fragmento,
+        "error": mensagem
+    }, configTemplates.emPartes)
 
 
-@app.get("/excluir_agendamento/{index}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def excluirAgendamento(index: int, request: Request):
+@app.get("/excluir_agendamento/{identificador}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def excluirAgendamento(identificador: int, request: Request):
     """
-    Exclui um agendamento pelo índice na lista de agendamentos.
+    Exclui um agendamento pelo id.
 
-    A função tenta excluir o agendamento especificado pelo índice. Caso o índice seja inválido (fora do alcance),
-    uma mensagem de erro é retornada.
+    O id não muda quando outros registros são excluídos, então um link de uma página desatualizada
+    nunca exclui o agendamento errado. Caso o agendamento não exista mais, uma mensagem de erro é retornada.
     """
-    try:
-        agendamentos.pop(index)
+    if await repositorio.removerAgendamento(identificador):
         mensagem = "Agendamento excluído com sucesso."
-    except IndexError:
+    else:
         mensagem = "Agendamento não encontrado."
 
-    return templates.TemplateResponse("agendamentos.html", {
-        "request": request,
-        "agendamentos": agendamentos,
-        "error": mensagem
-    })
+    return RedirectResponse(f"/agendamentos?mensagem={mensagem}", status_code=303)
 
 
-@app.get("/alterar_agendamento", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def alterarAgendamento(request: Request):
+async def paginaAlterarAgendamento(request: Request, usuario: str, agendamento: Agendamento, data: date,
+                                   servico: str, barbeiro: str = None, mensagem: str = None,
+                                   status_code: int = 200):
+    """
+    Monta o formulário de alteração de um agendamento, com os horários disponíveis para a data,
+    o serviço e o barbeiro escolhidos. O horário atual do agendamento continua sendo oferecido
+    na sua data, já que ele só conflitaria consigo mesmo.
+    """
+    agenda = repositorio.agenda
+    horarios = await obterHorariosDisponiveis(data, usuario, servico, barbeiro)
+    if data == agendamento.data and agendamento.horaFormatada not in horarios:
+        horarios = sorted(horarios + [agendamento.horaFormatada])
+    return templates.TemplateResponse(
+        "alterarAgendamento.html", {
+            "request": request,
+            "agendamento": agendamento,
+            "data": data.isoformat(),
+            "servicos": [(nome, agenda.duracao(nome)) for nome in agenda.servicos],
+            "servico": servico,
+            "barbeiros": agenda.barbeiros,
+            "barbeiro": barbeiro,
+            "horariosDisponiveis": horarios,
+            "hoje": date.today().isoformat(),
+            "mensagem": mensagem
+        }, status_code=status_code)
+
+
+@app.get("/alterar_agendamento/{identificador}", response_class=HTMLResponse)
+async def alterarAgendamento(identificador: int, request: Request, data: date = None, servico: str = None,
+                             barbeiro: str = None, usuario: str = Depends(verificarLogin)):
     """
     Exibe o formulário para alterar um agendamento.
 
-    Essa rota exibe a página de alteração de agendamento onde o usuário pode modificar informações
-    sobre um agendamento existente.
+    Essa rota exibe a página de alteração de agendamento, preenchida com os dados atuais, onde o
+    usuário pode escolher outro serviço, data, horário ou barbeiro.
+    """
+    agendamento = await repositorio.obterAgendamento(identificador)
+    if agendamento is None:
+        return RedirectResponse("/agendamentos?mensagem=Agendamento não encontrado.", status_code=303)
+    if barbeiro not in repositorio.agenda.barbeiros:
+        barbeiro = None
+    return await paginaAlterarAgendamento(request, usuario, agendamento, data or agendamento.data,
+                                          servico or agendamento.servico, barbeiro)
+
+
+@app.post("/alterar_agendamento/{identificador}", response_class=HTMLResponse)
+async def salvarAgendamento(identificador: int,
+                            request: Request,
+                            servico: str = Form(...),
+                            data: str = Form(...),
+                            hora: str = Form(...),
+                            barbeiro: str = Form(""),
+                            usuario: str = Depends(verificarLogin)):
+    """
+    Processa a alteração de um agendamento, mantendo o cliente e a situação.
+
+    Assim como no agendamento, a verificação do novo intervalo (sem contar o próprio agendamento)
+    e a gravação são atômicas: responde 409 se o novo horário estiver ocupado ou reservado.
     """
-    return templates.TemplateResponse("alterarAgendamento.html", {"request": request})
+    agendamento = await repositorio.obterAgendamento(identificador)
+    if agendamento is None:
+        return RedirectResponse("/agendamentos?mensagem=Agendamento não encontrado.", status_code=303)
+    barbeiro = barbeiro or None
+    try:
+        alterado = Agendamento.deTexto(agendamento.cliente, servico, data, hora, agendamento.situacao, barbeiro)
+    except ValueError:
+        return await paginaAlterarAgendamento(request, usuario, agendamento, agendamento.data, servico,
+                                              mensagem="Data ou hora inválida.", status_code=400)
+    if barbeiro is not None and barbeiro not in repositorio.agenda.barbeiros:
+        return await paginaAlterarAgendamento(request, usuario, agendamento, alterado.data, servico,
+                                              mensagem="Barbeiro inválido.", status_code=400)
+    alterado.id = identificador
+    if not await repositorio.alterarAgendamento(alterado, usuario):
+        return await paginaAlterarAgendamento(request, usuario, agendamento, alterado.data, servico, barbeiro,
+                                              mensagem="Horário indisponível para a data selecionada.",
+                                              status_code=409)
+    agendador.programarLembrete(alterado)
+    return RedirectResponse("/agendamentos?mensagem=Agendamento alterado com sucesso.", status_code=303)
 
 
 @app.get("/estoque", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def listarEstoque(request: Request, mensagem: str = None):
+async def listarEstoque(request: Request, mensagem: str = None, parametros: dict = Depends(parametrosListagem)):
     """
     Exibe a lista de produtos no estoque.
 
-    A função formata os dados do estoque, incluindo nome, quantidade e validade dos produtos, e exibe
-    essas informações na página de estoque. Uma mensagem opcional pode ser exibida, como confirmação de
-    ações realizadas no estoque.
-    """
-    estoqueFormatado = [{
-        "nome": item["nome"],
-        "quantidade": item["quantidade"],
-        "validade": datetime.strptime(item["validade"], "%Y-%m-%d").strftime("%d/%m/%Y")
-        if item.get("validade") else None
-    } for item in estoque]
-    return templates.TemplateResponse("estoque.html", {
+    A função exibe uma página do estoque, incluindo nome, quantidade e validade dos produtos, na página
+    de estoque. Aceita ordenação por "id", "nome", "quantidade" ou "validade", filtro por período de
+    validade e por início do nome ("prefixo"). Uma mensagem opcional pode ser exibida, como confirmação
+    de ações realizadas no estoque.
+    """
+    fragmento = await contextoFragmento(request, "estoque")
+    pagina = await obterPagina("estoque", parametros)
+    return responderTemplate(templates, "estoque.html", {
         "request": request,
-        "estoque": estoqueFormatado,
+        **contextoPagina(request, pagina, parametros),
+        **fragmento,
         "mensagem": mensagem
-    })
+    }, configTemplates.emPartes)
 
 
 @app.post("/estoque", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
@@ -307,69 +629,196 @@ async def cadastrarEstoque(request: Request,
     Cadastra um novo produto no estoque.
 
     A função recebe os dados do novo produto (nome, quantidade, validade) através do formulário, valida
-    a quantidade e adiciona o novo produto ao estoque.
+    a quantidade e a validade e adiciona o novo produto ao estoque.
     """
     try:
-        quantidade_int = int(quantidade)
+        produto = Produto.deTexto(nome, quantidade, validade)
     except ValueError:
-        quantidade_int = 0
-    estoque.append({
-        "nome": nome,
-        "quantidade": quantidade_int,
-        "validade": validade
-    })
+        return RedirectResponse("/estoque?mensagem=Validade inválida.", status_code=303)
+    await repositorio.adicionarProduto(produto)
     return RedirectResponse("/estoque", status_code=303)
 
 
-@app.get("/alterar_estoque", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def alterarEstoque(request: Request):
+@app.get("/alterar_estoque/{identificador}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def alterarEstoque(identificador: int, request: Request):
     """
     Exibe o formulário para alterar um produto no estoque.
 
-    Essa rota exibe a página de alteração de produto, onde o usuário pode modificar as informações
-    de um produto existente no estoque.
+    Essa rota exibe a página de alteração de produto, preenchida com os dados atuais, onde o
+    usuário pode modificar as informações de um produto existente no estoque.
     """
-    return templates.TemplateResponse("alterarEstoque.html", {"request": request})
+    produto = await repositorio.obterProduto(identificador)
+    if produto is None:
+        return RedirectResponse("/estoque?mensagem=Produto não encontrado.", status_code=303)
+    return templates.TemplateResponse("alterarEstoque.html", {"request": request, "produto": produto})
 
 
-@app.get("/excluir_produto/{index}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def excluirProduto(index: int, request: Request):
+@app.post("/alterar_estoque/{identificador}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def salvarProduto(identificador: int,
+                        nome: str = Form(...),
+                        quantidade: str = Form(...),
+                        validade: str = Form(...)):
     """
-    Exclui um produto do estoque pelo índice na lista de estoque.
-
-    A função tenta excluir o produto especificado pelo índice. Caso o índice seja inválido (fora do alcance),
-    uma mensagem de erro é retornada.
+    Processa a alteração de um produto do estoque, com as mesmas validações do cadastro.
     """
     try:
-        estoque.pop(index)
+        produto = Produto.deTexto(nome, quantidade, validade)
+    except ValueError:
+        return RedirectResponse("/estoque?mensagem=Validade inválida.", status_code=303)
+    produto.id = identificador
+    if await repositorio.alterarProduto(produto):
+        mensagem = "Produto alterado com sucesso."
+    else:
+        mensagem = "Produto não encontrado."
+    return RedirectResponse(f"/estoque?mensagem={mensagem}", status_code=303)
+
+
+@app.get("/excluir_produto/{identificador}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def excluirProduto(identificador: int, request: Request):
+    """
+    Exclui um produto do estoque pelo id.
+
+    A função tenta excluir o produto especificado pelo id. Caso o produto não exista mais, uma
+    mensagem de erro é retornada.
+    """
+    if await repositorio.removerProduto(identificador):
         mensagem = "Produto excluído com sucesso."
-    except IndexError:
+    else:
         mensagem = "Produto não encontrado."
 
     return RedirectResponse(f"/estoque?mensagem={mensagem}", status_code=303)
 
 
-@app.get("/contas", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def contasPagina(request: Request):
+async def obterVencendo(dias: int, limite: int = LIMITE_PADRAO):
     """
-    Exibe a lista de contas a pagar na página de contas.
+    Busca os produtos com validade entre hoje e os próximos dias, da validade mais próxima para a
+    mais distante, pela mesma consulta por faixa da listagem do estoque.
+    Lança uma exceção HTTPException 400 se dias ou limite forem inválidos.
+    """
+    if dias < 0:
+        raise HTTPException(status_code=400, detail="A quantidade de dias não pode ser negativa.")
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise HTTPException(status_code=400, detail=f"O limite deve estar entre 1 e {LIMITE_MAXIMO}.")
+    hoje = datetime.now().date()
+    parametros = {"ordem": "validade", "decrescente": False, "inicio": hoje, "fim": hoje + timedelta(days=dias),
+                  "status": None, "prefixo": None, "apos": None, "limite": limite}
+    return await obterPagina("estoque", parametros)
+
 
-    A função formata as informações das contas, como descrição, valor, vencimento e status, e as exibe
-    na página de contas.
+@app.get("/vendas", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def vendasPagina(request: Request, mensagem: str = None):
     """
-    contasFormatadas = [{
-        "descricao": conta["descricao"],
-        "valor": conta["valor"],
-        "vencimento": datetime.strptime(conta["vencimento"], "%Y-%m-%d").strftime("%d/%m/%Y"),
-        "status": conta["status"]
-    } for conta in contas]
+    Exibe a página de vendas e movimentações de estoque.
 
-    return templates.TemplateResponse("contas.html", {
+    A página traz o formulário de movimentação, os produtos com estoque baixo, os que vencem nos
+    próximos dias e as últimas movimentações registradas.
+    """
+    produtos = await repositorio.listarEstoque()
+    movimentos = await repositorio.listarMovimentos(limite=20)
+    return templates.TemplateResponse("vendas.html", {
         "request": request,
-        "contas": contasFormatadas
+        "produtos": produtos,
+        "nomes": {produto.id: produto.nome for produto in produtos},
+        "tipos": list(ROTULOS_MOVIMENTO.items()),
+        "rotulos": ROTULOS_MOVIMENTO,
+        "estoqueBaixo": await repositorio.listarEstoqueCritico(maximo=LIMITE_PADRAO),
+        "vencendo": (await obterVencendo(DIAS_VENCIMENTO_PADRAO)).itens,
+        "diasVencimento": DIAS_VENCIMENTO_PADRAO,
+        "movimentos": movimentos,
+        "error": mensagem
     })
 
 
+@app.post("/vendas", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def registrarVenda(produto: str = Form(...),
+                         quantidade: str = Form(...),
+                         tipo: str = Form("venda")):
+    """
+    Registra uma venda ou outra movimentação de estoque de um produto.
+
+    A quantidade vendida ou retirada é descontada do saldo do produto; uma movimentação que deixaria
+    o saldo negativo é recusada, com uma mensagem de erro.
+    """
+    try:
+        movimento = Movimento.deTexto(produto, tipo, quantidade)
+        await repositorio.registrarMovimentos([movimento])
+    except ValueError as erro:
+        return RedirectResponse(f"/vendas?mensagem={erro}", status_code=303)
+    return RedirectResponse(f"/vendas?mensagem=Movimentação registrada. Saldo do produto: {movimento.saldo}.",
+                            status_code=303)
+
+
+@app.post("/api/movimentos", dependencies=[Depends(verificarLogin)])
+async def apiRegistrarMovimentos(movimentos: list[dict] = Body(..., embed=True)):
+    """
+    Registra um lote de movimentações de estoque em uma única operação, como as vendas de um
+    caixa. Recebe {"movimentos": [{"produto": id, "tipo": "venda", "quantidade": 2}, ...]} e
+    aplica todas, na ordem, ou nenhuma.
+    Responde 400 se alguma movimentação ou produto for inválido e 409 se algum saldo ficar negativo.
+    """
+    if len(movimentos) > MOVIMENTOS_POR_LOTE:
+        raise HTTPException(status_code=400, detail=f"Envie no máximo {MOVIMENTOS_POR_LOTE} movimentações por lote.")
+    try:
+        lote = [Movimento.deTexto(item.get("produto"), item.get("tipo", "venda"), item.get("quantidade"))
+                for item in movimentos]
+        saldos = await repositorio.registrarMovimentos(lote)
+    except EstoqueInsuficiente as erro:
+        raise HTTPException(status_code=409, detail=str(erro))
+    except ValueError as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+    return {"registrados": len(lote), "ultimo": lote[-1].id if lote else None,
+            "saldos": {str(produto): saldo for produto, saldo in saldos.items()}}
+
+
+@app.get("/api/movimentos", dependencies=[Depends(verificarLogin)])
+async def apiMovimentos(produto: int = None, antes: int = None, limite: int = LIMITE_MOVIMENTOS):
+    """
+    Retorna as movimentações mais recentes primeiro, opcionalmente de um produto. O campo
+    "proximo" é o valor de "antes" da página seguinte.
+    """
+    if not 1 <= limite <= LIMITE_MAXIMO_MOVIMENTOS:
+        raise HTTPException(status_code=400, detail=f"O limite deve estar entre 1 e {LIMITE_MAXIMO_MOVIMENTOS}.")
+    movimentos = await repositorio.listarMovimentos(produto, antes, limite)
+    return {"itens": [movimento.paraDicionario() for movimento in movimentos],
+            "proximo": movimentos[-1].id if len(movimentos) == limite else None}
+
+
+@app.get("/api/estoque/baixo", dependencies=[Depends(verificarLogin)])
+async def apiEstoqueBaixo(quantidade: int = LIMITE_ESTOQUE_CRITICO, limite: int = LIMITE_PADRAO):
+    """
+    Retorna até limite produtos com quantidade menor que quantidade, da menor para a maior.
+    """
+    if not 1 <= limite <= LIMITE_MAXIMO:
+        raise HTTPException(status_code=400, detail=f"O limite deve estar entre 1 e {LIMITE_MAXIMO}.")
+    return [produto.paraDicionario() for produto in await repositorio.listarEstoqueCritico(quantidade, limite)]
+
+
+@app.get("/api/estoque/vencendo", dependencies=[Depends(verificarLogin)])
+async def apiEstoqueVencendo(dias: int = DIAS_VENCIMENTO_PADRAO, limite: int = LIMITE_PADRAO):
+    """
+    Retorna uma página dos produtos que vencem entre hoje e os próximos dias, pela validade.
+    """
+    return (await obterVencendo(dias, limite)).paraDicionario()
+
+
+@app.get("/contas", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def contasPagina(request: Request, parametros: dict = Depends(parametrosListagem)):
+    """
+    Exibe a lista de contas a pagar na página de contas.
+
+    A função exibe uma página das contas, com descrição, valor, vencimento e status, na página de
+    contas. Aceita ordenação por "id", "vencimento" ou "status", filtro por período de vencimento e
+    por status.
+    """
+    fragmento = await contextoFragmento(request, "contas")
+    pagina = await obterPagina("contas", parametros)
+    return responderTemplate(templates, "contas.html", {
+        "request": request,
+        **contextoPagina(request, pagina, parametros),
+        **fragmento
+    }, configTemplates.emPartes)
+
+
 @app.post("/contas", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
 async def cadastrarConta(request: Request,
                          descricao: str = Form(...),
@@ -378,209 +827,338 @@ async def cadastrarConta(request: Request,
     """
     Cadastra uma nova conta a pagar.
 
-    A função recebe os dados da nova conta (descrição, valor, vencimento) e adiciona a conta
-    à lista de contas a pagar.
+    A função recebe os dados da nova conta (descrição, valor, vencimento), converte o valor para Decimal
+    e o vencimento para data, e adiciona a conta à lista de contas a pagar. Se ainda estiver ativa
+    depois do vencimento, a conta é marcada como "Atraso" pelo agendador.
     """
-    status = "Ativa"
-    contas.append({
-        "descricao": descricao,
-        "valor": valor,
-        "vencimento": vencimento,
-        "status": status
-    })
+    try:
+        conta = Conta.deTexto(descricao, valor, vencimento)
+    except ValueError:
+        return RedirectResponse("/contas?mensagem=Valor ou vencimento inválido.", status_code=303)
+    await repositorio.adicionarConta(conta)
+    agendador.programarConta(conta)
     return RedirectResponse("/contas", status_code=303)
 
 
-@app.get("/alterar_conta", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def alterarContas(request: Request):
+@app.get("/alterar_conta/{identificador}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def alterarContas(identificador: int, request: Request):
     """
     Exibe o formulário para alterar uma conta.
 
-    Essa rota exibe a página de alteração de conta, onde o usuário pode modificar informações
-    sobre uma conta existente.
+    Essa rota exibe a página de alteração de conta, preenchida com os dados atuais, onde o usuário
+    pode modificar informações sobre uma conta existente.
     """
-    return templates.TemplateResponse("alterarContas.html", {"request": request})
+    conta = await repositorio.obterConta(identificador)
+    if conta is None:
+        return RedirectResponse("/contas?mensagem=Conta não encontrada.", status_code=303)
+    return templates.TemplateResponse("alterarContas.html", {
+        "request": request,
+        "conta": conta,
+        "status": STATUS_CONTAS
+    })
 
 
-@app.get("/excluir_conta/{index}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def excluirConta(index: int, request: Request):
+@app.post("/alterar_conta/{identificador}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def salvarConta(identificador: int,
+                      descricao: str = Form(...),
+                      valor: str = Form(...),
+                      vencimento: str = Form(...),
+                      status: str = Form(...)):
     """
-    Exclui uma conta da lista de contas a pagar.
-
-    A função tenta excluir a conta especificada pelo índice. Caso o índice seja inválido (fora do alcance),
-    uma mensagem de erro é retornada.
+    Processa a alteração de uma conta, com as mesmas validações do cadastro.
     """
+    if status not in STATUS_CONTAS:
+        return RedirectResponse("/contas?mensagem=Status inválido.", status_code=303)
     try:
-        contas.pop(index)
+        conta = Conta.deTexto(descricao, valor, vencimento, status)
+    except ValueError:
+        return RedirectResponse("/contas?mensagem=Valor ou vencimento inválido.", status_code=303)
+    conta.id = identificador
+    if await repositorio.alterarConta(conta):
+        agendador.programarConta(conta)
+        mensagem = "Conta alterada com sucesso."
+    else:
+        mensagem = "Conta não encontrada."
+    return RedirectResponse(f"/contas?mensagem={mensagem}", status_code=303)
+
+
+@app.get("/excluir_conta/{identificador}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
+async def excluirConta(identificador: int, request: Request):
+    """
+    Exclui uma conta da lista de contas a pagar pelo id.
+
+    A função tenta excluir a conta especificada pelo id. Caso a conta não exista mais, uma
+    mensagem de erro é retornada.
+    """
+    if await repositorio.removerConta(identificador):
         mensagem = "Conta excluída com sucesso."
-    except IndexError:
+    else:
         mensagem = "Conta não encontrada."
 
     return RedirectResponse(f"/contas?mensagem={mensagem}", status_code=303)
 
 
-@app.get("/alterar_status_conta/{index}/{status}", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def alterarStatusConta(index: int, status: str, request: Request):
+@app.get("/alterar_status_conta/{identificador}/{status}", response_class=HTMLResponse,
+         dependencies=[Depends(verificarLogin)])
+async def alterarStatusConta(identificador: int, status: str, request: Request):
     """
     Altera o status de uma conta a pagar.
 
-    A função recebe o índice de uma conta e o novo status desejado (Atraso ou Paga). Caso o status seja
-    válido, ele é atualizado na conta correspondente. Se o índice for inválido, ou se o status não for
+    A função recebe o id de uma conta e o novo status desejado (Atraso ou Paga). Caso o status seja
+    válido, ele é atualizado na conta correspondente. Se a conta não existir, ou se o status não for
     um dos permitidos, uma mensagem de erro será retornada.
     """
-    try:
-        if status in ["Atraso", "Paga"]:
-            contas[index]["status"] = status
-            mensagem = f"Status da conta alterado para {status}."
-        else:
-            mensagem = "Status inválido."
-    except IndexError:
+    if status not in ["Atraso", "Paga"]:
+        mensagem = "Status inválido."
+    elif await repositorio.alterarStatusConta(identificador, status):
+        mensagem = f"Status da conta alterado para {status}."
+    else:
         mensagem = "Conta não encontrada."
 
     return RedirectResponse(f"/contas?mensagem={mensagem}", status_code=303)
 
 
 @app.get("/perfil", response_class=HTMLResponse, dependencies=[Depends(verificarLogin)])
-async def perfilPagina(request: Request):
+async def perfilPagina(request: Request,
+                       parametros: dict = Depends(parametrosListagem),
+                       usuario: str = Depends(verificarLogin)):
     """
     Exibe a página de perfil do usuário com seus agendamentos.
 
-    Filtra os agendamentos do usuário logado e os exibe na página de perfil.
+    Filtra os agendamentos do usuário logado e exibe uma página deles na página de perfil, com os
+    mesmos parâmetros de ordenação e filtro da página de agendamentos. Os agendamentos guardam o
+    nome do usuário como cliente (veja realizarAgendamento), então o filtro é pelo nome.
     """
-    agendamentosUsuarios = [
-        agendamento for agendamento in agendamentos
-        if agendamento["cliente"] == usuarios[loginUsuario]["usuario"]
-    ]
-    agendamentosUsuarios = [{
-        "cliente": agendamento["cliente"],
-        "servico": agendamento["servico"],
-        "data": datetime.strptime(agendamento["data"], "%Y-%m-%d").strftime("%d/%m/%Y"),
-        "hora": agendamento["hora"],
-        "situacao": agendamento["situacao"]
-    } for agendamento in agendamentosUsuarios]
+    cliente = (await repositorio.obterUsuario(usuario))["nome"]
+    fragmento = await contextoFragmento(request, "agendamentos", cliente)
+    pagina = await obterPagina("agendamentos", parametros, cliente=cliente)
 
-    return templates.TemplateResponse(
-        "perfil.html", {
+    return responderTemplate(
+        templates, "perfil.html", {
             "request": request,
-            "usuario": loginUsuario,
-            "agendamentos": agendamentosUsuarios
-        })
+            "usuario": usuario,
+            **contextoPagina(request, pagina, parametros),
+            **fragmento
+        }, configTemplates.emPartes)
+
+
+@app.get("/api/agendamentos", dependencies=[Depends(verificarLogin)])
+async def apiAgendamentos(parametros: dict = Depends(parametrosListagem)):
+    """
+    Retorna uma página de agendamentos em JSON, com os mesmos parâmetros da página de agendamentos.
+    A resposta traz os itens e o cursor "proximo", que deve ser enviado como "apos" para obter a
+    página seguinte (null na última página).
+    """
+    return (await obterPagina("agendamentos", parametros)).paraDicionario()
+
+
+@app.get("/api/estoque", dependencies=[Depends(verificarLogin)])
+async def apiEstoque(parametros: dict = Depends(parametrosListagem)):
+    """
+    Retorna uma página do estoque em JSON, com os mesmos parâmetros da página de estoque.
+    """
+    return (await obterPagina("estoque", parametros)).paraDicionario()
+
 
+@app.get("/api/contas", dependencies=[Depends(verificarLogin)])
+async def apiContas(parametros: dict = Depends(parametrosListagem)):
+    """
+    Retorna uma página das contas em JSON, com os mesmos parâmetros da página de contas.
+    """
+    return (await obterPagina("contas", parametros)).paraDicionario()
+
+
+@app.get("/api/financeiro", dependencies=[Depends(verificarLogin)])
+async def apiFinanceiro(inicio: str = None, fim: str = None, meses: int = MESES_PROJECAO):
+    """
+    Retorna o resumo financeiro das contas em JSON: totais ativos, atrasados, pagos e em aberto,
+    o fluxo de caixa mensal pelo vencimento (de "inicio" a "fim", meses YYYY-MM; por padrão, os 12
+    meses antes e depois do atual, e nunca mais de MESES_FLUXO_MAXIMO meses) e a projeção dos
+    vencimentos dos próximos "meses" meses. Os valores vão como texto decimal, sem arredondamento.
+    Lança uma exceção HTTPException 400 se algum mês ou a quantidade de meses forem inválidos.
+    """
+    try:
+        inicio = lerMes(inicio) if inicio else None
+        fim = lerMes(fim) if fim else None
+    except ValueError as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+    if not 1 <= meses <= MESES_PROJECAO_MAXIMO:
+        raise HTTPException(status_code=400, detail=f"A projeção deve ter entre 1 e {MESES_PROJECAO_MAXIMO} meses.")
+    if inicio and fim and not 1 <= mesesEntre(inicio, fim) <= MESES_FLUXO_MAXIMO:
+        raise HTTPException(status_code=400,
+                            detail=f"O fluxo deve ter entre 1 e {MESES_FLUXO_MAXIMO} meses, de inicio a fim.")
+    with metricas.duracaoOperacoes.cronometrar("financeiro"):
+        totais = await repositorio.totaisContas()
+        return resumirFinanceiro(totais, datetime.now().date(), inicio, fim, meses).paraDicionario()
+
+
+def verificarTabelaFormato(tabela: str, formato: str):
+    """
+    Lança uma exceção HTTPException 404 se a tabela não puder ser importada ou exportada, ou 400
+    se o formato não for "csv" nem "jsonl".
+    """
+    if tabela not in COLUNAS:
+        raise HTTPException(status_code=404, detail=f"Tabela desconhecida: {tabela}")
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido: {formato}. Use {', '.join(FORMATOS)}.")
+
+
+@app.post("/api/importar/{tabela}", dependencies=[Depends(verificarLogin)])
+async def apiImportar(request: Request, tabela: str, formato: str = "csv"):
+    """
+    Importa agendamentos, produtos do estoque ou contas de um arquivo CSV (com cabeçalho) ou JSONL
+    enviado como corpo da requisição, sem multipart. O corpo é lido conforme chega e gravado em
+    lotes, então arquivos grandes não são carregados inteiros em memória.
+
+    Retorna as linhas lidas, os registros importados e os erros por linha (validação ou horário em
+    conflito com outro agendamento); as linhas válidas são importadas mesmo com erros nas demais.
+    Os registros importados não geram notificações e entram no agendador na próxima sincronização.
+    Lança uma exceção HTTPException 400 se o arquivo inteiro for inválido (como um cabeçalho sem
+    as colunas obrigatórias).
+    """
+    verificarTabelaFormato(tabela, formato)
+    try:
+        with metricas.duracaoOperacoes.cronometrar("importacao"):
+            resultado = await importar(repositorio, tabela, formato, request.stream())
+    except ErroImportacao as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+    return resultado.paraDicionario()
+
+
+@app.get("/api/exportar/{tabela}", response_class=StreamingResponse, dependencies=[Depends(verificarLogin)])
+async def apiExportar(tabela: str, formato: str = "csv", inicio: str = None, fim: str = None):
+    """
+    Exporta a tabela em CSV ou JSONL, em streaming, página a página pelo id; o CSV exportado pode
+    ser importado de novo. "inicio" e "fim" filtram pela data, validade ou vencimento.
+    Lança uma exceção HTTPException 400 se alguma data for inválida.
+    """
+    verificarTabelaFormato(tabela, formato)
+    try:
+        inicio = lerData(inicio) if inicio else None
+        fim = lerData(fim) if fim else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data inválida no filtro.")
+    return StreamingResponse(exportar(repositorio, tabela, formato, inicio, fim), media_type=FORMATOS[formato],
+                             headers={"Content-Disposition": f'attachment; filename="{tabela}.{formato}"'})
 
-@app.get("/relatorio/excel", response_class=FileResponse, dependencies=[Depends(verificarLogin)])
-async def gerarRelatorioExcel():
+
+@app.get("/api/perfil/agendamentos", dependencies=[Depends(verificarLogin)])
+async def apiAgendamentosPerfil(parametros: dict = Depends(parametrosListagem),
+                                usuario: str = Depends(verificarLogin)):
+    """
+    Retorna uma página dos agendamentos do usuário logado em JSON.
+    """
+    return (await obterPagina("agendamentos", parametros,
+                              cliente=(await repositorio.obterUsuario(usuario))["nome"])).paraDicionario()
+
+
+async def obterDadosRelatorio(abas: tuple, inicio: date = None, fim: date = None):
+    """
+    Busca no repositório os registros das abas selecionadas, filtrados pelo período informado.
+    """
+    listagens = {
+        "agendamentos": repositorio.listarAgendamentos,
+        "estoque": repositorio.listarEstoque,
+        "contas": repositorio.listarContas
+    }
+    return {aba: await listagens[aba](inicio, fim) for aba in abas}
+
+
+async def responderRelatorio(request: Request, formato: str, abas: str, inicio: date, fim: date):
+    """
+    Monta a resposta de um relatório, reaproveitando o cache sempre que os dados não mudaram.
+
+    A versão do relatório é formada pelo identificador do repositório e pelas versões das tabelas
+    incluídas, de modo que alterar, por exemplo, uma conta não invalida um relatório só de agendamentos.
+    Se o navegador enviar um If-None-Match com o ETag atual, responde 304 sem gerar nada; se o relatório
+    estiver no cache, devolve os bytes guardados; caso contrário gera o arquivo e o guarda no cache.
+    """
+    try:
+        abasSelecionadas = lerAbas(abas)
+    except ValueError as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+
+    versoes = await repositorio.versoesDados()
+    versao = (repositorio.identificador,) + tuple(versoes[aba] for aba in abasSelecionadas)
+    # A projeção financeira das contas depende do dia, então os relatórios com contas mudam de chave a cada dia.
+    hoje = datetime.now().date() if "contas" in abasSelecionadas else None
+    chave = (formato, abasSelecionadas, inicio, fim, hoje)
+    etag = gerarEtag(chave, versao)
+    cabecalhos = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f'attachment; filename="Relatorio.{formato}"'
+    }
+    tipoMidia = TIPOS_MIDIA[formato]
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    conteudo = cacheRelatorios.obter(chave, versao)
+    if conteudo is not None:
+        return Response(conteudo, media_type=tipoMidia, headers=cabecalhos)
+
+    with metricas.duracaoOperacoes.cronometrar("relatorio_dados"):
+        dados = await obterDadosRelatorio(abasSelecionadas, inicio, fim)
+    with metricas.duracaoOperacoes.cronometrar(f"relatorio_{formato}"):
+        if formato == "pdf":
+            arquivo = await gerarPDFEmProcesso(dados, hoje)
+        else:
+            arquivo = await anyio.to_thread.run_sync(gerarExcel, dados, hoje)
+
+    conteudo = await anyio.to_thread.run_sync(lerSeCouber, arquivo, cacheRelatorios.limiteEntrada)
+    if conteudo is None:
+        return StreamingResponse(lerEmPedacos(arquivo), media_type=tipoMidia, headers=cabecalhos)
+    cacheRelatorios.guardar(chave, versao, conteudo)
+    return Response(conteudo, media_type=tipoMidia, headers=cabecalhos)
+
+
+@app.get("/relatorio/excel", response_class=StreamingResponse, dependencies=[Depends(verificarLogin)])
+async def gerarRelatorioExcel(request: Request,
+                              inicio: date = None,
+                              fim: date = None,
+                              abas: str = ",".join(ABAS)):
     """
     Gera um relatório em formato Excel contendo informações sobre agendamentos, estoque e contas.
 
-    O relatório será gerado em três abas: Agendamentos, Estoque e Contas. Cada aba conterá
+    O relatório terá uma aba para cada item de "abas" (Agendamentos, Estoque e Contas, por padrão), com
     as informações pertinentes, como cliente, serviço, data, hora, status, nome do produto,
-    quantidade, validade, etc. O arquivo será salvo como "relatorio.xlsx" e enviado como resposta.
-    """
-    caminhoArquivo = "relatorio.xlsx"
-    wb = Workbook()
-    wbAgendamentos = wb.active
-    wbAgendamentos.title = "Agendamentos"
-    wbAgendamentos.append(["Cliente", "Serviço", "Data", "Hora", "Situação"])
-    for agendamento in agendamentos:
-        wbAgendamentos.append([
-            agendamento["cliente"], agendamento["servico"],
-            datetime.strptime(agendamento['data'],
-                              '%Y-%m-%d').strftime('%d/%m/%Y'),
-            agendamento["hora"], agendamento["situacao"]
-        ])
-
-    wbEstoque = wb.create_sheet(title="Estoque")
-    wbEstoque.append(["Nome", "Quantidade", "Validade"])
-    for produto in estoque:
-        wbEstoque.append([
-            produto["nome"],
-            produto["quantidade"],
-            datetime.strptime(produto['validade'], '%Y-%m-%d').strftime('%d/%m/%Y')
-        ])
-
-    wbContas = wb.create_sheet(title="Contas")
-    wbContas.append(["Descrição", "Valor", "Vencimento", "Status"])
-    for conta in contas:
-        wbContas.append([
-            conta["descricao"],
-            conta["valor"],
-            datetime.strptime(conta['vencimento'], '%Y-%m-%d').strftime('%d/%m/%Y'),
-            conta["status"]
-        ])
-
-    wb.save(caminhoArquivo)
-
-    return FileResponse(
-        caminhoArquivo,
-        media_type= "applicatin/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        filename="Relatorio.xlsx")
-
-
-@app.get("/relatorio/pdf", response_class=FileResponse, dependencies=[Depends(verificarLogin)])
-async def gerarRelatorioPDF():
+    quantidade, validade, etc. Os parâmetros "inicio" e "fim" limitam o período exportado. A planilha é
+    montada em uma thread separada, em um arquivo temporário exclusivo da requisição, e fica em cache
+    até que os dados incluídos sejam alterados.
+    """
+    return await responderRelatorio(request, "xlsx", abas, inicio, fim)
+
+
+@app.get("/relatorio/pdf", response_class=StreamingResponse, dependencies=[Depends(verificarLogin)])
+async def gerarRelatorioPDF(request: Request,
+                            inicio: date = None,
+                            fim: date = None,
+                            abas: str = ",".join(ABAS)):
     """
     Gera um relatório em PDF com informações de agendamentos, estoque e contas.
 
     A função cria um arquivo PDF contendo as informações detalhadas dos agendamentos, produtos no estoque
-    e contas a pagar. O relatório é formatado com informações como nome do cliente, serviço, data e hora
-    de agendamento, quantidade de produtos, validade, descrição e status das contas, sendo gerado em formato PDF
-    para download.
-    """
-    caminhoArquivo = "relatorio.pdf"
-    c = canvas.Canvas(caminhoArquivo, pagesize=letter)
-    largura, altura = letter
-    margemSuperior = altura - 50
-    margemInferior = 50
-    espacamento = 20
-
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(50, margemSuperior, "Relatório de Agendamentos, Estoque e Contas")
-    c.setFont("Helvetica", 12)
-
-    y = margemSuperior - 50
-
-    def verificarEspaco(c, y, altura):
-        if y < margemInferior:
-            c.showPage()
-            c.setFont("Helvetica", 12)
-            return margemSuperior
-        return y
-
-    c.drawString(50, y, "Agendamentos")
-    y -= espacamento
-    for agendamento in agendamentos:
-        c.drawString(
-            50, y,
-            f"{agendamento['cliente']} - {agendamento['servico']} - {datetime.strptime(agendamento['data'], '%Y-%m-%d').strftime('%d/%m/%Y')} {agendamento['hora']} - {agendamento['situacao']}"
-        )
-        y -= espacamento
-        y = verificarEspaco(c, y, altura)
-
-    y -= espacamento
-
-    c.drawString(50, y, "Estoque")
-    y -= espacamento
-    for produto in estoque:
-        c.drawString(
-            50, y,
-            f"{produto['nome']} - {produto['quantidade']} - Validade: {datetime.strptime(produto['validade'], '%Y-%m-%d').strftime('%d/%m/%Y')}"
-        )
-        y -= espacamento
-        y = verificarEspaco(c, y, altura)
-
-    y -= espacamento
-
-    c.drawString(50, y, "Contas")
-    y -= espacamento
-    for conta in contas:
-        c.drawString(
-            50, y,
-            f"{conta['descricao']} - R${conta['valor']} - Vencimento: {datetime.strptime(conta['vencimento'], '%Y-%m-%d').strftime('%d/%m/%Y')} - {conta['status']}"
-        )
-        y -= espacamento
-        y = verificarEspaco(c, y, altura)
-
-    c.save()
-    return FileResponse(caminhoArquivo,
-                        media_type="application/pdf",
-                        filename="Relatorio.pdf")
+    e contas a pagar, em tabelas com cabeçalho repetido a cada página e linha de total por seção. Aceita os
+    mesmos filtros "inicio", "fim" e "abas" do relatório Excel. O PDF é gerado em um processo separado, em
+    um arquivo temporário exclusivo da requisição, para não travar as demais requisições, e fica em cache
+    até que os dados incluídos sejam alterados.
+    """
+    return await responderRelatorio(request, "pdf", abas, inicio, fim)
+
+
+@app.get("/metricas", include_in_schema=False)
+async def exportarMetricas(request: Request):
+    """
+    Exporta as métricas deste worker no formato de texto do Prometheus: requisições por rota e
+    status, latência por rota, requisições em andamento, atraso do event loop, duração da
+    disponibilidade, dos relatórios e de cada template, e os acertos dos caches.
+
+    Aceita o token de BARBEARIA_METRICAS_TOKEN no cabeçalho Authorization (para o coletor) ou a
+    sessão de um usuário logado. Responde 404 com as métricas desligadas.
+    """
+    if not configMetricas.ativo:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not configMetricas.tokenValido(request.headers.get("authorization", "")):
+        await verificarLogin(request)
+    return Response(metricas.exportar(), media_type=TIPO_MIDIA_PROMETHEUS)
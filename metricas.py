@@ -0,0 +1,329 @@
+import asyncio
+import functools
+import hmac
+import os
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+
+# Limites, em segundos, dos baldes dos histogramas de latência.
+BALDES_PADRAO = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TIPO_MIDIA_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+ROTA_DESCONHECIDA = "desconhecida"
+
+
+@dataclass
+class ConfiguracaoMetricas:
+    """
+    Configuração das métricas.
+
+    token, se definido, permite ler GET /metricas com o cabeçalho "Authorization: Bearer <token>",
+    para coletores como o Prometheus, além da sessão de um usuário logado. intervaloLoop é o
+    período, em segundos, da medição do atraso do event loop.
+    """
+    ativo: bool = True
+    token: str = None
+    intervaloLoop: float = 0.5
+
+    @classmethod
+    def deAmbiente(cls):
+        """
+        Lê a configuração das variáveis de ambiente BARBEARIA_METRICAS*.
+        """
+        return cls(ativo=os.environ.get("BARBEARIA_METRICAS", "1") != "0",
+                   token=os.environ.get("BARBEARIA_METRICAS_TOKEN") or None,
+                   intervaloLoop=float(os.environ.get("BARBEARIA_METRICAS_INTERVALO_LOOP", cls.intervaloLoop)))
+
+    def tokenValido(self, autorizacao: str):
+        """
+        Confere o cabeçalho Authorization contra o token, em tempo constante.
+        """
+        if not self.token or not autorizacao.startswith("Bearer "):
+            return False
+        return hmac.compare_digest(autorizacao[len("Bearer "):].encode(), self.token.encode())
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _formatarRotulos(nomes: tuple, valores: tuple, extra: str = ""):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _formatarNumero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metrica:
+    """
+    Base das métricas: um nome, um texto de ajuda e os nomes dos rótulos de cada série.
+
+    As séries ficam em um dicionário pela tupla de valores dos rótulos. As métricas são registradas
+    no event loop (ou sempre na mesma thread), então a atualização é uma operação de dicionário,
+    sem travas.
+    """
+    tipo = "untyped"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._series = {}
+
+    def _valores(self):
+        """
+        Séries exportadas, {valores dos rótulos: valor}.
+        """
+        return self._series
+
+    def _linhas(self):
+        """
+        Uma linha por série; o Histograma, que exporta várias por série, sobrescreve.
+        """
+        for rotulos, valor in self._valores().items():
+            yield f"{self.nome}{_formatarRotulos(self.rotulos, rotulos)} {_formatarNumero(valor)}"
+
+    def exportar(self):
+        cabecalho = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        return cabecalho + list(self._linhas())
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def incrementar(self, *rotulos, valor: float = 1):
+        self._series[rotulos] = self._series.get(rotulos, 0) + valor
+
+
+class Medidor(Metrica):
+    """
+    Valor que sobe e desce, como as requisições em andamento.
+    """
+    tipo = "gauge"
+
+    def definir(self, *rotulos, valor: float):
+        self._series[rotulos] = valor
+
+    def somar(self, *rotulos, valor: float = 1):
+        self._series[rotulos] = self._series.get(rotulos, 0) + valor
+
+    def valor(self, *rotulos):
+        return self._series.get(rotulos, 0)
+
+
+class Histograma(Metrica):
+    """
+    Histograma com baldes fixos. Cada série é uma lista com a contagem de cada balde (não
+    acumulada), a soma e a quantidade de observações; observar é uma busca binária e dois
+    incrementos, e a contagem acumulada do formato Prometheus só é calculada na exportação.
+    """
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (), baldes: tuple = BALDES_PADRAO):
+        super().__init__(nome, ajuda, rotulos)
+        self.baldes = tuple(sorted(baldes))
+
+    def observar(self, valor: float, *rotulos):
+        serie = self._series.get(rotulos)
+        if serie is None:
+            serie = self._series[rotulos] = [0] * (len(self.baldes) + 1) + [0.0, 0]
+        serie[bisect_left(self.baldes, valor)] += 1
+        serie[-2] += valor
+        serie[-1] += 1
+
+    def cronometrar(self, *rotulos):
+        """
+        Context manager que observa a duração do bloco, inclusive das esperas (await) dentro dele.
+        """
+        return Cronometro(self, rotulos)
+
+    def quantil(self, q: float, *rotulos):
+        """
+        Estimativa do quantil q pelo limite superior do balde em que ele cai (como o
+        histogram_quantile do Prometheus, sem interpolação), ou None sem observações.
+        """
+        serie = self._series.get(rotulos)
+        if not serie or not serie[-1]:
+            return None
+        alvo, acumulado = q * serie[-1], 0
+        for limite, quantidade in zip(self.baldes + (float("inf"),), serie):
+            acumulado += quantidade
+            if acumulado >= alvo:
+                return limite
+        return float("inf")
+
+    def _linhas(self):
+        for rotulos, serie in self._series.items():
+            acumulado = 0
+            for limite, quantidade in zip(self.baldes + (float("inf"),), serie):
+                acumulado += quantidade
+                rotulosBalde = _formatarRotulos(self.rotulos, rotulos, f'le="{_formatarNumero(float(limite))}"')
+                yield f"{self.nome}_bucket{rotulosBalde} {acumulado}"
+            yield f"{self.nome}_sum{_formatarRotulos(self.rotulos, rotulos)} {_formatarNumero(serie[-2])}"
+            yield f"{self.nome}_count{_formatarRotulos(self.rotulos, rotulos)} {serie[-1]}"
+
+
+class Cronometro:
+    __slots__ = ("histograma", "rotulos", "inicio")
+
+    def __init__(self, histograma: Histograma, rotulos: tuple):
+        self.histograma = histograma
+        self.rotulos = rotulos
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excecao):
+        self.histograma.observar(time.perf_counter() - self.inicio, *self.rotulos)
+        return False
+
+
+class Coletada(Metrica):
+    """
+    Métrica lida na exportação: funcao retorna {valores dos rótulos: valor}. Serve para expor
+    contadores que outros componentes já mantêm, como os acertos dos caches.
+    """
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple, tipo: str, funcao):
+        super().__init__(nome, ajuda, rotulos)
+        self.tipo = tipo
+        self.funcao = funcao
+
+    def _valores(self):
+        return self.funcao()
+
+
+class RegistroMetricas:
+    """
+    Conjunto das métricas da aplicação, exportado no formato de texto do Prometheus.
+
+    Além das métricas criadas pelos componentes, mantém as das requisições (contador por método,
+    rota e status, histograma de latência por método e rota e requisições em andamento), a latência
+    das operações mais caras (operacao) e o atraso do event loop. Cada worker tem o seu registro.
+    """
+
+    def __init__(self):
+        self._metricas = {}
+        self.requisicoes = self.contador("barbearia_requisicoes_total", "Requisições HTTP atendidas.",
+                                         ("metodo", "rota", "status"))
+        self.duracaoRequisicoes = self.histograma("barbearia_requisicao_duracao_segundos",
+                                                  "Latência das requisições HTTP.", ("metodo", "rota"))
+        self.emAndamento = self.medidor("barbearia_requisicoes_em_andamento", "Requisições HTTP em andamento.")
+        self.duracaoOperacoes = self.histograma("barbearia_operacao_duracao_segundos",
+                                                "Latência das operações internas mais caras.", ("operacao",))
+        self.atrasoLoop = self.histograma("barbearia_event_loop_atraso_segundos",
+                                          "Atraso do event loop em relação ao agendado.")
+        self.atrasoLoopMaximo = self.medidor("barbearia_event_loop_atraso_maximo_segundos",
+                                             "Maior atraso do event loop desde a última coleta.")
+        self.emAndamento.definir(valor=0)
+
+    def _registrar(self, metrica: Metrica):
+        if metrica.nome in self._metricas:
+            raise ValueError(f"Métrica já registrada: {metrica.nome}")
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def medidor(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        return self._registrar(Medidor(nome, ajuda, rotulos))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: tuple = (), baldes: tuple = BALDES_PADRAO):
+        return self._registrar(Histograma(nome, ajuda, rotulos, baldes))
+
+    def coletada(self, nome: str, ajuda: str, rotulos: tuple, tipo: str, funcao):
+        return self._registrar(Coletada(nome, ajuda, rotulos, tipo, funcao))
+
+    def cronometrado(self, operacao: str):
+        """
+        Decorador de funções assíncronas que observa a duração de cada chamada em
+        barbearia_operacao_duracao_segundos, com o rótulo operacao.
+        """
+        def decorador(funcao):
+            @functools.wraps(funcao)
+            async def cronometrada(*args, **kwargs):
+                with self.duracaoOperacoes.cronometrar(operacao):
+                    return await funcao(*args, **kwargs)
+            return cronometrada
+        return decorador
+
+    def exportar(self):
+        """
+        Gera o texto de todas as métricas no formato de exposição do Prometheus. O atraso máximo
+        do event loop é zerado a cada coleta.
+        """
+        linhas = []
+        for metrica in self._metricas.values():
+            linhas.extend(metrica.exportar())
+        self.atrasoLoopMaximo.definir(valor=0.0)
+        return "\n".join(linhas) + "\n"
+
+    async def monitorarLoop(self, intervalo: float):
+        """
+        Dorme intervalo segundos em laço e registra quanto o event loop demorou além disso para
+        retomar a tarefa: o tempo em que ele ficou ocupado com código síncrono.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            esperado = loop.time() + intervalo
+            await asyncio.sleep(intervalo)
+            atraso = max(loop.time() - esperado, 0.0)
+            self.atrasoLoop.observar(atraso)
+            if atraso > self.atrasoLoopMaximo.valor():
+                self.atrasoLoopMaximo.definir(valor=atraso)
+
+
+class MetricasRequisicoes:
+    """
+    Middleware ASGI que registra a quantidade, a latência e as requisições em andamento.
+
+    A rota é o caminho declarado do endpoint (como /alterar_conta/{identificador}), e não o
+    caminho da URL, para que a quantidade de séries não cresça com os ids; requisições que não
+    correspondem a nenhuma rota ficam em "desconhecida".
+    """
+
+    def __init__(self, app, metricas: RegistroMetricas):
+        self.app = app
+        self.metricas = metricas
+        self._rotas = {}
+
+    def _rota(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return ROTA_DESCONHECIDA
+        rota = self._rotas.get(endpoint)
+        if rota is None:
+            caminhos = {getattr(r, "endpoint", None): r.path for r in scope["app"].router.routes}
+            rota = self._rotas[endpoint] = caminhos.get(endpoint, ROTA_DESCONHECIDA)
+        return rota
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        status = 500
+
+        async def enviarComStatus(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        self.metricas.emAndamento.somar(valor=1)
+        try:
+            await self.app(scope, receive, enviarComStatus)
+        finally:
+            self.metricas.emAndamento.somar(valor=-1)
+            rota = self._rota(scope)
+            self.metricas.duracaoRequisicoes.observar(time.perf_counter() - inicio, scope["method"], rota)
+            self.metricas.requisicoes.incrementar(scope["method"], rota, str(status))
@@ -0,0 +1,225 @@
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+CENTAVOS = Decimal("0.01")
+# Maior valor aceito numa conta; em centavos, as somas de milhões de contas ainda cabem num inteiro de 64 bits.
+VALOR_MAXIMO = Decimal("999999999.99")
+# Sinal de cada tipo de movimentação de estoque; o ajuste leva o sinal na própria quantidade.
+TIPOS_MOVIMENTO = {"entrada": 1, "saida": -1, "venda": -1, "ajuste": 1}
+
+
+@lru_cache(maxsize=65536)
+def lerData(texto: str):
+    """
+    Converte uma data YYYY-MM-DD em date. Datas iguais compartilham o mesmo objeto.
+    Lança ValueError se o texto não for uma data válida.
+    """
+    return date.fromisoformat(texto)
+
+
+@lru_cache(maxsize=1440)
+def lerHora(texto: str):
+    """
+    Converte uma hora HH:MM em time. Horas iguais compartilham o mesmo objeto.
+    Lança ValueError se o texto não for uma hora válida.
+    """
+    return time.fromisoformat(texto)
+
+
+def lerValor(texto: str):
+    """
+    Converte um valor monetário em Decimal com duas casas, aceitando vírgula como separador decimal.
+    Lança ValueError se o texto não for um número válido ou passar de VALOR_MAXIMO.
+    """
+    try:
+        valor = Decimal(str(texto).strip().replace(",", "."))
+        if not valor.is_finite() or abs(valor) > VALOR_MAXIMO:
+            raise ValueError(f"Valor inválido: {texto}")
+        return valor.quantize(CENTAVOS)
+    except (InvalidOperation, ArithmeticError):
+        raise ValueError(f"Valor inválido: {texto}")
+
+
+@lru_cache(maxsize=65536)
+def formatarData(data: date):
+    """
+    Formata uma data como DD/MM/YYYY, guardando o resultado para as próximas chamadas.
+    """
+    return data.strftime("%d/%m/%Y") if data else None
+
+
+@lru_cache(maxsize=1440)
+def formatarHora(hora: time):
+    """
+    Formata uma hora como HH:MM, guardando o resultado para as próximas chamadas.
+    """
+    return hora.strftime("%H:%M")
+
+
+@dataclass(slots=True)
+class Agendamento:
+    """
+    Agendamento de um serviço, com data e hora já convertidas. O id é atribuído pelo repositório;
+    o barbeiro, se não for escolhido, e a duração em minutos são definidos pela agenda ao agendar.
+
+    Os textos repetidos (serviço e situação) são internados, e datas e horas iguais compartilham
+    o mesmo objeto, o que reduz a memória por registro. A formatação para exibição é calculada
+    uma vez por data ou hora distinta e reaproveitada.
+    """
+    cliente: str
+    servico: str
+    data: date
+    hora: time
+    situacao: str = "Ativo"
+    barbeiro: str = None
+    duracao: int = None
+    id: int = None
+
+    def __post_init__(self):
+        self.servico = sys.intern(self.servico)
+        self.situacao = sys.intern(self.situacao)
+
+    @classmethod
+    def deTexto(cls, cliente: str, servico: str, data: str, hora: str, situacao: str = "Ativo",
+                barbeiro: str = None):
+        """
+        Cria o agendamento a partir de data (YYYY-MM-DD) e hora (HH:MM) em texto, validando-as.
+        """
+        return cls(cliente, servico, lerData(data), lerHora(hora), situacao, barbeiro)
+
+    @property
+    def dataFormatada(self):
+        return formatarData(self.data)
+
+    @property
+    def horaFormatada(self):
+        return formatarHora(self.hora)
+
+    def paraDicionario(self):
+        return {"id": self.id, "cliente": self.cliente, "servico": self.servico,
+                "data": self.data.isoformat(), "hora": formatarHora(self.hora),
+                "situacao": self.situacao, "barbeiro": self.barbeiro, "duracao": self.duracao}
+
+
+@dataclass(slots=True)
+class Produto:
+    """
+    Produto do estoque, com quantidade inteira e validade convertida.
+    """
+    nome: str
+    quantidade: int
+    validade: date = None
+    id: int = None
+
+    @classmethod
+    def deTexto(cls, nome: str, quantidade, validade: str = None):
+        """
+        Cria o produto a partir dos campos em texto. Quantidades inválidas são tratadas como zero.
+        """
+        try:
+            quantidade = int(quantidade)
+        except (TypeError, ValueError):
+            quantidade = 0
+        return cls(nome, quantidade, lerData(validade) if validade else None)
+
+    @property
+    def validadeFormatada(self):
+        return formatarData(self.validade)
+
+    def paraDicionario(self):
+        return {"id": self.id, "nome": self.nome, "quantidade": self.quantidade,
+                "validade": self.validade.isoformat() if self.validade else None}
+
+
+@dataclass(slots=True)
+class Conta:
+    """
+    Conta a pagar, com valor em Decimal e vencimento convertido.
+    """
+    descricao: str
+    valor: Decimal
+    vencimento: date
+    status: str = "Ativa"
+    id: int = None
+
+    def __post_init__(self):
+        self.status = sys.intern(self.status)
+
+    @classmethod
+    def deTexto(cls, descricao: str, valor: str, vencimento: str, status: str = "Ativa"):
+        """
+        Cria a conta a partir dos campos em texto, validando valor e vencimento.
+        """
+        return cls(descricao, lerValor(valor), lerData(vencimento), status)
+
+    @property
+    def valorFormatado(self):
+        return f"{self.valor:.2f}"
+
+    @property
+    def vencimentoFormatado(self):
+        return formatarData(self.vencimento)
+
+    def paraDicionario(self):
+        return {"id": self.id, "descricao": self.descricao, "valor": str(self.valor),
+                "vencimento": self.vencimento.isoformat(), "status": self.status}
+
+
+@dataclass(slots=True)
+class Movimento:
+    """
+    Movimentação de estoque de um produto: entrada, saída, venda ou ajuste.
+
+    A quantidade é positiva, exceto no ajuste, que pode ser negativo. O repositório atribui o id,
+    o momento e o saldo do produto logo depois da movimentação.
+    """
+    produto: int
+    tipo: str
+    quantidade: int
+    saldo: int = None
+    momento: datetime = None
+    id: int = None
+
+    def __post_init__(self):
+        self.tipo = sys.intern(self.tipo)
+
+    @classmethod
+    def deTexto(cls, produto, tipo: str, quantidade):
+        """
+        Cria a movimentação a partir dos campos em texto.
+        Lança ValueError se o produto, o tipo ou a quantidade forem inválidos.
+        """
+        try:
+            produto, quantidade = int(produto), int(quantidade)
+        except (TypeError, ValueError):
+            raise ValueError("Produto e quantidade devem ser números inteiros.")
+        movimento = cls(produto, str(tipo).strip().lower(), quantidade)
+        movimento.validar()
+        return movimento
+
+    def validar(self):
+        """
+        Lança ValueError se o tipo for desconhecido ou a quantidade não combinar com ele.
+        """
+        if self.tipo not in TIPOS_MOVIMENTO:
+            raise ValueError(f"Tipo de movimentação inválido: {self.tipo}")
+        if self.quantidade == 0 or (self.quantidade < 0 and self.tipo != "ajuste"):
+            raise ValueError(f"Quantidade inválida para {self.tipo}: {self.quantidade}")
+
+    @property
+    def variacao(self):
+        """
+        Quanto a movimentação soma ao saldo do produto.
+        """
+        return TIPOS_MOVIMENTO[self.tipo] * self.quantidade
+
+    @property
+    def momentoFormatado(self):
+        return self.momento.strftime("%d/%m/%Y %H:%M") if self.momento else None
+
+    def paraDicionario(self):
+        return {"id": self.id, "produto": self.produto, "tipo": self.tipo, "quantidade": self.quantidade,
+                "saldo": self.saldo, "momento": self.momento.isoformat(timespec="seconds") if self.momento else None}
@@ -0,0 +1,109 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+from modelos import TIPOS_MOVIMENTO, Movimento
+
+TIPOS = tuple(TIPOS_MOVIMENTO)
+LIMITE_MOVIMENTOS = 50
+
+
+class EstoqueInsuficiente(ValueError):
+    """
+    Uma saída ou venda deixaria o saldo do produto negativo.
+    """
+
+
+def calcularSaldos(movimentos: list, saldoAtual):
+    """
+    Aplica as movimentações, na ordem da lista, sobre os saldos atuais e preenche o saldo de cada
+    uma; saldoAtual(produto) retorna a quantidade do produto ou None se ele não existir.
+
+    Retorna {produto: saldo final}. Nada é gravado: se algum produto não existir (ValueError) ou
+    algum saldo ficar negativo (EstoqueInsuficiente), a exceção é lançada antes de qualquer escrita,
+    o que permite aos backends aplicar o lote inteiro ou nada.
+    """
+    saldos = {}
+    for movimento in movimentos:
+        movimento.validar()
+        saldo = saldos.get(movimento.produto)
+        if saldo is None:
+            saldo = saldoAtual(movimento.produto)
+            if saldo is None:
+                raise ValueError(f"Produto não encontrado: {movimento.produto}")
+        saldo += movimento.variacao
+        if saldo < 0:
+            raise EstoqueInsuficiente(f"Estoque insuficiente do produto {movimento.produto}: "
+                                      f"faltam {-saldo} unidade(s).")
+        movimento.saldo = saldos[movimento.produto] = saldo
+    return saldos
+
+
+def movimentoDeAjuste(produto: int, anterior: int, saldo: int, momento: datetime):
+    """
+    Movimentação que explica uma mudança direta do saldo de um produto, de anterior para saldo:
+    uma entrada no cadastro (anterior None) ou um ajuste. Retorna None se o saldo não mudou.
+    """
+    variacao = saldo - (anterior or 0)
+    if not variacao:
+        return None
+    tipo = "entrada" if anterior is None and variacao > 0 else "ajuste"
+    return Movimento(produto, tipo, variacao, saldo, momento)
+
+
+class LivroMovimentos:
+    """
+    Livro de movimentações de estoque somente de acréscimo, guardado em colunas (arrays).
+
+    Cada movimentação ocupa cerca de 40 bytes, contra algumas centenas como objeto, o que permite
+    manter milhões delas em memória; os objetos Movimento só são montados na leitura. O id é a
+    posição no livro mais um. As posições de cada produto ficam em um array próprio, então o
+    histórico de um produto é lido de trás para frente sem percorrer o livro inteiro.
+    """
+
+    def __init__(self):
+        self._produtos = array("q")
+        self._tipos = array("b")
+        self._quantidades = array("q")
+        self._saldos = array("q")
+        self._momentos = array("d")
+        self._porProduto = {}
+
+    def registrar(self, movimento: Movimento):
+        """
+        Acrescenta a movimentação, que já deve ter saldo e momento, e atribui o id.
+        """
+        posicao = len(self._produtos)
+        self._produtos.append(movimento.produto)
+        self._tipos.append(TIPOS.index(movimento.tipo))
+        self._quantidades.append(movimento.quantidade)
+        self._saldos.append(movimento.saldo)
+        self._momentos.append(movimento.momento.timestamp())
+        doProduto = self._porProduto.get(movimento.produto)
+        if doProduto is None:
+            doProduto = self._porProduto[movimento.produto] = array("q")
+        doProduto.append(posicao)
+        movimento.id = posicao + 1
+
+    def obter(self, identificador: int):
+        posicao = identificador - 1
+        if not 0 <= posicao < len(self._produtos):
+            return None
+        return Movimento(self._produtos[posicao], TIPOS[self._tipos[posicao]], self._quantidades[posicao],
+                         self._saldos[posicao], datetime.fromtimestamp(self._momentos[posicao]), identificador)
+
+    def recentes(self, produto: int = None, antes: int = None, limite: int = LIMITE_MOVIMENTOS):
+        """
+        Retorna até limite movimentações, das mais recentes para as mais antigas, opcionalmente de
+        um produto e apenas com id menor que antes (o cursor da página seguinte).
+        """
+        if produto is None:
+            fim = len(self._produtos) if antes is None else min(antes - 1, len(self._produtos))
+            return [self.obter(posicao + 1) for posicao in range(fim - 1, max(fim - limite, 0) - 1, -1)]
+        posicoes = self._porProduto.get(produto, ())
+        # As posições de um produto são crescentes: o cursor é uma busca binária.
+        fim = len(posicoes) if antes is None else bisect_left(posicoes, antes - 1)
+        return [self.obter(posicoes[indice] + 1) for indice in range(fim - 1, max(fim - limite, 0) - 1, -1)]
+
+    def __len__(self):
+        return len(self._produtos)
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+
+import anyio
+
+TIPOS_NOTIFICACAO = ("agendamento_novo", "lembrete", "conta_atrasada")
+DESTINOS = ("arquivo", "fila", "desligado")
+
+
+@dataclass(slots=True)
+class Notificacao:
+    """
+    Um evento a ser entregue: um novo agendamento, o lembrete de um agendamento ou uma conta que
+    passou a estar em atraso, com o registro correspondente em dados.
+    """
+    tipo: str
+    dados: dict
+    momento: datetime = None
+
+    def __post_init__(self):
+        if self.momento is None:
+            self.momento = datetime.now().replace(microsecond=0)
+
+    def paraDicionario(self):
+        return {"tipo": self.tipo, "momento": self.momento.isoformat(timespec="seconds"), "dados": self.dados}
+
+
+class DestinoNotificacoes:
+    """
+    Interface dos destinos das notificações (e-mail, SMS, webhook...).
+
+    entregar recebe um lote de notificações e deve lançar uma exceção se o lote não puder ser
+    entregue; o EntregadorNotificacoes tenta de novo, então a entrega é pelo menos uma vez.
+    """
+
+    async def entregar(self, notificacoes: list):
+        raise NotImplementedError
+
+    async def fechar(self):
+        pass
+
+
+class DestinoArquivo(DestinoNotificacoes):
+    """
+    Acrescenta cada notificação como uma linha JSON em um arquivo local, fora do event loop. Cada
+    lote é gravado com uma única escrita.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+
+    def _gravar(self, linhas: str):
+        with open(self.caminho, "a", encoding="utf-8") as arquivo:
+            arquivo.write(linhas)
+
+    async def entregar(self, notificacoes: list):
+        linhas = "".join(json.dumps(notificacao.paraDicionario(), ensure_ascii=False) + "\n"
+                         for notificacao in notificacoes)
+        await anyio.to_thread.run_sync(self._gravar, linhas)
+
+
+class DestinoFila(DestinoNotificacoes):
+    """
+    Entrega as notificações em uma asyncio.Queue do próprio processo, para consumidores internos.
+    """
+
+    def __init__(self):
+        self.fila = asyncio.Queue()
+
+    async def entregar(self, notificacoes: list):
+        for notificacao in notificacoes:
+            self.fila.put_nowait(notificacao)
+
+
+@dataclass
+class ConfiguracaoNotificacoes:
+    """
+    Configuração da entrega das notificações.
+
+    As notificações são agrupadas em lotes de até tamanhoLote, esperando no máximo esperaLote
+    segundos para completar um lote. Um lote recusado pelo destino é tentado de novo até tentativas
+    vezes, com espera crescente a partir de esperaTentativa segundos. Acima de limiteFila
+    notificações pendentes, as novas são descartadas.
+    """
+    destino: str = "arquivo"
+    arquivo: str = "notificacoes.jsonl"
+    tamanhoLote: int = 100
+    esperaLote: float = 0.5
+    tentativas: int = 5
+    esperaTentativa: float = 0.5
+    limiteFila: int = 10000
+
+    @classmethod
+    def deAmbiente(cls):
+        """
+        Lê a configuração das variáveis de ambiente BARBEARIA_NOTIFICACOES_*.
+        """
+        config = cls(
+            destino=os.environ.get("BARBEARIA_NOTIFICACOES", cls.destino),
+            arquivo=os.environ.get("BARBEARIA_NOTIFICACOES_ARQUIVO", cls.arquivo),
+            tamanhoLote=int(os.environ.get("BARBEARIA_NOTIFICACOES_LOTE", cls.tamanhoLote)),
+            tentativas=int(os.environ.get("BARBEARIA_NOTIFICACOES_TENTATIVAS", cls.tentativas)))
+        if config.destino not in DESTINOS:
+            raise ValueError(f"Destino de notificações inválido: {config.destino}")
+        return config
+
+
+class EntregadorNotificacoes:
+    """
+    Fila de saída das notificações, consumida por uma tarefa em segundo plano.
+
+    enviar apenas coloca a notificação na fila, sem esperar o destino, então os endpoints não ficam
+    mais lentos. A tarefa junta as pendentes em lotes e entrega cada lote com novas tentativas; um
+    lote que falha em todas é descartado e registrado no log. Antes de ser iniciado, ou com o
+    destino desligado, enviar descarta as notificações.
+    """
+
+    def __init__(self, destino: DestinoNotificacoes, config: ConfiguracaoNotificacoes = None):
+        self.destino = destino
+        self.config = config or ConfiguracaoNotificacoes()
+        self.logger = logging.getLogger("barbearia.notificacoes")
+        self.entregues = 0
+        self.descartadas = 0
+        self.lotes = 0
+        self._fila = None
+        self._tarefa = None
+
+    def enviar(self, notificacao: Notificacao):
+        """
+        Coloca a notificação na fila de entrega. Retorna False se ela foi descartada.
+        """
+        if self._fila is None:
+            return False
+        if self._fila.qsize() >= self.config.limiteFila:
+            self.descartadas += 1
+            self.logger.warning("fila de notificações cheia; notificação %s descartada", notificacao.tipo)
+            return False
+        self._fila.put_nowait(notificacao)
+        return True
+
+    def iniciar(self):
+        if self.destino is not None and self._tarefa is None:
+            self._fila = asyncio.Queue()
+            self._tarefa = asyncio.create_task(self._executar())
+
+    async def _proximoLote(self):
+        """
+        Espera a primeira notificação e junta as que chegarem em até esperaLote segundos.
+        Um None na fila encerra a tarefa depois de entregar o lote atual.
+        """
+        primeira = await self._fila.get()
+        if primeira is None:
+            return [], True
+        lote = [primeira]
+        limite = asyncio.get_running_loop().time() + self.config.esperaLote
+        while len(lote) < self.config.tamanhoLote:
+            if self._fila.empty():
+                restante = limite - asyncio.get_running_loop().time()
+                if restante <= 0:
+                    break
+                try:
+                    notificacao = await asyncio.wait_for(self._fila.get(), restante)
+                except asyncio.TimeoutError:
+                    break
+            else:
+                notificacao = self._fila.get_nowait()
+            if notificacao is None:
+                return lote, True
+            lote.append(notificacao)
+        return lote, False
+
+    async def _executar(self):
+        encerrar = False
+        while not encerrar:
+            lote, encerrar = await self._proximoLote()
+            if lote:
+                await self._entregar(lote)
+
+    async def _entregar(self, lote: list):
+        for tentativa in range(self.config.tentativas):
+            try:
+                await self.destino.entregar(lote)
+            except Exception as erro:
+                self.logger.warning("falha ao entregar %d notificações (tentativa %d de %d): %r",
+                                    len(lote), tentativa + 1, self.config.tentativas, erro)
+                if tentativa + 1 < self.config.tentativas:
+                    await asyncio.sleep(self.config.esperaTentativa * 2 ** tentativa)
+            else:
+                self.entregues += len(lote)
+                self.lotes += 1
+                return
+        self.descartadas += len(lote)
+        self.logger.error("%d notificações descartadas após %d tentativas", len(lote), self.config.tentativas)
+
+    async def parar(self, espera: float = 10.0):
+        """
+        Entrega as notificações pendentes, esperando até espera segundos, e fecha o destino.
+        """
+        if self._tarefa is None:
+            return
+        self._fila.put_nowait(None)
+        try:
+            await asyncio.wait_for(self._tarefa, espera)
+        except asyncio.TimeoutError:
+            self.logger.error("%d notificações pendentes não entregues no encerramento", self._fila.qsize())
+        self._tarefa = self._fila = None
+        await self.destino.fechar()
+
+
+def criarEntregador(config: ConfiguracaoNotificacoes):
+    """
+    Cria o entregador com o destino configurado: "arquivo" (padrão), "fila" ou "desligado".
+    """
+    destinos = {"arquivo": lambda: DestinoArquivo(config.arquivo), "fila": DestinoFila, "desligado": lambda: None}
+    return EntregadorNotificacoes(destinos[config.destino](), config)
@@ -0,0 +1,334 @@
+import base64
+import binascii
+import json
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import date, time, timedelta
+
+from modelos import formatarHora, lerData, lerHora
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 100
+
+# Colunas de cada ordenação, por tabela. O id é sempre acrescentado como desempate.
+ORDENACOES = {
+    "agendamentos": {"id": (), "data": ("data", "hora")},
+    "estoque": {"id": (), "nome": ("nome",), "quantidade": ("quantidade",), "validade": ("validade",)},
+    "contas": {"id": (), "vencimento": ("vencimento",), "status": ("status", "vencimento")},
+}
+CAMPO_PERIODO = {"agendamentos": "data", "estoque": "validade", "contas": "vencimento"}
+FILTROS = {"agendamentos": ("cliente",), "estoque": ("prefixo",), "contas": ("status",)}
+COLUNAS_DATA = ("data", "validade", "vencimento")
+FIM_PREFIXO = "\U0010ffff"
+CARGA_BLOCO = 512
+
+
+class _Maximo:
+    """
+    Sentinela maior que qualquer valor, usada para limitar buscas por prefixo de chave.
+    """
+
+    def __gt__(self, outro):
+        return True
+
+    def __lt__(self, outro):
+        return False
+
+
+MAXIMO = _Maximo()
+_MINUSCULAS_ASCII = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def normalizarNome(nome: str):
+    """
+    Converte para minúsculas apenas as letras ASCII, como o COLLATE NOCASE do SQLite.
+    """
+    return nome.translate(_MINUSCULAS_ASCII)
+
+
+def valorOrdenacao(registro, coluna: str):
+    """
+    Retorna o valor de ordenação de uma coluna do registro. Nomes são comparados sem diferenciar
+    maiúsculas (ASCII) e validades vazias ficam antes de todas as outras, como no SQLite.
+    """
+    valor = getattr(registro, coluna)
+    if coluna == "nome":
+        return normalizarNome(valor)
+    if valor is None:
+        return date.min
+    return valor
+
+
+def chaveOrdenacao(tabela: str, ordem: str, registro):
+    """
+    Retorna a chave completa de um registro na ordenação informada, terminando pelo id.
+    """
+    return tuple(valorOrdenacao(registro, coluna) for coluna in ORDENACOES[tabela][ordem]) + (registro.id,)
+
+
+def _paraJson(valor):
+    if isinstance(valor, date):
+        return "" if valor == date.min else valor.isoformat()
+    if isinstance(valor, time):
+        return formatarHora(valor)
+    return valor
+
+
+def _deJson(coluna: str, valor):
+    if coluna in COLUNAS_DATA:
+        return lerData(valor) if valor else date.min
+    if coluna == "hora":
+        return lerHora(valor)
+    if coluna in ("quantidade", "id"):
+        return int(valor)
+    return str(valor)
+
+
+def valorBanco(valor):
+    """
+    Converte um valor de ordenação para a forma gravada no SQLite (datas em ISO, horas em HH:MM).
+    """
+    return _paraJson(valor)
+
+
+def codificarCursor(chave: tuple):
+    """
+    Codifica a chave do último registro de uma página em um cursor opaco para a próxima.
+    """
+    texto = json.dumps([_paraJson(valor) for valor in chave], separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificarCursor(tabela: str, ordem: str, cursor: str):
+    """
+    Decodifica um cursor gerado por codificarCursor para a ordenação informada.
+    Lança ValueError se o cursor for inválido ou de outra ordenação.
+    """
+    colunas = ORDENACOES[tabela][ordem] + ("id",)
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(valores, list) or len(valores) != len(colunas):
+            raise ValueError
+        return tuple(_deJson(coluna, valor) for coluna, valor in zip(colunas, valores))
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("Cursor inválido.")
+
+
+@dataclass(slots=True)
+class Consulta:
+    """
+    Parâmetros de uma listagem paginada: ordenação, filtros e posição.
+
+    A paginação é por cursor (keyset): apos guarda a chave de ordenação do último registro da
+    página anterior, então cada página é uma busca por faixa no índice da ordenação, com custo
+    independente de quantas páginas vieram antes.
+    """
+    tabela: str
+    ordem: str = "id"
+    decrescente: bool = False
+    inicio: date = None
+    fim: date = None
+    status: str = None
+    prefixo: str = None
+    cliente: str = None
+    apos: tuple = None
+    limite: int = LIMITE_PADRAO
+
+    @classmethod
+    def deParametros(cls, tabela: str, ordem: str = "id", decrescente: bool = False, inicio: date = None,
+                     fim: date = None, status: str = None, prefixo: str = None, cliente: str = None,
+                     apos: str = None, limite: int = LIMITE_PADRAO):
+        """
+        Cria a consulta a partir dos parâmetros da requisição, validando-os.
+        Lança ValueError se a ordenação, o limite, o cursor ou algum filtro não forem válidos para a tabela.
+        """
+        if ordem not in ORDENACOES[tabela]:
+            raise ValueError(f"Ordenação inválida: {ordem}. Use {', '.join(ORDENACOES[tabela])}.")
+        if not 1 <= limite <= LIMITE_MAXIMO:
+            raise ValueError(f"O limite deve estar entre 1 e {LIMITE_MAXIMO}.")
+        filtros = {"status": status, "prefixo": prefixo, "cliente": cliente}
+        for filtro, valor in filtros.items():
+            if valor is not None and filtro not in FILTROS[tabela]:
+                raise ValueError(f"Filtro não suportado em {tabela}: {filtro}.")
+        return cls(tabela, ordem, decrescente, inicio, fim, status, prefixo or None, cliente,
+                   decodificarCursor(tabela, ordem, apos) if apos else None, limite)
+
+    @property
+    def colunas(self):
+        return ORDENACOES[self.tabela][self.ordem]
+
+    def aceita(self, registro):
+        """
+        Indica se o registro passa em todos os filtros da consulta.
+        """
+        if self.inicio is not None or self.fim is not None:
+            valor = getattr(registro, CAMPO_PERIODO[self.tabela])
+            if valor is None or (self.inicio and valor < self.inicio) or (self.fim and valor > self.fim):
+                return False
+        if self.status is not None and registro.status != self.status:
+            return False
+        if self.cliente is not None and registro.cliente != self.cliente:
+            return False
+        if self.prefixo is not None and not normalizarNome(registro.nome).startswith(normalizarNome(self.prefixo)):
+            return False
+        return True
+
+
+@dataclass(slots=True)
+class Pagina:
+    """
+    Uma página de registros e o cursor da próxima página (None na última). Cada registro é
+    identificado pelo seu id, que não muda quando outros registros são excluídos.
+    """
+    itens: list
+    proximo: str = None
+
+    def paraDicionario(self):
+        return {
+            "itens": [item.paraDicionario() for item in self.itens],
+            "proximo": self.proximo
+        }
+
+
+def montarPagina(consulta: Consulta, registros):
+    """
+    Lê até limite + 1 registros aceitos pela consulta para saber se existe uma próxima página.
+    """
+    itens = []
+    for registro in registros:
+        if consulta.aceita(registro):
+            itens.append(registro)
+            if len(itens) > consulta.limite:
+                break
+    proximo = None
+    if len(itens) > consulta.limite:
+        itens.pop()
+        proximo = codificarCursor(chaveOrdenacao(consulta.tabela, consulta.ordem, itens[-1]))
+    return Pagina(itens, proximo)
+
+
+class IndiceOrdenado:
+    """
+    Registros mantidos em ordem por algumas colunas, atualizados com bisect a cada escrita.
+
+    Cada entrada é a tupla (valores das colunas..., id, registro); como o id é único, o registro
+    nunca chega a ser comparado. As entradas ficam em blocos de até 2 * CARGA_BLOCO, então uma
+    inserção fora de ordem move no máximo um bloco, e não a lista inteira. Uma consulta vira uma
+    busca binária pelo início da faixa seguida da leitura sequencial até completar a página, como
+    um índice de banco de dados.
+    """
+
+    def __init__(self, colunas: tuple):
+        self.colunas = colunas
+        self._blocos = []
+        self._maximos = []
+
+    def _chave(self, registro):
+        return tuple(valorOrdenacao(registro, coluna) for coluna in self.colunas) + (registro.id,)
+
+    def _localizar(self, chave: tuple):
+        """
+        Retorna (bloco, posição) da primeira entrada maior ou igual à chave.
+        """
+        bloco = bisect_left(self._maximos, chave)
+        if bloco == len(self._blocos):
+            return bloco, 0
+        return bloco, bisect_left(self._blocos[bloco], chave)
+
+    def adicionar(self, registro):
+        entrada = self._chave(registro) + (registro,)
+        if not self._blocos:
+            self._blocos.append([entrada])
+            self._maximos.append(entrada)
+            return
+        posicao = min(bisect_left(self._maximos, entrada), len(self._blocos) - 1)
+        bloco = self._blocos[posicao]
+        insort(bloco, entrada)
+        if len(bloco) > 2 * CARGA_BLOCO:
+            novo = bloco[CARGA_BLOCO:]
+            del bloco[CARGA_BLOCO:]
+            self._blocos.insert(posicao + 1, novo)
+            self._maximos.insert(posicao + 1, novo[-1])
+        self._maximos[posicao] = bloco[-1]
+
+    def remover(self, registro):
+        posicao, indice = self._localizar(self._chave(registro))
+        if posicao == len(self._blocos) or self._blocos[posicao][indice][-1] is not registro:
+            return
+        bloco = self._blocos[posicao]
+        del bloco[indice]
+        if bloco:
+            self._maximos[posicao] = bloco[-1]
+        else:
+            del self._blocos[posicao]
+            del self._maximos[posicao]
+
+    def faixa(self, inferior: tuple, superior: tuple):
+        """
+        Percorre, em ordem crescente, os registros com chave entre inferior (inclusive) e superior
+        (exclusive); chaves parciais comparam só as primeiras colunas.
+        """
+        return self._crescente(self._localizar(inferior), self._localizar(superior))
+
+    def atende(self, consulta: Consulta):
+        """
+        Retorna quantas colunas iniciais do índice são fixadas por filtros de igualdade da consulta,
+        ou None se o índice não puder ser usado na ordenação pedida.
+        """
+        igualdades = 0
+        while igualdades < len(self.colunas) and getattr(consulta, self.colunas[igualdades], None) is not None:
+            igualdades += 1
+        fixas = len(self.colunas) - len(consulta.colunas)
+        if 0 <= fixas <= igualdades and self.colunas[fixas:] == consulta.colunas:
+            return igualdades
+        return None
+
+    def percorrer(self, consulta: Consulta, igualdades: int):
+        """
+        Percorre os registros da consulta na ordem do índice, limitando a faixa pelos filtros de
+        igualdade, pelo período ou prefixo na coluna seguinte e pelo cursor.
+        """
+        prefixo = tuple(getattr(consulta, coluna) for coluna in self.colunas[:igualdades])
+        inferior, superior = prefixo, prefixo + (MAXIMO,)
+        if igualdades < len(self.colunas):
+            coluna = self.colunas[igualdades]
+            if coluna == CAMPO_PERIODO[consulta.tabela]:
+                if consulta.inicio is not None:
+                    inferior = prefixo + (consulta.inicio,)
+                if consulta.fim is not None and consulta.fim < date.max:
+                    superior = prefixo + (consulta.fim + timedelta(days=1),)
+            elif coluna == "nome" and consulta.prefixo:
+                inferior = prefixo + (normalizarNome(consulta.prefixo),)
+                superior = prefixo + (normalizarNome(consulta.prefixo) + FIM_PREFIXO,)
+
+        inicio, fim = self._localizar(inferior), self._localizar(superior)
+        if consulta.apos is not None:
+            cursor = prefixo[:len(self.colunas) - len(consulta.colunas)] + consulta.apos
+            if consulta.decrescente:
+                fim = min(fim, self._localizar(cursor))
+            else:
+                inicio = max(inicio, self._localizar(cursor + (MAXIMO,)))
+        if consulta.decrescente:
+            return self._decrescente(inicio, fim)
+        return self._crescente(inicio, fim)
+
+    def _crescente(self, inicio: tuple, fim: tuple):
+        (bloco, indice), (blocoFim, indiceFim) = inicio, fim
+        while (bloco, indice) < (blocoFim, indiceFim):
+            entradas = self._blocos[bloco]
+            for posicao in range(indice, indiceFim if bloco == blocoFim else len(entradas)):
+                yield entradas[posicao][-1]
+            bloco, indice = bloco + 1, 0
+
+    def _decrescente(self, inicio: tuple, fim: tuple):
+        (bloco, indice), (blocoFim, indiceFim) = inicio, fim
+        while (blocoFim, indiceFim) > (bloco, indice):
+            if indiceFim == 0:
+                blocoFim -= 1
+                indiceFim = len(self._blocos[blocoFim])
+                continue
+            entradas = self._blocos[blocoFim]
+            primeiro = indice if blocoFim == bloco else 0
+            for posicao in range(indiceFim - 1, primeiro - 1, -1):
+                yield entradas[posicao][-1]
+            indiceFim = primeiro
@@ -0,0 +1,190 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+from dataclasses import dataclass
+
+MODOS_CORPO = ("desligado", "limitado", "amostra")
+METODOS_COM_CORPO = ("POST", "PUT", "PATCH", "DELETE")
+# Rotas de autenticação, cujo corpo nunca é registrado.
+ROTAS_SEM_CORPO = ("/login", "/cadastro")
+# Campos ocultados no corpo registrado: qualquer nome que contenha senha, token ou segredo, em
+# formulários (nome=valor) e em JSON ("nome": valor), inclusive com o valor cortado pelo limite.
+CAMPO_SENSIVEL = r'[^&="{}\s,:]*(?:senha|token|segredo|password|secret)[^&="{}\s,:]*'
+PADRAO_SENSIVEL = re.compile(
+    rf'(?P<formulario>(?:^|&){CAMPO_SENSIVEL}=)[^&]*'
+    rf'|(?P<json>"{CAMPO_SENSIVEL}"\s*:\s*)(?:"(?:[^"\\]|\\.)*"?|[^,}}\s]*)',
+    re.IGNORECASE)
+
+
+def ocultarCamposSensiveis(corpo: str):
+    """
+    Substitui por "***" o valor dos campos de senha, token ou segredo do corpo de uma requisição.
+    """
+    return PADRAO_SENSIVEL.sub(
+        lambda busca: (busca["formulario"] + "***") if busca["formulario"] else (busca["json"] + '"***"'), corpo)
+
+
+@dataclass
+class ConfiguracaoRegistro:
+    """
+    Configuração do registro de requisições.
+
+    modoCorpo define a captura do corpo: "desligado" (o padrão) não captura, "limitado" captura
+    até limiteCorpo bytes de toda requisição com corpo e "amostra" faz o mesmo apenas para
+    percentualAmostra por cento das requisições. Mesmo ligada, a captura ignora as rotas de
+    autenticação e oculta os campos de senha e tokens.
+    """
+    ativo: bool = True
+    arquivo: str = "logs.log"
+    modoCorpo: str = "desligado"
+    limiteCorpo: int = 1024
+    percentualAmostra: float = 10.0
+    rotacao: str = "tamanho"
+    tamanhoMaximo: int = 10 * 1024 * 1024
+    quando: str = "midnight"
+    backups: int = 5
+
+    @classmethod
+    def deAmbiente(cls):
+        """
+        Lê a configuração das variáveis de ambiente BARBEARIA_LOG_*.
+        """
+        config = cls(
+            ativo=os.environ.get("BARBEARIA_LOG", "1") != "0",
+            arquivo=os.environ.get("BARBEARIA_LOG_ARQUIVO", cls.arquivo),
+            modoCorpo=os.environ.get("BARBEARIA_LOG_CORPO", cls.modoCorpo),
+            limiteCorpo=int(os.environ.get("BARBEARIA_LOG_CORPO_LIMITE", cls.limiteCorpo)),
+            percentualAmostra=float(os.environ.get("BARBEARIA_LOG_AMOSTRA", cls.percentualAmostra)),
+            rotacao=os.environ.get("BARBEARIA_LOG_ROTACAO", cls.rotacao),
+            tamanhoMaximo=int(os.environ.get("BARBEARIA_LOG_TAMANHO_MAX", cls.tamanhoMaximo)),
+            quando=os.environ.get("BARBEARIA_LOG_QUANDO", cls.quando),
+            backups=int(os.environ.get("BARBEARIA_LOG_BACKUPS", cls.backups)))
+        if config.modoCorpo not in MODOS_CORPO:
+            raise ValueError(f"Modo de captura de corpo inválido: {config.modoCorpo}")
+        return config
+
+
+class FormatadorJSON(logging.Formatter):
+    """
+    Formata cada registro como uma linha JSON, incluindo os campos da requisição, se houver.
+    """
+
+    def format(self, record: logging.LogRecord):
+        linha = {
+            "momento": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "nivel": record.levelname,
+            "mensagem": record.getMessage()
+        }
+        linha.update(getattr(record, "requisicao", {}))
+        return json.dumps(linha, ensure_ascii=False)
+
+
+def configurarRegistro(config: ConfiguracaoRegistro):
+    """
+    Configura o logging da aplicação com um QueueHandler e inicia o QueueListener.
+
+    Os endpoints apenas enfileiram os registros; a formatação e a escrita em disco, com rotação
+    por tamanho ou por tempo, acontecem na thread do listener, fora do event loop. Retorna o
+    listener, que deve ser parado no encerramento da aplicação.
+    """
+    if config.rotacao == "tempo":
+        manipuladorArquivo = logging.handlers.TimedRotatingFileHandler(
+            config.arquivo, when=config.quando, backupCount=config.backups, encoding="utf-8")
+    else:
+        manipuladorArquivo = logging.handlers.RotatingFileHandler(
+            config.arquivo, maxBytes=config.tamanhoMaximo, backupCount=config.backups,
+            encoding="utf-8")
+    manipuladorArquivo.setFormatter(FormatadorJSON())
+
+    fila = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    raiz.setLevel(logging.INFO)
+    raiz.addHandler(logging.handlers.QueueHandler(fila))
+
+    listener = logging.handlers.QueueListener(fila, manipuladorArquivo)
+    listener.start()
+    return listener
+
+
+def encerrarRegistro(listener: logging.handlers.QueueListener):
+    """
+    Esvazia a fila de logs pendentes, para o listener e remove o QueueHandler associado.
+    """
+    listener.stop()
+    raiz = logging.getLogger()
+    for manipulador in list(raiz.handlers):
+        if isinstance(manipulador, logging.handlers.QueueHandler) and manipulador.queue is listener.queue:
+            raiz.removeHandler(manipulador)
+    for manipulador in listener.handlers:
+        manipulador.close()
+
+
+class RegistroRequisicoes:
+    """
+    Middleware ASGI que registra cada requisição HTTP em uma linha JSON.
+
+    Registra método, caminho, status, latência e tamanho da resposta. O corpo da requisição não
+    é lido antecipadamente: os pedaços são copiados, até o limite configurado, conforme o próprio
+    endpoint os consome, então uploads grandes não são carregados em memória só para o log.
+    """
+
+    def __init__(self, app, config: ConfiguracaoRegistro):
+        self.app = app
+        self.config = config
+        self.logger = logging.getLogger("barbearia.requisicoes")
+
+    def _capturarCorpo(self, metodo: str, caminho: str):
+        if (self.config.modoCorpo == "desligado" or metodo not in METODOS_COM_CORPO
+                or caminho in ROTAS_SEM_CORPO):
+            return False
+        if self.config.modoCorpo == "amostra":
+            return random.random() * 100 < self.config.percentualAmostra
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        corpo = bytearray() if self._capturarCorpo(scope["method"], scope["path"]) else None
+        truncado = False
+        resposta = {"status": 500, "bytes": 0}
+
+        async def receberComCopia():
+            nonlocal truncado
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                pedaco = mensagem.get("body", b"")
+                restante = self.config.limiteCorpo - len(corpo)
+                corpo.extend(pedaco[:restante])
+                truncado = truncado or len(pedaco) > restante
+            return mensagem
+
+        async def enviarComContagem(mensagem):
+            if mensagem["type"] == "http.response.start":
+                resposta["status"] = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                resposta["bytes"] += len(mensagem.get("body", b""))
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receberComCopia if corpo is not None else receive, enviarComContagem)
+        finally:
+            dados = {
+                "metodo": scope["method"],
+                "caminho": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "status": resposta["status"],
+                "duracao_ms": round((time.perf_counter() - inicio) * 1000, 3),
+                "bytes_resposta": resposta["bytes"]
+            }
+            if corpo is not None:
+                dados["corpo"] = ocultarCamposSensiveis(corpo.decode("utf-8", errors="replace"))
+                dados["corpo_truncado"] = truncado
+            self.logger.info("requisicao", extra={"requisicao": dados})
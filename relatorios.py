@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from openpyxl import Workbook
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from financeiro import TotaisContas, mesDe, resumirFinanceiro
+from modelos import formatarData, formatarHora
+
+ABAS = ("agendamentos", "estoque", "contas")
+TIPOS_MIDIA = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf"
+}
+LIMITE_MEMORIA_ARQUIVO = 8 * 1024 * 1024
+TAMANHO_PEDACO = 64 * 1024
+LINHAS_POR_TABELA = 1000
+LIMITE_TEXTO_SIMPLES = 30
+
+_executor = None
+
+
+def lerAbas(abas: str):
+    """
+    Converte a lista de abas separada por vírgulas em uma tupla, validando os nomes.
+    Lança ValueError se alguma aba for desconhecida.
+    """
+    selecionadas = tuple(aba.strip().lower() for aba in abas.split(",") if aba.strip())
+    desconhecidas = [aba for aba in selecionadas if aba not in ABAS]
+    if desconhecidas or not selecionadas:
+        raise ValueError(f"Abas inválidas: {', '.join(desconhecidas) or abas}")
+    return selecionadas
+
+
+def linhasFinanceiro(contas: list, hoje: date):
+    """
+    Resume as contas do relatório em três tabelas de linhas prontas para exibir: totais por
+    situação, fluxo de caixa por mês de vencimento e vencimentos em aberto dos próximos meses,
+    a partir de hoje. O fluxo começa no primeiro vencimento das contas do relatório e vai até o
+    último, limitado a MESES_FLUXO_MAXIMO meses. Os valores continuam em Decimal.
+    """
+    inicio = mesDe(min(conta.vencimento for conta in contas)) if contas else None
+    resumo = resumirFinanceiro(TotaisContas.deContas(contas).consultar(), hoje, inicio)
+    rotulos = {"ativas": "Ativas", "atrasadas": "Atrasadas", "pagas": "Pagas", "emAberto": "Em aberto"}
+    totais = [[rotulos[nome], total.quantidade, total.valor] for nome, total in resumo.totais.items()]
+    fluxo = [[mes.mes, mes.previsto.valor, mes.pago.valor, mes.emAberto.valor, mes.atrasado.valor]
+             for mes in resumo.fluxo]
+    projecao = [[mes, total.quantidade, total.valor, acumulado] for mes, total, acumulado in resumo.projecao]
+    return totais, fluxo, projecao
+
+
+def gerarExcel(dados: dict, hoje: date = None):
+    """
+    Gera o relatório Excel em modo somente escrita e retorna um arquivo temporário posicionado no início.
+
+    dados mapeia o nome de cada aba incluída ("agendamentos", "estoque", "contas") para seus
+    registros. As linhas são gravadas em sequência, sem manter a planilha inteira em memória,
+    e o resultado fica em um SpooledTemporaryFile exclusivo da requisição, que só vai para o
+    disco se passar de LIMITE_MEMORIA_ARQUIVO. Com as contas, acrescenta a aba Financeiro, com
+    os totais, o fluxo mensal e a projeção calculados a partir de hoje (por padrão, a data atual).
+    """
+    wb = Workbook(write_only=True)
+
+    if "agendamentos" in dados:
+        wbAgendamentos = wb.create_sheet(title="Agendamentos")
+        wbAgendamentos.append(["Cliente", "Serviço", "Barbeiro", "Data", "Hora", "Situação"])
+        for agendamento in dados["agendamentos"]:
+            wbAgendamentos.append([
+                agendamento.cliente, agendamento.servico, agendamento.barbeiro or "",
+                formatarData(agendamento.data),
+                formatarHora(agendamento.hora), agendamento.situacao
+            ])
+
+    if "estoque" in dados:
+        wbEstoque = wb.create_sheet(title="Estoque")
+        wbEstoque.append(["Nome", "Quantidade", "Validade"])
+        for produto in dados["estoque"]:
+            wbEstoque.append([
+                produto.nome,
+                produto.quantidade,
+                formatarData(produto.validade)
+            ])
+
+    if "contas" in dados:
+        wbContas = wb.create_sheet(title="Contas")
+        wbContas.append(["Descrição", "Valor", "Vencimento", "Status"])
+        for conta in dados["contas"]:
+            wbContas.append([
+                conta.descricao,
+                conta.valor,
+                formatarData(conta.vencimento),
+                conta.status
+            ])
+
+        totais, fluxo, projecao = linhasFinanceiro(dados["contas"], hoje or date.today())
+        wbFinanceiro = wb.create_sheet(title="Financeiro")
+        wbFinanceiro.append(["Situação", "Contas", "Valor"])
+        for linha in totais:
+            wbFinanceiro.append(linha)
+        wbFinanceiro.append([])
+        wbFinanceiro.append(["Mês", "Previsto", "Pago", "Em aberto", "Atrasado"])
+        for linha in fluxo:
+            wbFinanceiro.append(linha)
+        wbFinanceiro.append([])
+        wbFinanceiro.append(["Vencimentos", "Contas", "A pagar", "Acumulado"])
+        for linha in projecao:
+            wbFinanceiro.append(linha)
+
+    arquivo = tempfile.SpooledTemporaryFile(max_size=LIMITE_MEMORIA_ARQUIVO)
+    wb.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
+
+
+def _celula(texto, estilo):
+    """
+    Retorna o texto como Paragraph, que quebra linhas, apenas quando ele for longo; textos curtos
+    ficam como string simples, bem mais baratos de desenhar.
+    """
+    texto = "" if texto is None else str(texto)
+    if len(texto) <= LIMITE_TEXTO_SIMPLES:
+        return texto
+    return Paragraph(texto.replace("&", "&amp;").replace("<", "&lt;"), estilo)
+
+
+def _tabelas(cabecalho: list, linhas: list, larguras: list, total: list):
+    """
+    Divide as linhas em tabelas de até LINHAS_POR_TABELA linhas, todas com o cabeçalho repetido
+    a cada página, e acrescenta a linha de total ao final da última.
+
+    Tabelas menores mantêm o custo de paginação do platypus linear no número de linhas.
+    """
+    estilo = TableStyle([
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#343a40")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("FONTSIZE", (0, 0), (-1, -1), 9),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LINEBELOW", (0, 0), (-1, -1), 0.25, colors.grey),
+    ])
+    estiloTotal = TableStyle([
+        ("FONTNAME", (0, -1), (-1, -1), "Helvetica-Bold"),
+        ("LINEABOVE", (0, -1), (-1, -1), 1, colors.black),
+    ])
+    blocos = [linhas[i:i + LINHAS_POR_TABELA] for i in range(0, len(linhas), LINHAS_POR_TABELA)] or [[]]
+    tabelas = []
+    for posicao, bloco in enumerate(blocos):
+        ultima = posicao == len(blocos) - 1
+        tabela = Table([cabecalho] + bloco + ([total] if ultima else []),
+                       colWidths=larguras, repeatRows=1)
+        tabela.setStyle(estilo)
+        if ultima:
+            tabela.setStyle(estiloTotal)
+        tabelas.append(tabela)
+    return tabelas
+
+
+def somarValores(contas: list):
+    """
+    Soma os valores das contas com Decimal.
+    """
+    return sum((conta.valor for conta in contas), Decimal("0.00"))
+
+
+def gerarPDF(dados: dict, caminho: str, hoje: date = None):
+    """
+    Gera o relatório PDF com tabelas do reportlab platypus e o grava em caminho.
+
+    Cada seção (Agendamentos, Estoque e Contas) vira uma tabela com cabeçalho repetido em
+    todas as páginas, quebra de linha nos textos longos e uma linha de total. As contas são
+    seguidas do resumo financeiro, como na aba Financeiro do Excel. Por ser uma tarefa pesada de
+    CPU, é executada em um processo separado por gerarPDFEmProcesso.
+    """
+    estilos = getSampleStyleSheet()
+    celula = estilos["BodyText"]
+    celula.fontSize = 9
+    celula.leading = 11
+    historia = [Paragraph("Relatório de Agendamentos, Estoque e Contas", estilos["Title"])]
+
+    if "agendamentos" in dados:
+        agendamentos = dados["agendamentos"]
+        historia.append(Paragraph("Agendamentos", estilos["Heading2"]))
+        historia.extend(_tabelas(
+            ["Cliente", "Serviço", "Barbeiro", "Data", "Hora", "Situação"],
+            [[_celula(ag.cliente, celula), _celula(ag.servico, celula), _celula(ag.barbeiro, celula),
+              formatarData(ag.data), formatarHora(ag.hora), ag.situacao] for ag in agendamentos],
+            [132, 100, 100, 62, 44, 74],
+            [f"Total: {len(agendamentos)} agendamentos", "", "", "", "", ""]))
+        historia.append(Spacer(1, 12))
+
+    if "estoque" in dados:
+        estoque = dados["estoque"]
+        historia.append(Paragraph("Estoque", estilos["Heading2"]))
+        historia.extend(_tabelas(
+            ["Nome", "Quantidade", "Validade"],
+            [[_celula(produto.nome, celula), produto.quantidade,
+              formatarData(produto.validade)] for produto in estoque],
+            [290, 100, 100],
+            [f"Total: {len(estoque)} produtos", sum(produto.quantidade for produto in estoque), ""]))
+        historia.append(Spacer(1, 12))
+
+    if "contas" in dados:
+        contas = dados["contas"]
+        historia.append(Paragraph("Contas", estilos["Heading2"]))
+        historia.extend(_tabelas(
+            ["Descrição", "Valor", "Vencimento", "Status"],
+            [[_celula(conta.descricao, celula), f"R${conta.valor:.2f}",
+              formatarData(conta.vencimento), conta.status] for conta in contas],
+            [220, 100, 90, 80],
+            [f"Total: {len(contas)} contas", f"R${somarValores(contas):.2f}", "", ""]))
+        historia.append(Spacer(1, 12))
+
+        totais, fluxo, projecao = linhasFinanceiro(contas, hoje or date.today())
+        historia.append(Paragraph("Resumo Financeiro", estilos["Heading2"]))
+        historia.extend(_tabelas(
+            ["Situação", "Contas", "Valor"],
+            [[nome, quantidade, f"R${valor:.2f}"] for nome, quantidade, valor in totais[:-1]],
+            [220, 100, 170],
+            [totais[-1][0], totais[-1][1], f"R${totais[-1][2]:.2f}"]))
+        historia.append(Spacer(1, 12))
+        historia.extend(_tabelas(
+            ["Mês", "Previsto", "Pago", "Em aberto", "Atrasado"],
+            [[linha[0]] + [f"R${valor:.2f}" for valor in linha[1:]] for linha in fluxo],
+            [90, 100, 100, 100, 100],
+            ["Total"] + [f"R${sum((linha[coluna] for linha in fluxo), Decimal('0.00')):.2f}"
+                         for coluna in range(1, 5)]))
+        historia.append(Spacer(1, 12))
+        historia.extend(_tabelas(
+            ["Vencimentos", "Contas", "A pagar", "Acumulado"],
+            [[mes, quantidade, f"R${valor:.2f}", f"R${acumulado:.2f}"]
+             for mes, quantidade, valor, acumulado in projecao],
+            [120, 100, 130, 140],
+            ["Total", sum(linha[1] for linha in projecao), f"R${projecao[-1][3]:.2f}", ""]))
+
+    SimpleDocTemplate(caminho, pagesize=letter, title="Relatório",
+                      leftMargin=50, rightMargin=50, topMargin=50, bottomMargin=50).build(historia)
+    return caminho
+
+
+def iniciarExecutor(processos: int = None):
+    """
+    Cria o pool de processos usado na geração dos PDFs, caso ainda não exista.
+    """
+    global _executor
+    if _executor is None:
+        processos = processos or int(os.environ.get("BARBEARIA_PROCESSOS_PDF", "2"))
+        _executor = ProcessPoolExecutor(max_workers=processos)
+    return _executor
+
+
+def encerrarExecutor():
+    """
+    Encerra o pool de processos da geração de PDFs.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def gerarPDFEmProcesso(dados: dict, hoje: date = None):
+    """
+    Gera o PDF em um processo do pool, em um arquivo temporário exclusivo da requisição, e
+    retorna o arquivo aberto e posicionado no início. O arquivo é removido do disco logo após
+    ser aberto, então desaparece assim que for fechado.
+    """
+    descritor, caminho = tempfile.mkstemp(suffix=".pdf")
+    os.close(descritor)
+    try:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(iniciarExecutor(), gerarPDF, dados, caminho, hoje)
+        arquivo = open(caminho, "rb")
+    finally:
+        os.remove(caminho)
+    return arquivo
+
+
+def gerarEtag(chave: tuple, versao: tuple):
+    """
+    Gera o ETag de um relatório a partir dos filtros e da versão dos dados, sem precisar do conteúdo.
+    """
+    return '"' + hashlib.sha1(repr((chave, versao)).encode()).hexdigest() + '"'
+
+
+def lerSeCouber(arquivo, limite: int):
+    """
+    Lê o arquivo inteiro para a memória se ele tiver até limite bytes e o fecha. Caso contrário,
+    retorna None e deixa o arquivo aberto e posicionado no início para ser enviado em partes.
+    """
+    arquivo.seek(0, os.SEEK_END)
+    tamanho = arquivo.tell()
+    arquivo.seek(0)
+    if tamanho > limite:
+        return None
+    try:
+        return arquivo.read()
+    finally:
+        arquivo.close()
+
+
+def lerEmPedacos(arquivo):
+    """
+    Lê o arquivo em pedaços para uma StreamingResponse e o fecha ao final.
+    """
+    try:
+        while pedaco := arquivo.read(TAMANHO_PEDACO):
+            yield pedaco
+    finally:
+        arquivo.close()
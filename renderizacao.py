@@ -0,0 +1,155 @@
+import os
+from dataclasses import dataclass
+
+from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, nodes
+from jinja2.ext import Extension
+
+from cache import CacheVersionado
+
+# Tamanho mínimo, em caracteres, de cada pedaço enviado na renderização em partes.
+TAMANHO_PARTE = 16 * 1024
+
+
+@dataclass
+class ConfiguracaoTemplates:
+    """
+    Configuração da renderização dos templates.
+
+    pastaBytecode é a pasta do cache de bytecode compartilhado entre os workers ("" usa a pasta
+    temporária padrão do Jinja2 e None desliga o cache). recarregar faz o Jinja2 conferir a cada
+    uso se o arquivo do template mudou, o que só é útil em desenvolvimento. limiteFragmentos limita,
+    em bytes, o cache dos fragmentos (0 desliga), e emPartes envia as listagens grandes em partes,
+    conforme são renderizadas.
+    """
+    pasta: str = "templates"
+    pastaBytecode: str = ""
+    recarregar: bool = False
+    limiteFragmentos: int = 8 * 1024 * 1024
+    emPartes: bool = False
+
+    @classmethod
+    def deAmbiente(cls):
+        """
+        Lê a configuração de BARBEARIA_TEMPLATES_BYTECODE (pasta, ou "0" para desligar),
+        BARBEARIA_TEMPLATES_RECARREGAR, BARBEARIA_CACHE_FRAGMENTOS_MB e BARBEARIA_TEMPLATES_EM_PARTES.
+        """
+        pastaBytecode = os.environ.get("BARBEARIA_TEMPLATES_BYTECODE", "")
+        return cls(pastaBytecode=None if pastaBytecode == "0" else pastaBytecode,
+                   recarregar=os.environ.get("BARBEARIA_TEMPLATES_RECARREGAR", "0") == "1",
+                   limiteFragmentos=int(os.environ.get("BARBEARIA_CACHE_FRAGMENTOS_MB", "8")) * 1024 * 1024,
+                   emPartes=os.environ.get("BARBEARIA_TEMPLATES_EM_PARTES", "0") == "1")
+
+
+class ExtensaoFragmentos(Extension):
+    """
+    Tag {% fragmento chave, versao %}...{% endfragmento %}, que guarda o HTML renderizado do bloco
+    no cache de fragmentos do ambiente.
+
+    O bloco só é renderizado de novo quando a versão informada muda (como o contador de alterações
+    da tabela exibida) ou quando a entrada sai do cache. A chave deve identificar tudo de que o
+    bloco depende além dos dados versionados, como a URL da listagem e o usuário. Sem cache, ou com
+    versão None, o bloco é sempre renderizado.
+    """
+
+    tags = {"fragmento"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(cacheFragmentos=None)
+
+    def parse(self, parser):
+        linha = next(parser.stream).lineno
+        argumentos = [parser.parse_expression()]
+        parser.stream.expect("comma")
+        argumentos.append(parser.parse_expression())
+        corpo = parser.parse_statements(("name:endfragmento",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_renderizar", argumentos), [], [], corpo).set_lineno(linha)
+
+    def _renderizar(self, chave, versao, caller):
+        cache = self.environment.cacheFragmentos
+        if cache is None or versao is None:
+            return caller()
+        html = cache.obter(chave, versao)
+        if html is None:
+            html = caller()
+            cache.guardar(chave, versao, html)
+        return html
+
+
+class TemplateCronometrado(Template):
+    """
+    Template que observa a duração de cada renderização completa no histograma de métricas do
+    ambiente, com o nome do template como rótulo. A renderização em partes (generate) não é medida.
+    """
+
+    def render(self, *args, **kwargs):
+        with self.environment.metricasTemplates.cronometrar(self.name):
+            return super().render(*args, **kwargs)
+
+
+def criarTemplates(config: ConfiguracaoTemplates, metricas=None, **globais):
+    """
+    Cria o Jinja2Templates da aplicação com o cache de bytecode, o auto-reload e o cache de
+    fragmentos da configuração. Os globais, como funções auxiliares, ficam disponíveis em todos os
+    templates. Com metricas (um Histograma), a duração de cada renderização é registrada nele.
+
+    Com o cache de bytecode, cada template é compilado uma única vez, por qualquer worker, e os
+    demais processos apenas carregam o código já compilado da pasta; o Jinja2 confere o checksum do
+    arquivo, então um template alterado é recompilado no próximo início.
+    """
+    cacheBytecode = None
+    if config.pastaBytecode is not None:
+        if config.pastaBytecode:
+            os.makedirs(config.pastaBytecode, exist_ok=True)
+        cacheBytecode = FileSystemBytecodeCache(config.pastaBytecode or None)
+    ambiente = Environment(loader=FileSystemLoader(config.pasta), autoescape=True, auto_reload=config.recarregar,
+                           bytecode_cache=cacheBytecode, extensions=[ExtensaoFragmentos])
+    ambiente.globals.update(globais)
+    if metricas is not None:
+        ambiente.template_class = TemplateCronometrado
+        ambiente.extend(metricasTemplates=metricas)
+    templates = Jinja2Templates(env=ambiente)
+    if config.limiteFragmentos:
+        templates.env.cacheFragmentos = CacheVersionado(config.limiteFragmentos)
+    return templates
+
+
+def precompilar(templates: Jinja2Templates):
+    """
+    Carrega todos os templates, compilando-os ou lendo o bytecode do cache, para que a primeira
+    requisição de cada página não pague a compilação. Retorna a quantidade de templates.
+    """
+    nomes = templates.env.list_templates(extensions=["html"])
+    for nome in nomes:
+        templates.env.get_template(nome)
+    return len(nomes)
+
+
+async def _agruparPartes(partes, tamanho: int):
+    pedacos, acumulado = [], 0
+    for parte in partes:
+        pedacos.append(parte)
+        acumulado += len(parte)
+        if acumulado >= tamanho:
+            yield "".join(pedacos)
+            pedacos, acumulado = [], 0
+    if pedacos:
+        yield "".join(pedacos)
+
+
+def responderTemplate(templates: Jinja2Templates, nome: str, contexto: dict, emPartes: bool = False,
+                      status_code: int = 200):
+    """
+    Renderiza o template como TemplateResponse ou, com emPartes, como StreamingResponse montada com
+    template.generate(), que envia o início da página antes de renderizar o restante.
+
+    Os pedaços gerados pelo Jinja2 são agrupados em partes de pelo menos TAMANHO_PARTE caracteres,
+    para não enviar um pedaço minúsculo por expressão do template.
+    """
+    if not emPartes:
+        return templates.TemplateResponse(nome, contexto, status_code=status_code)
+    template = templates.get_template(nome)
+    return StreamingResponse(_agruparPartes(template.generate(contexto), TAMANHO_PARTE),
+                             status_code=status_code, media_type=HTMLResponse.media_type)
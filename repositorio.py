@@ -0,0 +1,1404 @@
+import itertools
+import os
+import queue
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from functools import partial
+from time import time as instanteAtual
+
+import anyio
+
+from agenda import (DURACAO_PADRAO, ConfiguracaoAgenda, IndiceAgendamentos, Intervalos, descontarOcupados, dias,
+                    horariosLivres, minutos)
+from cache import CacheVersionado
+from financeiro import TotaisContas, Total, centavosParaValor, valorParaCentavos
+from modelos import Agendamento, Conta, Movimento, Produto, formatarHora, lerData, lerHora
+from movimentos import LIMITE_MOVIMENTOS, LivroMovimentos, calcularSaldos, movimentoDeAjuste
+from paginacao import CAMPO_PERIODO, FIM_PREFIXO, Consulta, IndiceOrdenado, montarPagina, normalizarNome, valorBanco
+
+LIMITE_ESTOQUE_CRITICO = 5
+LIMITE_CACHE_DISPONIBILIDADE = 16 * 1024 * 1024
+# Estimativa, em bytes, do que cada horário livre ocupa no cache de disponibilidade.
+TAMANHO_HORARIO_LIVRE = 200
+
+
+class Repositorio:
+    """
+    Interface da camada de armazenamento usada pelos endpoints.
+
+    Todos os métodos são assíncronos para que backends com I/O (como o SQLite) possam executar
+    as consultas fora do event loop. Agendamentos, produtos e contas são trocados como os registros
+    tipados de modelos.py; usuários, como dicionários. Os parâmetros inicio e fim das listagens,
+    datas inclusivas, filtram pela data do agendamento, validade do produto ou vencimento da conta.
+    Ao serem adicionados, os registros recebem um id crescente e estável, que desempata as ordenações
+    paginadas e identifica o registro para buscá-lo, alterá-lo ou excluí-lo. As operações por id
+    retornam False (ou None) quando o registro não existe.
+
+    O atributo identificador distingue uma instância dos dados de outra (por exemplo, a memória
+    de antes e depois de uma reinicialização), para que versões iguais não sejam confundidas.
+    O atributo agenda guarda a ConfiguracaoAgenda (barbeiros, funcionamento e durações) usada
+    para verificar conflitos e calcular os horários livres.
+
+    Os horários livres de cada (dia, duração, barbeiros) ficam no cacheDisponibilidade, guardados
+    com a versão do dia: agendar ou cancelar muda a versão apenas da data afetada, e só os dias
+    alterados são recalculados. Os backends informam as versões e as reservas ativas do período
+    (_estadoPeriodo) e calculam os dias que faltam no cache (_calcularLivres).
+
+    A quantidade de cada produto é o saldo corrente do livro de movimentações: vendas, entradas,
+    saídas e ajustes são acrescentados ao livro e atualizam o saldo na mesma operação, e cadastrar
+    ou alterar diretamente a quantidade de um produto registra a entrada ou o ajuste equivalente.
+    """
+
+    identificador = None
+    agenda = None
+    cacheDisponibilidade = None
+
+    def _prepararAgendamento(self, agendamento: Agendamento):
+        if agendamento.duracao is None:
+            agendamento.duracao = self.agenda.duracao(agendamento.servico)
+
+    async def adicionarUsuario(self, usuario: dict):
+        """
+        Cadastra o usuário e retorna True, ou retorna False, sem alterar nada, se o nome de
+        usuário já existir.
+        """
+        raise NotImplementedError
+
+    async def obterUsuario(self, usuario: str):
+        raise NotImplementedError
+
+    async def alterarSenha(self, usuario: str, senha: str):
+        """
+        Substitui o hash da senha do usuário, como na conversão para novos parâmetros de hash.
+        """
+        raise NotImplementedError
+
+    async def adicionarAgendamento(self, agendamento: Agendamento):
+        raise NotImplementedError
+
+    async def listarAgendamentos(self, inicio: date = None, fim: date = None):
+        raise NotImplementedError
+
+    async def listarAgendamentosData(self, data: date):
+        raise NotImplementedError
+
+    async def listarAgendamentosCliente(self, cliente: str):
+        raise NotImplementedError
+
+    async def obterAgendamento(self, identificador: int):
+        raise NotImplementedError
+
+    async def _estadoPeriodo(self, inicio: date, fim: date, barbeiros: tuple, usuario: str):
+        """
+        Retorna (versoes, reservas): a versão de cada data do período com agendamentos (as demais
+        valem 0) e os Intervalos reservados por outros usuários, por (barbeiro, data).
+        """
+        raise NotImplementedError
+
+    async def _calcularLivres(self, periodo: list, duracao: int, barbeiros: tuple):
+        """
+        Calcula os horários livres dos dias informados considerando apenas os agendamentos.
+        """
+        raise NotImplementedError
+
+    async def horariosLivres(self, inicio: date, fim: date, duracao: int, usuario: str = None,
+                             barbeiro: str = None):
+        """
+        Retorna os horários em que um serviço de duracao minutos pode começar em cada dia do
+        período, sem se sobrepor a agendamentos nem a reservas de outros usuários, no formato
+        {dia: {hora: (barbeiros livres)}}.
+
+        Os dias sem alteração desde a última consulta vêm do cache; os demais são calculados juntos,
+        em uma única passada. As versões são lidas antes do cálculo, então um agendamento feito no
+        meio da consulta nunca deixa um resultado antigo guardado com a versão nova. As reservas,
+        que dependem do usuário e expiram sozinhas, não entram no cache: são descontadas depois.
+        Os valores retornados são compartilhados com o cache e não devem ser alterados.
+        """
+        barbeiros = self.agenda.candidatos(barbeiro)
+        periodo = dias(inicio, fim)
+        versoes, reservas = await self._estadoPeriodo(inicio, fim, barbeiros, usuario)
+        resultado, faltando = {}, []
+        for dia in periodo:
+            resultado[dia] = self.cacheDisponibilidade.obter((dia, duracao, barbeiros), versoes.get(dia, 0))
+            if resultado[dia] is None:
+                faltando.append(dia)
+        if faltando:
+            for dia, livres in (await self._calcularLivres(faltando, duracao, barbeiros)).items():
+                self.cacheDisponibilidade.guardar((dia, duracao, barbeiros), versoes.get(dia, 0), livres,
+                                                  TAMANHO_HORARIO_LIVRE * (len(livres) + 1))
+                resultado[dia] = livres
+        for (candidato, dia), ocupados in reservas.items():
+            resultado[dia] = descontarOcupados(resultado[dia], candidato, ocupados, duracao)
+        return resultado
+
+    async def reservarHorario(self, agendamento: Agendamento, usuario: str, segundos: float):
+        """
+        Reserva o intervalo do agendamento para o usuário por alguns segundos, se ele estiver livre
+        e não estiver reservado por outro usuário, substituindo a reserva anterior do mesmo usuário.
+        Sem barbeiro escolhido, reserva o primeiro livre e o grava no agendamento.
+        Retorna True se a reserva foi feita. A verificação e a reserva são uma operação atômica.
+        """
+        raise NotImplementedError
+
+    async def agendarSeLivre(self, agendamento: Agendamento, usuario: str = None):
+        """
+        Adiciona o agendamento apenas se o intervalo estiver livre e não estiver reservado por outro
+        usuário, consumindo a reserva do próprio usuário. Sem barbeiro escolhido, usa o primeiro
+        livre. Retorna True se o agendamento foi feito. A verificação e a inserção são uma operação
+        atômica (compare-and-set no intervalo), então duas requisições simultâneas que se sobrepõem
+        no mesmo barbeiro nunca são aceitas ao mesmo tempo.
+        """
+        raise NotImplementedError
+
+    async def alterarAgendamento(self, agendamento: Agendamento, usuario: str = None):
+        """
+        Substitui o agendamento de mesmo id apenas se o novo intervalo estiver livre (sem contar o
+        próprio agendamento) e não estiver reservado por outro usuário. Sem barbeiro escolhido, usa
+        o primeiro livre. Retorna True se o agendamento foi alterado; a verificação e a gravação são
+        atômicas, como em agendarSeLivre.
+        """
+        raise NotImplementedError
+
+    async def removerAgendamento(self, identificador: int):
+        raise NotImplementedError
+
+    async def adicionarProduto(self, produto: Produto):
+        raise NotImplementedError
+
+    async def obterProduto(self, identificador: int):
+        raise NotImplementedError
+
+    async def alterarProduto(self, produto: Produto):
+        raise NotImplementedError
+
+    async def listarEstoque(self, inicio: date = None, fim: date = None):
+        raise NotImplementedError
+
+    async def listarEstoqueCritico(self, limite: int = LIMITE_ESTOQUE_CRITICO, maximo: int = None):
+        """
+        Retorna os produtos com quantidade menor que limite, da menor para a maior, pelo índice de
+        quantidade, sem percorrer o estoque inteiro; com maximo, apenas os maximo primeiros.
+        """
+        raise NotImplementedError
+
+    async def removerProduto(self, identificador: int):
+        raise NotImplementedError
+
+    async def registrarMovimentos(self, movimentos: list):
+        """
+        Registra um lote de movimentações (Movimento) em uma única operação atômica, na ordem da
+        lista, e atualiza o saldo de cada produto. Cada movimentação recebe id, momento e o saldo
+        do produto logo depois dela. Retorna {produto: saldo final}.
+        Lança ValueError se algum produto não existir ou alguma movimentação for inválida, e
+        EstoqueInsuficiente se algum saldo ficar negativo; nesses casos nada é registrado.
+        """
+        raise NotImplementedError
+
+    async def listarMovimentos(self, produto: int = None, antes: int = None, limite: int = LIMITE_MOVIMENTOS):
+        """
+        Retorna até limite movimentações, das mais recentes para as mais antigas, opcionalmente de
+        um produto; antes (um id) continua a listagem a partir da página anterior.
+        """
+        raise NotImplementedError
+
+    async def adicionarConta(self, conta: Conta):
+        raise NotImplementedError
+
+    async def obterConta(self, identificador: int):
+        raise NotImplementedError
+
+    async def alterarConta(self, conta: Conta):
+        raise NotImplementedError
+
+    async def listarContas(self, inicio: date = None, fim: date = None):
+        raise NotImplementedError
+
+    async def listarContasStatus(self, status: list):
+        raise NotImplementedError
+
+    async def removerConta(self, identificador: int):
+        raise NotImplementedError
+
+    async def alterarStatusConta(self, identificador: int, status: str, anterior: str = None):
+        """
+        Altera o status da conta. Com anterior, altera apenas se o status atual for anterior
+        (compare-and-set), para que uma conta paga nesse meio-tempo não seja marcada como atrasada.
+        """
+        raise NotImplementedError
+
+    async def totaisContas(self):
+        """
+        Retorna {(mês YYYY-MM, status): Total} com a soma exata dos valores e a quantidade das
+        contas de cada mês de vencimento e status. Os totais são atualizados junto com cada escrita
+        de contas, então a consulta não percorre as contas.
+        """
+        raise NotImplementedError
+
+    async def importarLote(self, tabela: str, registros: list):
+        """
+        Adiciona um lote de registros de uma tabela ("agendamentos", "estoque" ou "contas") em uma
+        única operação, na ordem da lista, e retorna uma lista de booleanos: False para os
+        agendamentos recusados por conflitarem com os já gravados (inclusive os anteriores do
+        próprio lote), como em agendarSeLivre. Produtos e contas são sempre aceitos; cada produto
+        registra a entrada da sua quantidade no livro de movimentações.
+        """
+        raise NotImplementedError
+
+    async def renovarTrava(self, nome: str, dono: str, segundos: float):
+        """
+        Adquire ou renova por alguns segundos a trava nome para dono, se ela estiver livre, expirada
+        ou já for dele. Retorna True se dono ficou com a trava. Usada para que apenas um dos
+        workers execute as tarefas periódicas.
+        """
+        raise NotImplementedError
+
+    async def listarPagina(self, consulta: Consulta):
+        """
+        Retorna uma Pagina da tabela da consulta, ordenada e filtrada, a partir do cursor informado.
+        O custo depende do tamanho da página, e não do tamanho da tabela, sempre que os filtros
+        coincidirem com a ordenação pedida.
+        """
+        raise NotImplementedError
+
+    async def versoesDados(self):
+        """
+        Retorna um contador de alterações por tabela ("agendamentos", "estoque" e "contas").
+        Cada escrita incrementa o contador da tabela alterada.
+        """
+        raise NotImplementedError
+
+    async def fechar(self):
+        pass
+
+
+def filtrarPeriodo(registros, campo: str, inicio: date = None, fim: date = None):
+    """
+    Filtra registros cujo atributo de data esteja entre inicio e fim, inclusive.
+    """
+    if inicio is None and fim is None:
+        return list(registros)
+    return [registro for registro in registros
+            if getattr(registro, campo) is not None
+            and (inicio is None or getattr(registro, campo) >= inicio)
+            and (fim is None or getattr(registro, campo) <= fim)]
+
+
+class RepositorioMemoria(Repositorio):
+    """
+    Backend em memória, equivalente às listas globais usadas originalmente.
+
+    É o mais rápido, mas os dados se perdem ao reiniciar e não são compartilhados entre workers.
+    Os registros ficam em dicionários por id (um índice hash), então buscar, alterar e excluir um
+    registro não dependem do tamanho da tabela. Além deles, mantém as visões usadas pela página
+    inicial atualizadas a cada escrita: os agendamentos agrupados por data, as contas por status
+    e os totais das contas por mês e status (os produtos com estoque crítico saem do índice por
+    quantidade). Assim a página inicial custa proporcionalmente ao que exibe, e não ao histórico
+    inteiro.
+
+    As movimentações de estoque ficam em um LivroMovimentos, em colunas, e cada lote só reposiciona
+    no índice por quantidade os produtos cujo saldo mudou.
+
+    As listagens paginadas usam índices ordenados (IndiceOrdenado) por cada ordenação disponível,
+    inclusive a por id, também atualizados a cada escrita.
+
+    As operações atômicas de agendamento não cedem o event loop entre a verificação e a escrita,
+    então são naturalmente exclusivas dentro do processo. As reservas ficam por usuário e agrupadas
+    por (barbeiro, data), para que a verificação olhe apenas as do mesmo dia.
+    """
+
+    def __init__(self, agenda: ConfiguracaoAgenda = None, limiteCache: int = LIMITE_CACHE_DISPONIBILIDADE):
+        self.identificador = uuid.uuid4().hex
+        self.agenda = agenda or ConfiguracaoAgenda()
+        self.cacheDisponibilidade = CacheVersionado(limiteCache)
+        self.agendamentos = IndiceAgendamentos(agenda=self.agenda)
+        self.estoque = {}
+        self.contas = {}
+        self.usuarios = {}
+        self.versoes = {"agendamentos": 0, "estoque": 0, "contas": 0}
+        self.contasPorStatus = {}
+        self.totais = TotaisContas()
+        self.movimentos = LivroMovimentos()
+        self.indiceQuantidade = IndiceOrdenado(("quantidade",))
+        self.indices = {
+            "agendamentos": [IndiceOrdenado(()), IndiceOrdenado(("data", "hora")), IndiceOrdenado(("cliente",)),
+                             IndiceOrdenado(("cliente", "data", "hora"))],
+            "estoque": [IndiceOrdenado(()), IndiceOrdenado(("nome",)), self.indiceQuantidade,
+                        IndiceOrdenado(("validade",))],
+            "contas": [IndiceOrdenado(()), IndiceOrdenado(("vencimento",)), IndiceOrdenado(("status", "vencimento"))]
+        }
+        self._ids = {tabela: itertools.count(1) for tabela in self.versoes}
+        self.reservas = {}
+        self.reservasDia = {}
+
+    def _registrarAlteracao(self, tabela: str, alterado: bool = True):
+        if alterado:
+            self.versoes[tabela] += 1
+        return alterado
+
+    def _indexar(self, tabela: str, registro):
+        for indice in self.indices[tabela]:
+            indice.adicionar(registro)
+
+    def _desindexar(self, tabela: str, registro):
+        for indice in self.indices[tabela]:
+            indice.remover(registro)
+
+    async def adicionarUsuario(self, usuario: dict):
+        if usuario["usuario"] in self.usuarios:
+            return False
+        self.usuarios[usuario["usuario"]] = usuario
+        return True
+
+    async def obterUsuario(self, usuario: str):
+        return self.usuarios.get(usuario)
+
+    async def alterarSenha(self, usuario: str, senha: str):
+        self.usuarios[usuario]["senha"] = senha
+
+    async def adicionarAgendamento(self, agendamento: Agendamento):
+        self._prepararAgendamento(agendamento)
+        agendamento.id = next(self._ids["agendamentos"])
+        self.agendamentos.adicionar(agendamento)
+        self._indexar("agendamentos", agendamento)
+        self._registrarAlteracao("agendamentos")
+
+    async def listarAgendamentos(self, inicio: date = None, fim: date = None):
+        return filtrarPeriodo(self.agendamentos, "data", inicio, fim)
+
+    async def listarAgendamentosData(self, data: date):
+        return self.agendamentos.doDia(data)
+
+    async def listarAgendamentosCliente(self, cliente: str):
+        return [ag for ag in self.agendamentos if ag.cliente == cliente]
+
+    async def obterAgendamento(self, identificador: int):
+        return self.agendamentos.obter(identificador)
+
+    def _soltarReserva(self, usuario: str):
+        barbeiro, data, _, _, _ = self.reservas.pop(usuario)
+        doDia = self.reservasDia[(barbeiro, data)]
+        del doDia[usuario]
+        if not doDia:
+            del self.reservasDia[(barbeiro, data)]
+
+    def _reservasDeOutros(self, barbeiro: str, data: date, usuario: str, agora: float):
+        doDia = self.reservasDia.get((barbeiro, data))
+        if not doDia:
+            return []
+        for dono in [dono for dono, (_, _, expira) in doDia.items() if expira <= agora]:
+            self._soltarReserva(dono)
+        return [(inicio, fim) for dono, (inicio, fim, _) in doDia.items() if dono != usuario]
+
+    def _intervalos(self, barbeiro: str, data: date, usuario: str, agora: float):
+        ocupados = self.agendamentos.intervalos(barbeiro, data)
+        reservas = self._reservasDeOutros(barbeiro, data, usuario, agora)
+        if reservas:
+            ocupados = ocupados.copia() if ocupados else Intervalos()
+            for inicio, fim in reservas:
+                ocupados.adicionar(inicio, fim)
+        return ocupados
+
+    async def _estadoPeriodo(self, inicio: date, fim: date, barbeiros: tuple, usuario: str):
+        agora = instanteAtual()
+        reservas = {}
+        for barbeiro, data in list(self.reservasDia):
+            if barbeiro in barbeiros and inicio <= data <= fim:
+                for inicioReserva, fimReserva in self._reservasDeOutros(barbeiro, data, usuario, agora):
+                    reservas.setdefault((barbeiro, data), Intervalos()).adicionar(inicioReserva, fimReserva)
+        return self.agendamentos.versoesDias, reservas
+
+    async def _calcularLivres(self, periodo: list, duracao: int, barbeiros: tuple):
+        return horariosLivres(self.agenda, periodo, duracao, self.agendamentos.intervalos, barbeiros)
+
+    def _barbeiroLivre(self, agendamento: Agendamento, usuario: str):
+        inicio, fim = self.agenda.intervaloDe(agendamento)
+        if not self.agenda.cabe(inicio, agendamento.duracao):
+            return None
+        agora = instanteAtual()
+        for barbeiro in self.agenda.candidatos(agendamento.barbeiro):
+            ocupados = self._intervalos(barbeiro, agendamento.data, usuario, agora)
+            if not ocupados or not ocupados.conflita(inicio, fim):
+                return barbeiro
+        return None
+
+    async def reservarHorario(self, agendamento: Agendamento, usuario: str, segundos: float):
+        self._prepararAgendamento(agendamento)
+        barbeiro = self._barbeiroLivre(agendamento, usuario)
+        if barbeiro is None:
+            return False
+        if usuario in self.reservas:
+            self._soltarReserva(usuario)
+        agendamento.barbeiro = barbeiro
+        inicio, fim = self.agenda.intervaloDe(agendamento)
+        expira = instanteAtual() + segundos
+        self.reservas[usuario] = (barbeiro, agendamento.data, inicio, fim, expira)
+        self.reservasDia.setdefault((barbeiro, agendamento.data), {})[usuario] = (inicio, fim, expira)
+        return True
+
+    async def agendarSeLivre(self, agendamento: Agendamento, usuario: str = None):
+        self._prepararAgendamento(agendamento)
+        barbeiro = self._barbeiroLivre(agendamento, usuario)
+        if barbeiro is None:
+            return False
+        if usuario in self.reservas:
+            self._soltarReserva(usuario)
+        agendamento.barbeiro = barbeiro
+        await self.adicionarAgendamento(agendamento)
+        return True
+
+    async def alterarAgendamento(self, agendamento: Agendamento, usuario: str = None):
+        antigo = self.agendamentos.obter(agendamento.id)
+        if antigo is None:
+            return False
+        self._prepararAgendamento(agendamento)
+        self.agendamentos.liberar(antigo)
+        barbeiro = self._barbeiroLivre(agendamento, usuario)
+        self.agendamentos.ocupar(antigo)
+        if barbeiro is None:
+            return False
+        agendamento.barbeiro = barbeiro
+        self._desindexar("agendamentos", antigo)
+        self.agendamentos.substituir(agendamento)
+        self._indexar("agendamentos", agendamento)
+        return self._registrarAlteracao("agendamentos")
+
+    async def removerAgendamento(self, identificador: int):
+        agendamento = self.agendamentos.remover(identificador)
+        if agendamento is None:
+            return False
+        self._desindexar("agendamentos", agendamento)
+        return self._registrarAlteracao("agendamentos")
+
+    def _registrarAjuste(self, produto: int, anterior: int, saldo: int):
+        movimento = movimentoDeAjuste(produto, anterior, saldo, datetime.now().replace(microsecond=0))
+        if movimento is not None:
+            self.movimentos.registrar(movimento)
+
+    async def adicionarProduto(self, produto: Produto):
+        produto.id = next(self._ids["estoque"])
+        self.estoque[produto.id] = produto
+        self._indexar("estoque", produto)
+        self._registrarAjuste(produto.id, None, produto.quantidade)
+        self._registrarAlteracao("estoque")
+
+    async def obterProduto(self, identificador: int):
+        return self.estoque.get(identificador)
+
+    async def alterarProduto(self, produto: Produto):
+        antigo = self.estoque.get(produto.id)
+        if antigo is None:
+            return False
+        self._desindexar("estoque", antigo)
+        self.estoque[produto.id] = produto
+        self._indexar("estoque", produto)
+        self._registrarAjuste(produto.id, antigo.quantidade, produto.quantidade)
+        return self._registrarAlteracao("estoque")
+
+    async def listarEstoque(self, inicio: date = None, fim: date = None):
+        return filtrarPeriodo(self.estoque.values(), "validade", inicio, fim)
+
+    async def listarEstoqueCritico(self, limite: int = LIMITE_ESTOQUE_CRITICO, maximo: int = None):
+        return list(itertools.islice(self.indiceQuantidade.faixa((), (limite,)), maximo))
+
+    async def removerProduto(self, identificador: int):
+        produto = self.estoque.pop(identificador, None)
+        if produto is None:
+            return False
+        self._desindexar("estoque", produto)
+        return self._registrarAlteracao("estoque")
+
+    def _saldo(self, produto: int):
+        registro = self.estoque.get(produto)
+        return registro.quantidade if registro is not None else None
+
+    async def registrarMovimentos(self, movimentos: list):
+        saldos = calcularSaldos(movimentos, self._saldo)
+        momento = datetime.now().replace(microsecond=0)
+        for movimento in movimentos:
+            movimento.momento = momento
+            self.movimentos.registrar(movimento)
+        for identificador, saldo in saldos.items():
+            produto = self.estoque[identificador]
+            self.indiceQuantidade.remover(produto)
+            produto.quantidade = saldo
+            self.indiceQuantidade.adicionar(produto)
+        self._registrarAlteracao("estoque", bool(movimentos))
+        return saldos
+
+    async def listarMovimentos(self, produto: int = None, antes: int = None, limite: int = LIMITE_MOVIMENTOS):
+        return self.movimentos.recentes(produto, antes, limite)
+
+    def _indexarStatus(self, conta: Conta):
+        self.contasPorStatus.setdefault(conta.status, {})[id(conta)] = conta
+        self.totais.somar(conta)
+
+    def _desindexarStatus(self, conta: Conta):
+        doStatus = self.contasPorStatus[conta.status]
+        del doStatus[id(conta)]
+        if not doStatus:
+            del self.contasPorStatus[conta.status]
+        self.totais.somar(conta, -1)
+
+    async def adicionarConta(self, conta: Conta):
+        conta.id = next(self._ids["contas"])
+        self.contas[conta.id] = conta
+        self._indexar("contas", conta)
+        self._indexarStatus(conta)
+        self._registrarAlteracao("contas")
+
+    async def obterConta(self, identificador: int):
+        return self.contas.get(identificador)
+
+    async def alterarConta(self, conta: Conta):
+        antigo = self.contas.get(conta.id)
+        if antigo is None:
+            return False
+        self._desindexarStatus(antigo)
+        self._desindexar("contas", antigo)
+        self.contas[conta.id] = conta
+        self._indexar("contas", conta)
+        self._indexarStatus(conta)
+        return self._registrarAlteracao("contas")
+
+    async def listarContas(self, inicio: date = None, fim: date = None):
+        return filtrarPeriodo(self.contas.values(), "vencimento", inicio, fim)
+
+    async def listarContasStatus(self, status: list):
+        contas = [conta for item in status for conta in self.contasPorStatus.get(item, {}).values()]
+        return sorted(contas, key=lambda conta: conta.vencimento)
+
+    async def removerConta(self, identificador: int):
+        conta = self.contas.pop(identificador, None)
+        if conta is None:
+            return False
+        self._desindexarStatus(conta)
+        self._desindexar("contas", conta)
+        return self._registrarAlteracao("contas")
+
+    async def alterarStatusConta(self, identificador: int, status: str, anterior: str = None):
+        conta = self.contas.get(identificador)
+        if conta is None or (anterior is not None and conta.status != anterior):
+            return False
+        self._desindexarStatus(conta)
+        self._desindexar("contas", conta)
+        conta.status = status
+        self._indexarStatus(conta)
+        self._indexar("contas", conta)
+        return self._registrarAlteracao("contas")
+
+    async def totaisContas(self):
+        return self.totais.consultar()
+
+    async def importarLote(self, tabela: str, registros: list):
+        if tabela != "agendamentos":
+            adicionar = self.adicionarProduto if tabela == "estoque" else self.adicionarConta
+            for registro in registros:
+                await adicionar(registro)
+            return [True] * len(registros)
+        aceitos = []
+        for agendamento in registros:
+            aceitos.append(await self.agendarSeLivre(agendamento))
+        return aceitos
+
+    async def listarPagina(self, consulta: Consulta):
+        melhor, igualdadesMelhor = None, -1
+        for indice in self.indices[consulta.tabela]:
+            igualdades = indice.atende(consulta)
+            if igualdades is not None and igualdades > igualdadesMelhor:
+                melhor, igualdadesMelhor = indice, igualdades
+        return montarPagina(consulta, melhor.percorrer(consulta, igualdadesMelhor))
+
+    async def renovarTrava(self, nome: str, dono: str, segundos: float):
+        return True
+
+    async def versoesDados(self):
+        return dict(self.versoes)
+
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    usuario TEXT PRIMARY KEY,
+    nome TEXT NOT NULL,
+    email TEXT NOT NULL,
+    senha TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agendamentos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cliente TEXT NOT NULL,
+    servico TEXT NOT NULL,
+    data TEXT NOT NULL,
+    hora TEXT NOT NULL,
+    situacao TEXT NOT NULL,
+    barbeiro TEXT,
+    duracao INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_agendamentos_data ON agendamentos (data, hora);
+CREATE INDEX IF NOT EXISTS idx_agendamentos_cliente ON agendamentos (cliente);
+CREATE INDEX IF NOT EXISTS idx_agendamentos_cliente_data ON agendamentos (cliente, data, hora);
+CREATE TABLE IF NOT EXISTS estoque (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nome TEXT NOT NULL,
+    quantidade INTEGER NOT NULL,
+    validade TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_estoque_quantidade ON estoque (quantidade);
+CREATE INDEX IF NOT EXISTS idx_estoque_validade ON estoque (validade);
+CREATE INDEX IF NOT EXISTS idx_estoque_validade_ordem ON estoque (IFNULL(validade, ''));
+CREATE INDEX IF NOT EXISTS idx_estoque_nome ON estoque (nome COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS movimentos (
+    id INTEGER PRIMARY KEY,
+    produto INTEGER NOT NULL,
+    tipo TEXT NOT NULL,
+    quantidade INTEGER NOT NULL,
+    saldo INTEGER NOT NULL,
+    momento TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_movimentos_produto ON movimentos (produto, id);
+CREATE TABLE IF NOT EXISTS contas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    descricao TEXT NOT NULL,
+    valor TEXT NOT NULL,
+    vencimento TEXT NOT NULL,
+    status TEXT NOT NULL,
+    centavos INTEGER NOT NULL
+);
+DROP INDEX IF EXISTS idx_contas_status;
+CREATE INDEX IF NOT EXISTS idx_contas_status_vencimento ON contas (status, vencimento);
+CREATE INDEX IF NOT EXISTS idx_contas_vencimento ON contas (vencimento);
+CREATE TABLE IF NOT EXISTS reservas (
+    usuario TEXT PRIMARY KEY,
+    barbeiro TEXT NOT NULL,
+    data TEXT NOT NULL,
+    inicio INTEGER NOT NULL,
+    fim INTEGER NOT NULL,
+    expira REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_reservas_data ON reservas (data, barbeiro);
+CREATE INDEX IF NOT EXISTS idx_reservas_expira ON reservas (expira);
+CREATE TABLE IF NOT EXISTS versoes (
+    tabela TEXT PRIMARY KEY,
+    versao INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO versoes (tabela, versao) VALUES ('agendamentos', 0), ('estoque', 0), ('contas', 0);
+CREATE TABLE IF NOT EXISTS versoes_dias (
+    data TEXT PRIMARY KEY,
+    versao INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS versoes_dias_inserir AFTER INSERT ON agendamentos BEGIN
+    INSERT INTO versoes_dias (data, versao) VALUES (NEW.data, 1)
+        ON CONFLICT (data) DO UPDATE SET versao = versao + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS versoes_dias_remover AFTER DELETE ON agendamentos BEGIN
+    INSERT INTO versoes_dias (data, versao) VALUES (OLD.data, 1)
+        ON CONFLICT (data) DO UPDATE SET versao = versao + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS versoes_dias_alterar AFTER UPDATE ON agendamentos BEGIN
+    INSERT INTO versoes_dias (data, versao) VALUES (OLD.data, 1), (NEW.data, 1)
+        ON CONFLICT (data) DO UPDATE SET versao = versao + 1;
+END;
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS totais_contas (
+    mes TEXT NOT NULL,
+    status TEXT NOT NULL,
+    centavos INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL,
+    PRIMARY KEY (mes, status)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS totais_contas_inserir AFTER INSERT ON contas BEGIN
+    INSERT INTO totais_contas (mes, status, centavos, quantidade)
+        VALUES (substr(NEW.vencimento, 1, 7), NEW.status, NEW.centavos, 1)
+        ON CONFLICT (mes, status) DO UPDATE SET centavos = centavos + excluded.centavos, quantidade = quantidade + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS totais_contas_remover AFTER DELETE ON contas BEGIN
+    UPDATE totais_contas SET centavos = centavos - OLD.centavos, quantidade = quantidade - 1
+        WHERE mes = substr(OLD.vencimento, 1, 7) AND status = OLD.status;
+    DELETE FROM totais_contas WHERE mes = substr(OLD.vencimento, 1, 7) AND status = OLD.status AND quantidade = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS totais_contas_alterar AFTER UPDATE OF centavos, vencimento, status ON contas BEGIN
+    UPDATE totais_contas SET centavos = centavos - OLD.centavos, quantidade = quantidade - 1
+        WHERE mes = substr(OLD.vencimento, 1, 7) AND status = OLD.status;
+    DELETE FROM totais_contas WHERE mes = substr(OLD.vencimento, 1, 7) AND status = OLD.status AND quantidade = 0;
+    INSERT INTO totais_contas (mes, status, centavos, quantidade)
+        VALUES (substr(NEW.vencimento, 1, 7), NEW.status, NEW.centavos, 1)
+        ON CONFLICT (mes, status) DO UPDATE SET centavos = centavos + excluded.centavos, quantidade = quantidade + 1;
+END;
+"""
+# Recalcula os totais das contas a partir da tabela inteira; usado uma vez nos bancos criados antes deles
+# ou da coluna centavos.
+RECALCULAR_TOTAIS_CONTAS = """
+INSERT INTO totais_contas (mes, status, centavos, quantidade)
+    SELECT substr(vencimento, 1, 7), status, SUM(centavos), COUNT(*)
+    FROM contas GROUP BY substr(vencimento, 1, 7), status
+"""
+# Colunas acrescentadas depois da criação das tabelas, adicionadas aos bancos existentes ao abrir.
+COLUNAS_NOVAS = {"agendamentos": {"barbeiro": "TEXT", "duracao": "INTEGER"}}
+
+COLUNAS_AGENDAMENTO = "cliente, servico, data, hora, situacao, barbeiro, duracao"
+COLUNAS_PRODUTO = "nome, quantidade, validade"
+COLUNAS_CONTA = "descricao, valor, vencimento, status"
+# Na gravação, o valor vai também em centavos inteiros, que os triggers somam em totais_contas.
+COLUNAS_GRAVACAO_CONTA = f"{COLUNAS_CONTA}, centavos"
+COLUNAS_MOVIMENTO = "produto, tipo, quantidade, saldo, momento"
+# Máximo de parâmetros por consulta IN (...), abaixo do limite do SQLite.
+PARAMETROS_POR_CONSULTA = 500
+SELECAO = {
+    "agendamentos": f"id, {COLUNAS_AGENDAMENTO}",
+    "estoque": f"id, {COLUNAS_PRODUTO}",
+    "contas": f"id, {COLUNAS_CONTA}"
+}
+# Expressões de ordenação que correspondem aos índices idx_estoque_nome e idx_estoque_validade_ordem.
+EXPRESSOES_ORDENACAO = {"nome": "nome COLLATE NOCASE", "validade": "IFNULL(validade, '')"}
+
+
+class PoolConexoes:
+    """
+    Pool limitado de conexões SQLite compartilhadas entre as threads de trabalho.
+
+    Cada conexão mantém seu próprio cache de comandos preparados, então as consultas
+    parametrizadas do repositório são compiladas uma única vez por conexão.
+    """
+
+    def __init__(self, caminho: str, tamanho: int):
+        self.tamanho = tamanho
+        self._conexoes = queue.Queue(maxsize=tamanho)
+        for _ in range(tamanho):
+            self._conexoes.put(self._abrir(caminho))
+
+    @staticmethod
+    def _abrir(caminho: str):
+        conexao = sqlite3.connect(caminho, timeout=30, check_same_thread=False, cached_statements=256)
+        conexao.row_factory = sqlite3.Row
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=NORMAL")
+        conexao.execute("PRAGMA foreign_keys=ON")
+        return conexao
+
+    @contextmanager
+    def conexao(self):
+        conexao = self._conexoes.get()
+        try:
+            yield conexao
+        finally:
+            self._conexoes.put(conexao)
+
+    def fechar(self):
+        while not self._conexoes.empty():
+            self._conexoes.get_nowait().close()
+
+
+class RepositorioSQLite(Repositorio):
+    """
+    Backend persistente em SQLite no modo WAL.
+
+    Vários workers do uvicorn podem apontar para o mesmo arquivo: o WAL permite leituras
+    concorrentes com uma escrita. As consultas rodam em threads de trabalho, limitadas ao
+    tamanho do pool, para não bloquear o event loop. Datas e horas são gravadas em ISO
+    (YYYY-MM-DD e HH:MM) e valores como texto decimal, e convertidos de volta nos registros
+    tipados na leitura.
+
+    As operações atômicas de agendamento rodam em transações BEGIN IMMEDIATE, que tomam a trava
+    de escrita do banco antes da verificação; assim o compare-and-set no intervalo vale também
+    entre workers diferentes apontando para o mesmo arquivo. Os intervalos ocupados são lidos do
+    índice por (data, hora) e verificados com os mesmos Intervalos do backend em memória.
+
+    As versões de cada data ficam na tabela versoes_dias, atualizadas por triggers em qualquer
+    escrita de agendamentos; assim o cache de disponibilidade de cada worker também enxerga os
+    agendamentos feitos pelos outros.
+
+    Um lote de movimentações de estoque é uma transação BEGIN IMMEDIATE: lê os saldos dos produtos
+    do lote, grava as movimentações com executemany e atualiza cada saldo uma vez. O histórico de
+    um produto é lido pelo índice (produto, id).
+
+    Os totais das contas por mês de vencimento e status ficam na tabela totais_contas, em centavos
+    inteiros para que as somas sejam exatas, atualizados por triggers em qualquer escrita de contas.
+
+    Um lote importado (importarLote) também é uma única transação BEGIN IMMEDIATE, com uma única
+    alteração registrada: as contas são gravadas com executemany, as entradas dos produtos vão para
+    o livro de uma vez e cada agendamento é verificado contra os já gravados, como em agendarSeLivre.
+
+    As travas com prazo (renovarTrava) ficam na tabela meta, com o dono e o momento em que
+    expiram; a renovação também é BEGIN IMMEDIATE, então só um worker detém cada trava.
+    """
+
+    def __init__(self, caminho: str, tamanhoPool: int = 4, agenda: ConfiguracaoAgenda = None,
+                 limiteCache: int = LIMITE_CACHE_DISPONIBILIDADE):
+        self.agenda = agenda or ConfiguracaoAgenda()
+        self.cacheDisponibilidade = CacheVersionado(limiteCache)
+        self.pool = PoolConexoes(caminho, tamanhoPool)
+        self._limitador = anyio.CapacityLimiter(tamanhoPool)
+        with self.pool.conexao() as conexao:
+            self._migrar(conexao)
+            conexao.executescript(ESQUEMA)
+            with conexao:
+                conexao.execute("INSERT OR IGNORE INTO meta (chave, valor) VALUES ('identificador', ?)",
+                                (uuid.uuid4().hex,))
+                self.identificador = conexao.execute(
+                    "SELECT valor FROM meta WHERE chave = 'identificador'").fetchone()["valor"]
+            with conexao:
+                conexao.execute("BEGIN IMMEDIATE")
+                if conexao.execute("SELECT 1 FROM meta WHERE chave = 'totais_contas_centavos'").fetchone() is None:
+                    conexao.execute("DELETE FROM totais_contas")
+                    conexao.execute(RECALCULAR_TOTAIS_CONTAS)
+                    conexao.execute("INSERT INTO meta (chave, valor) VALUES ('totais_contas_centavos', '1')")
+
+    @staticmethod
+    def _migrar(conexao):
+        """
+        Atualiza bancos criados por versões anteriores: acrescenta as COLUNAS_NOVAS, recria a tabela
+        de reservas, que só guarda dados temporários, se ela ainda estiver no formato por (data, hora),
+        e preenche os centavos das contas a partir do valor em texto, trocando os triggers dos totais
+        que ainda somavam o valor convertido pelo próprio SQLite (em ponto flutuante).
+        """
+        for tabela, colunas in COLUNAS_NOVAS.items():
+            existentes = {linha["name"] for linha in conexao.execute(f"PRAGMA table_info({tabela})")}
+            for coluna, tipo in colunas.items():
+                if existentes and coluna not in existentes:
+                    conexao.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+        reservas = {linha["name"] for linha in conexao.execute("PRAGMA table_info(reservas)")}
+        if reservas and "barbeiro" not in reservas:
+            conexao.execute("DROP TABLE reservas")
+        contas = {linha["name"] for linha in conexao.execute("PRAGMA table_info(contas)")}
+        if contas and "centavos" not in contas:
+            for operacao in ("inserir", "remover", "alterar"):
+                conexao.execute(f"DROP TRIGGER IF EXISTS totais_contas_{operacao}")
+            conexao.execute("ALTER TABLE contas ADD COLUMN centavos INTEGER NOT NULL DEFAULT 0")
+            conexao.executemany("UPDATE contas SET centavos = ? WHERE id = ?",
+                                [(valorParaCentavos(Decimal(linha["valor"])), linha["id"])
+                                 for linha in conexao.execute("SELECT id, valor FROM contas").fetchall()])
+        conexao.commit()
+
+    async def _executar(self, funcao, *args):
+        return await anyio.to_thread.run_sync(partial(self._naConexao, funcao, *args),
+                                              limiter=self._limitador)
+
+    async def _executarExclusivo(self, funcao, *args):
+        return await anyio.to_thread.run_sync(partial(self._naConexao, funcao, *args, imediata=True),
+                                              limiter=self._limitador)
+
+    def _naConexao(self, funcao, *args, imediata: bool = False):
+        with self.pool.conexao() as conexao:
+            with conexao:
+                if imediata:
+                    conexao.execute("BEGIN IMMEDIATE")
+                return funcao(conexao, *args)
+
+    @staticmethod
+    def _consultar(conexao, sql: str, *parametros):
+        return [dict(linha) for linha in conexao.execute(sql, parametros)]
+
+    @staticmethod
+    def _consultarRegistros(conexao, conversor, sql: str, *parametros):
+        return [conversor(linha) for linha in conexao.execute(sql, parametros)]
+
+    @staticmethod
+    def _agendamento(linha):
+        return Agendamento(linha["cliente"], linha["servico"], lerData(linha["data"]),
+                           lerHora(linha["hora"]), linha["situacao"], linha["barbeiro"], linha["duracao"],
+                           linha["id"])
+
+    @staticmethod
+    def _produto(linha):
+        return Produto(linha["nome"], linha["quantidade"],
+                       lerData(linha["validade"]) if linha["validade"] else None, linha["id"])
+
+    @staticmethod
+    def _movimento(linha):
+        return Movimento(linha["produto"], linha["tipo"], linha["quantidade"], linha["saldo"],
+                         datetime.fromisoformat(linha["momento"]), linha["id"])
+
+    @staticmethod
+    def _conta(linha):
+        return Conta(linha["descricao"], Decimal(linha["valor"]), lerData(linha["vencimento"]),
+                     linha["status"], linha["id"])
+
+    @staticmethod
+    def _condicaoPeriodo(campo: str, inicio: date = None, fim: date = None):
+        condicoes, parametros = [], []
+        if inicio is not None:
+            condicoes.append(f"{campo} >= ?")
+            parametros.append(inicio.isoformat())
+        if fim is not None:
+            condicoes.append(f"{campo} <= ?")
+            parametros.append(fim.isoformat())
+        return (" WHERE " + " AND ".join(condicoes) if condicoes else ""), parametros
+
+    @staticmethod
+    def _registrarAlteracao(conexao, tabela: str):
+        conexao.execute("UPDATE versoes SET versao = versao + 1 WHERE tabela = ?", (tabela,))
+
+    @classmethod
+    def _inserir(cls, conexao, tabela: str, sql: str, *parametros):
+        identificador = conexao.execute(sql, parametros).lastrowid
+        cls._registrarAlteracao(conexao, tabela)
+        return identificador
+
+    @classmethod
+    def _alterarPorId(cls, conexao, tabela: str, sql: str, *parametros):
+        """
+        Executa um UPDATE ou DELETE de um registro pela chave primária (o último parâmetro) e
+        registra a alteração se alguma linha foi afetada.
+        """
+        if not conexao.execute(sql, parametros).rowcount:
+            return False
+        cls._registrarAlteracao(conexao, tabela)
+        return True
+
+    @staticmethod
+    def _obterPorId(conexao, conversor, tabela: str, colunas: str, identificador: int):
+        linha = conexao.execute(f"SELECT id, {colunas} FROM {tabela} WHERE id = ?", (identificador,)).fetchone()
+        return conversor(linha) if linha is not None else None
+
+    @staticmethod
+    def _inserirUsuario(conexao, usuario: dict):
+        try:
+            conexao.execute("INSERT INTO usuarios (usuario, nome, email, senha) VALUES (?, ?, ?, ?)",
+                            (usuario["usuario"], usuario["nome"], usuario["email"], usuario["senha"]))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    async def adicionarUsuario(self, usuario: dict):
+        return await self._executar(self._inserirUsuario, usuario)
+
+    async def obterUsuario(self, usuario: str):
+        linhas = await self._executar(
+            self._consultar, "SELECT usuario, nome, email, senha FROM usuarios WHERE usuario = ?", usuario)
+        return linhas[0] if linhas else None
+
+    async def alterarSenha(self, usuario: str, senha: str):
+        await self._executar(
+            lambda con: con.execute("UPDATE usuarios SET senha = ? WHERE usuario = ?", (senha, usuario)))
+
+    @classmethod
+    def _inserirAgendamento(cls, conexao, agendamento: Agendamento):
+        return cls._inserir(
+            conexao, "agendamentos", f"INSERT INTO agendamentos ({COLUNAS_AGENDAMENTO}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            agendamento.cliente, agendamento.servico, agendamento.data.isoformat(),
+            formatarHora(agendamento.hora), agendamento.situacao, agendamento.barbeiro, agendamento.duracao)
+
+    async def adicionarAgendamento(self, agendamento: Agendamento):
+        self._prepararAgendamento(agendamento)
+        agendamento.id = await self._executar(self._inserirAgendamento, agendamento)
+
+    async def listarAgendamentos(self, inicio: date = None, fim: date = None):
+        condicao, parametros = self._condicaoPeriodo("data", inicio, fim)
+        return await self._executar(
+            self._consultarRegistros, self._agendamento,
+            f"SELECT id, {COLUNAS_AGENDAMENTO} FROM agendamentos{condicao} ORDER BY id", *parametros)
+
+    async def listarAgendamentosData(self, data: date):
+        return await self._executar(
+            self._consultarRegistros, self._agendamento,
+            f"SELECT id, {COLUNAS_AGENDAMENTO} FROM agendamentos WHERE data = ? ORDER BY hora", data.isoformat())
+
+    async def listarAgendamentosCliente(self, cliente: str):
+        return await self._executar(
+            self._consultarRegistros, self._agendamento,
+            f"SELECT id, {COLUNAS_AGENDAMENTO} FROM agendamentos WHERE cliente = ? ORDER BY id", cliente)
+
+    def _lerAgendados(self, conexao, datas: list, barbeiros: tuple, ignorar: int = None):
+        """
+        Lê em uma consulta os intervalos ocupados por agendamentos nas datas informadas, agrupados
+        em Intervalos por (barbeiro, data), sem o agendamento de id ignorar.
+        """
+        padrao = self.agenda.barbeiros[0]
+        intervalos = {}
+        marcadores = ", ".join("?" * len(datas))
+        for linha in conexao.execute(f"SELECT data, hora, barbeiro, duracao FROM agendamentos "
+                                     f"WHERE data IN ({marcadores}) AND id IS NOT ? ORDER BY data, hora",
+                                     [data.isoformat() for data in datas] + [ignorar]):
+            barbeiro = linha["barbeiro"] or padrao
+            if barbeiro in barbeiros:
+                inicioAgendamento = minutos(lerHora(linha["hora"]))
+                intervalos.setdefault((barbeiro, lerData(linha["data"])), Intervalos()).adicionar(
+                    inicioAgendamento, inicioAgendamento + (linha["duracao"] or DURACAO_PADRAO))
+        return intervalos
+
+    @staticmethod
+    def _lerReservas(conexao, inicio: date, fim: date, barbeiros: tuple, usuario: str, agora: float,
+                     intervalos: dict = None):
+        """
+        Acrescenta aos intervalos (ou a um dicionário novo) as reservas ativas de outros usuários no período.
+        """
+        intervalos = {} if intervalos is None else intervalos
+        for linha in conexao.execute("SELECT data, barbeiro, inicio, fim FROM reservas WHERE data BETWEEN ? AND ? "
+                                     "AND expira > ? AND usuario IS NOT ?",
+                                     (inicio.isoformat(), fim.isoformat(), agora, usuario)):
+            if linha["barbeiro"] in barbeiros:
+                intervalos.setdefault((linha["barbeiro"], lerData(linha["data"])), Intervalos()).adicionar(
+                    linha["inicio"], linha["fim"])
+        return intervalos
+
+    def _lerEstadoPeriodo(self, conexao, inicio: date, fim: date, barbeiros: tuple, usuario: str, agora: float):
+        versoes = {lerData(linha["data"]): linha["versao"]
+                   for linha in conexao.execute("SELECT data, versao FROM versoes_dias WHERE data BETWEEN ? AND ?",
+                                                (inicio.isoformat(), fim.isoformat()))}
+        return versoes, self._lerReservas(conexao, inicio, fim, barbeiros, usuario, agora)
+
+    async def _estadoPeriodo(self, inicio: date, fim: date, barbeiros: tuple, usuario: str):
+        return await self._executar(self._lerEstadoPeriodo, inicio, fim, barbeiros, usuario, instanteAtual())
+
+    async def _calcularLivres(self, periodo: list, duracao: int, barbeiros: tuple):
+        intervalos = await self._executar(self._lerAgendados, periodo, barbeiros)
+        return horariosLivres(self.agenda, periodo, duracao,
+                              lambda candidato, dia: intervalos.get((candidato, dia)), barbeiros)
+
+    def _barbeiroLivre(self, conexao, agendamento: Agendamento, usuario: str, agora: float, ignorar: int = None):
+        inicio, fim = self.agenda.intervaloDe(agendamento)
+        if not self.agenda.cabe(inicio, agendamento.duracao):
+            return None
+        candidatos = self.agenda.candidatos(agendamento.barbeiro)
+        intervalos = self._lerReservas(conexao, agendamento.data, agendamento.data, candidatos, usuario, agora,
+                                       self._lerAgendados(conexao, [agendamento.data], candidatos, ignorar))
+        for barbeiro in candidatos:
+            ocupados = intervalos.get((barbeiro, agendamento.data))
+            if not ocupados or not ocupados.conflita(inicio, fim):
+                return barbeiro
+        return None
+
+    async def reservarHorario(self, agendamento: Agendamento, usuario: str, segundos: float):
+        self._prepararAgendamento(agendamento)
+
+        def reservar(conexao):
+            agora = instanteAtual()
+            conexao.execute("DELETE FROM reservas WHERE expira <= ?", (agora,))
+            barbeiro = self._barbeiroLivre(conexao, agendamento, usuario, agora)
+            if barbeiro is None:
+                return False
+            agendamento.barbeiro = barbeiro
+            conexao.execute("INSERT OR REPLACE INTO reservas (usuario, barbeiro, data, inicio, fim, expira) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (usuario, barbeiro, agendamento.data.isoformat(), *self.agenda.intervaloDe(agendamento),
+                             agora + segundos))
+            return True
+
+        return await self._executarExclusivo(reservar)
+
+    async def agendarSeLivre(self, agendamento: Agendamento, usuario: str = None):
+        self._prepararAgendamento(agendamento)
+
+        def agendar(conexao):
+            barbeiro = self._barbeiroLivre(conexao, agendamento, usuario, instanteAtual())
+            if barbeiro is None:
+                return False
+            agendamento.barbeiro = barbeiro
+            agendamento.id = self._inserirAgendamento(conexao, agendamento)
+            conexao.execute("DELETE FROM reservas WHERE usuario IS ?", (usuario,))
+            return True
+
+        return await self._executarExclusivo(agendar)
+
+    async def obterAgendamento(self, identificador: int):
+        return await self._executar(
+            self._obterPorId, self._agendamento, "agendamentos", COLUNAS_AGENDAMENTO, identificador)
+
+    async def alterarAgendamento(self, agendamento: Agendamento, usuario: str = None):
+        self._prepararAgendamento(agendamento)
+
+        def alterar(conexao):
+            if conexao.execute("SELECT 1 FROM agendamentos WHERE id = ?", (agendamento.id,)).fetchone() is None:
+                return False
+            barbeiro = self._barbeiroLivre(conexao, agendamento, usuario, instanteAtual(), ignorar=agendamento.id)
+            if barbeiro is None:
+                return False
+            agendamento.barbeiro = barbeiro
+            return self._alterarPorId(
+                conexao, "agendamentos",
+                "UPDATE agendamentos SET cliente = ?, servico = ?, data = ?, hora = ?, situacao = ?, barbeiro = ?, "
+                "duracao = ? WHERE id = ?",
+                agendamento.cliente, agendamento.servico, agendamento.data.isoformat(),
+                formatarHora(agendamento.hora), agendamento.situacao, agendamento.barbeiro, agendamento.duracao,
+                agendamento.id)
+
+        return await self._executarExclusivo(alterar)
+
+    async def removerAgendamento(self, identificador: int):
+        return await self._executar(
+            self._alterarPorId, "agendamentos", "DELETE FROM agendamentos WHERE id = ?", identificador)
+
+    @staticmethod
+    def _inserirMovimentos(conexao, movimentos: list):
+        """
+        Grava as movimentações, que já têm saldo e momento, com ids consecutivos. Deve rodar em uma
+        transação exclusiva, para que nenhum outro worker use os mesmos ids.
+        """
+        proximo = conexao.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM movimentos").fetchone()[0]
+        for deslocamento, movimento in enumerate(movimentos):
+            movimento.id = proximo + deslocamento
+        conexao.executemany(
+            f"INSERT INTO movimentos (id, {COLUNAS_MOVIMENTO}) VALUES (?, ?, ?, ?, ?, ?)",
+            [(movimento.id, movimento.produto, movimento.tipo, movimento.quantidade, movimento.saldo,
+              movimento.momento.isoformat()) for movimento in movimentos])
+
+    @classmethod
+    def _registrarAjuste(cls, conexao, produto: int, anterior: int, saldo: int):
+        movimento = movimentoDeAjuste(produto, anterior, saldo, datetime.now().replace(microsecond=0))
+        if movimento is not None:
+            cls._inserirMovimentos(conexao, [movimento])
+
+    @classmethod
+    def _inserirProduto(cls, conexao, produto: Produto):
+        identificador = cls._inserir(
+            conexao, "estoque", f"INSERT INTO estoque ({COLUNAS_PRODUTO}) VALUES (?, ?, ?)",
+            produto.nome, produto.quantidade, produto.validade.isoformat() if produto.validade else None)
+        cls._registrarAjuste(conexao, identificador, None, produto.quantidade)
+        return identificador
+
+    async def adicionarProduto(self, produto: Produto):
+        produto.id = await self._executarExclusivo(self._inserirProduto, produto)
+
+    async def listarEstoque(self, inicio: date = None, fim: date = None):
+        condicao, parametros = self._condicaoPeriodo("validade", inicio, fim)
+        return await self._executar(
+            self._consultarRegistros, self._produto,
+            f"SELECT id, {COLUNAS_PRODUTO} FROM estoque{condicao} ORDER BY id", *parametros)
+
+    async def listarEstoqueCritico(self, limite: int = LIMITE_ESTOQUE_CRITICO, maximo: int = None):
+        return await self._executar(
+            self._consultarRegistros, self._produto,
+            f"SELECT id, {COLUNAS_PRODUTO} FROM estoque WHERE quantidade < ? ORDER BY quantidade, id LIMIT ?",
+            limite, -1 if maximo is None else maximo)
+
+    async def obterProduto(self, identificador: int):
+        return await self._executar(self._obterPorId, self._produto, "estoque", COLUNAS_PRODUTO, identificador)
+
+    async def alterarProduto(self, produto: Produto):
+        def alterar(conexao):
+            linha = conexao.execute("SELECT quantidade FROM estoque WHERE id = ?", (produto.id,)).fetchone()
+            if linha is None:
+                return False
+            self._alterarPorId(
+                conexao, "estoque", "UPDATE estoque SET nome = ?, quantidade = ?, validade = ? WHERE id = ?",
+                produto.nome, produto.quantidade, produto.validade.isoformat() if produto.validade else None,
+                produto.id)
+            self._registrarAjuste(conexao, produto.id, linha["quantidade"], produto.quantidade)
+            return True
+
+        return await self._executarExclusivo(alterar)
+
+    async def removerProduto(self, identificador: int):
+        return await self._executar(
+            self._alterarPorId, "estoque", "DELETE FROM estoque WHERE id = ?", identificador)
+
+    @classmethod
+    def _registrarMovimentos(cls, conexao, movimentos: list):
+        produtos = list(dict.fromkeys(movimento.produto for movimento in movimentos))
+        atuais = {}
+        for inicio in range(0, len(produtos), PARAMETROS_POR_CONSULTA):
+            parte = produtos[inicio:inicio + PARAMETROS_POR_CONSULTA]
+            atuais.update((linha["id"], linha["quantidade"]) for linha in conexao.execute(
+                f"SELECT id, quantidade FROM estoque WHERE id IN ({', '.join('?' * len(parte))})", parte))
+        saldos = calcularSaldos(movimentos, atuais.get)
+        if not movimentos:
+            return saldos
+        momento = datetime.now().replace(microsecond=0)
+        for movimento in movimentos:
+            movimento.momento = momento
+        cls._inserirMovimentos(conexao, movimentos)
+        conexao.executemany("UPDATE estoque SET quantidade = ? WHERE id = ?",
+                            [(saldo, produto) for produto, saldo in saldos.items()])
+        cls._registrarAlteracao(conexao, "estoque")
+        return saldos
+
+    async def registrarMovimentos(self, movimentos: list):
+        return await self._executarExclusivo(self._registrarMovimentos, movimentos)
+
+    async def listarMovimentos(self, produto: int = None, antes: int = None, limite: int = LIMITE_MOVIMENTOS):
+        condicoes, parametros = [], []
+        if produto is not None:
+            condicoes.append("produto = ?")
+            parametros.append(produto)
+        if antes is not None:
+            condicoes.append("id < ?")
+            parametros.append(antes)
+        condicao = " WHERE " + " AND ".join(condicoes) if condicoes else ""
+        return await self._executar(
+            self._consultarRegistros, self._movimento,
+            f"SELECT id, {COLUNAS_MOVIMENTO} FROM movimentos{condicao} ORDER BY id DESC LIMIT ?",
+            *parametros, limite)
+
+    async def adicionarConta(self, conta: Conta):
+        conta.id = await self._executar(
+            self._inserir, "contas", f"INSERT INTO contas ({COLUNAS_GRAVACAO_CONTA}) VALUES (?, ?, ?, ?, ?)",
+            conta.descricao, str(conta.valor), conta.vencimento.isoformat(), conta.status,
+            valorParaCentavos(conta.valor))
+
+    async def listarContas(self, inicio: date = None, fim: date = None):
+        condicao, parametros = self._condicaoPeriodo("vencimento", inicio, fim)
+        return await self._executar(
+            self._consultarRegistros, self._conta,
+            f"SELECT id, {COLUNAS_CONTA} FROM contas{condicao} ORDER BY id", *parametros)
+
+    async def listarContasStatus(self, status: list):
+        marcadores = ", ".join("?" * len(status))
+        return await self._executar(
+            self._consultarRegistros, self._conta,
+            f"SELECT id, {COLUNAS_CONTA} FROM contas WHERE status IN ({marcadores}) ORDER BY vencimento",
+            *status)
+
+    async def obterConta(self, identificador: int):
+        return await self._executar(self._obterPorId, self._conta, "contas", COLUNAS_CONTA, identificador)
+
+    async def alterarConta(self, conta: Conta):
+        return await self._executar(
+            self._alterarPorId, "contas",
+            "UPDATE contas SET descricao = ?, valor = ?, vencimento = ?, status = ?, centavos = ? WHERE id = ?",
+            conta.descricao, str(conta.valor), conta.vencimento.isoformat(), conta.status,
+            valorParaCentavos(conta.valor), conta.id)
+
+    async def removerConta(self, identificador: int):
+        return await self._executar(
+            self._alterarPorId, "contas", "DELETE FROM contas WHERE id = ?", identificador)
+
+    async def alterarStatusConta(self, identificador: int, status: str, anterior: str = None):
+        if anterior is not None:
+            return await self._executar(
+                self._alterarPorId, "contas", "UPDATE contas SET status = ? WHERE status = ? AND id = ?",
+                status, anterior, identificador)
+        return await self._executar(
+            self._alterarPorId, "contas", "UPDATE contas SET status = ? WHERE id = ?", status, identificador)
+
+    def _importarLote(self, conexao, tabela: str, registros: list):
+        if tabela == "contas":
+            conexao.executemany(
+                f"INSERT INTO contas ({COLUNAS_GRAVACAO_CONTA}) VALUES (?, ?, ?, ?, ?)",
+                [(conta.descricao, str(conta.valor), conta.vencimento.isoformat(), conta.status,
+                  valorParaCentavos(conta.valor)) for conta in registros])
+            aceitos = [True] * len(registros)
+        elif tabela == "estoque":
+            momento = datetime.now().replace(microsecond=0)
+            movimentos = []
+            for produto in registros:
+                produto.id = conexao.execute(
+                    f"INSERT INTO estoque ({COLUNAS_PRODUTO}) VALUES (?, ?, ?)",
+                    (produto.nome, produto.quantidade, produto.validade.isoformat() if produto.validade else None)
+                ).lastrowid
+                movimento = movimentoDeAjuste(produto.id, None, produto.quantidade, momento)
+                if movimento is not None:
+                    movimentos.append(movimento)
+            self._inserirMovimentos(conexao, movimentos)
+            aceitos = [True] * len(registros)
+        else:
+            agora = instanteAtual()
+            aceitos = []
+            for agendamento in registros:
+                barbeiro = self._barbeiroLivre(conexao, agendamento, None, agora)
+                if barbeiro is not None:
+                    agendamento.barbeiro = barbeiro
+                    agendamento.id = conexao.execute(
+                        f"INSERT INTO agendamentos ({COLUNAS_AGENDAMENTO}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (agendamento.cliente, agendamento.servico, agendamento.data.isoformat(),
+                         formatarHora(agendamento.hora), agendamento.situacao, agendamento.barbeiro,
+                         agendamento.duracao)).lastrowid
+                aceitos.append(barbeiro is not None)
+        if any(aceitos):
+            self._registrarAlteracao(conexao, tabela)
+        return aceitos
+
+    async def importarLote(self, tabela: str, registros: list):
+        if tabela == "agendamentos":
+            for agendamento in registros:
+                self._prepararAgendamento(agendamento)
+        return await self._executarExclusivo(self._importarLote, tabela, registros)
+
+    async def totaisContas(self):
+        linhas = await self._executar(
+            self._consultar, "SELECT mes, status, centavos, quantidade FROM totais_contas WHERE quantidade > 0")
+        return {(linha["mes"], linha["status"]): Total(centavosParaValor(linha["centavos"]), linha["quantidade"])
+                for linha in linhas}
+
+    @staticmethod
+    def _sqlPagina(consulta: Consulta):
+        """
+        Monta o comando de uma página: filtros, cursor como comparação de row values e ORDER BY
+        nas mesmas expressões dos índices, para que o SQLite leia só a faixa da página.
+        """
+        expressoes = [EXPRESSOES_ORDENACAO.get(coluna, coluna) for coluna in consulta.colunas] + ["id"]
+        condicoes, parametros = [], []
+        campoPeriodo = CAMPO_PERIODO[consulta.tabela]
+        expressaoPeriodo = EXPRESSOES_ORDENACAO.get(campoPeriodo, campoPeriodo)
+        if consulta.inicio is not None or consulta.fim is not None:
+            condicoes.append(f"{campoPeriodo} IS NOT NULL")
+        if consulta.inicio is not None:
+            condicoes.append(f"{expressaoPeriodo} >= ?")
+            parametros.append(consulta.inicio.isoformat())
+        if consulta.fim is not None:
+            condicoes.append(f"{expressaoPeriodo} <= ?")
+            parametros.append(consulta.fim.isoformat())
+        for campo in ("status", "cliente"):
+            if getattr(consulta, campo) is not None:
+                condicoes.append(f"{campo} = ?")
+                parametros.append(getattr(consulta, campo))
+        if consulta.prefixo:
+            condicoes.append("nome COLLATE NOCASE >= ? AND nome COLLATE NOCASE < ?")
+            parametros.extend([normalizarNome(consulta.prefixo), normalizarNome(consulta.prefixo) + FIM_PREFIXO])
+        if consulta.apos is not None:
+            if len(expressoes) > 1:
+                # Limite simples na primeira coluna, que o SQLite usa como faixa mesmo em expressões.
+                condicoes.append(f"{expressoes[0]} {'<=' if consulta.decrescente else '>='} ?")
+                parametros.append(valorBanco(consulta.apos[0]))
+            marcadores = ", ".join("?" * len(expressoes))
+            condicoes.append(f"({', '.join(expressoes)}) {'<' if consulta.decrescente else '>'} ({marcadores})")
+            parametros.extend(valorBanco(valor) for valor in consulta.apos)
+        direcao = " DESC" if consulta.decrescente else ""
+        sql = (f"SELECT {SELECAO[consulta.tabela]} FROM {consulta.tabela}"
+               + (" WHERE " + " AND ".join(condicoes) if condicoes else "")
+               + " ORDER BY " + ", ".join(expressao + direcao for expressao in expressoes)
+               + " LIMIT ?")
+        return sql, parametros + [consulta.limite + 1]
+
+    def _consultarPagina(self, conexao, consulta: Consulta):
+        conversor = {"agendamentos": self._agendamento, "estoque": self._produto, "contas": self._conta}
+        sql, parametros = self._sqlPagina(consulta)
+        return montarPagina(consulta, self._consultarRegistros(conexao, conversor[consulta.tabela], sql, *parametros))
+
+    async def listarPagina(self, consulta: Consulta):
+        return await self._executar(self._consultarPagina, consulta)
+
+    @staticmethod
+    def _renovarTrava(conexao, chave: str, dono: str, segundos: float):
+        agora = instanteAtual()
+        linha = conexao.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+        if linha is not None:
+            atual, _, expira = linha["valor"].partition(" ")
+            if atual != dono and float(expira) > agora:
+                return False
+        conexao.execute("INSERT INTO meta (chave, valor) VALUES (?, ?) "
+                        "ON CONFLICT (chave) DO UPDATE SET valor = excluded.valor",
+                        (chave, f"{dono} {agora + segundos}"))
+        return True
+
+    async def renovarTrava(self, nome: str, dono: str, segundos: float):
+        return await self._executarExclusivo(self._renovarTrava, f"trava:{nome}", dono, segundos)
+
+    async def versoesDados(self):
+        linhas = await self._executar(self._consultar, "SELECT tabela, versao FROM versoes")
+        return {linha["tabela"]: linha["versao"] for linha in linhas}
+
+    async def fechar(self):
+        self.pool.fechar()
+
+
+def criarRepositorio():
+    """
+    Cria o repositório configurado pelas variáveis de ambiente.
+
+    BARBEARIA_BACKEND escolhe entre "memoria" (padrão) e "sqlite"; BARBEARIA_DB define o arquivo
+    do banco e BARBEARIA_POOL o número máximo de conexões simultâneas. A agenda é lida de
+    ConfiguracaoAgenda.deAmbiente, e BARBEARIA_CACHE_DISPONIBILIDADE_MB limita o cache de horários livres.
+    """
+    backend = os.environ.get("BARBEARIA_BACKEND", "memoria")
+    agenda = ConfiguracaoAgenda.deAmbiente()
+    limiteCache = int(os.environ.get("BARBEARIA_CACHE_DISPONIBILIDADE_MB", "16")) * 1024 * 1024
+    if backend == "sqlite":
+        return RepositorioSQLite(os.environ.get("BARBEARIA_DB", "barbearia.db"),
+                                 int(os.environ.get("BARBEARIA_POOL", "4")), agenda, limiteCache)
+    if backend == "memoria":
+        return RepositorioMemoria(agenda, limiteCache)
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
@@ -0,0 +1,196 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+PREFIXO = "scrypt"
+TAMANHO_SAL = 16
+TAMANHO_HASH = 32
+
+
+def _codificar(dados: bytes):
+    return base64.urlsafe_b64encode(dados).decode().rstrip("=")
+
+
+def _decodificar(texto: str):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+@dataclass(frozen=True, slots=True)
+class ParametrosScrypt:
+    """
+    Parâmetros de custo do scrypt: n (custo de CPU e memória, potência de 2), r (tamanho do bloco)
+    e p (paralelismo). Cada hash usa cerca de 128 * n * r bytes de memória.
+    """
+    n: int = 2 ** 15
+    r: int = 8
+    p: int = 1
+
+    @classmethod
+    def deAmbiente(cls):
+        """
+        Lê os parâmetros de BARBEARIA_SCRYPT_N, BARBEARIA_SCRYPT_R e BARBEARIA_SCRYPT_P.
+        """
+        padrao = cls()
+        return cls(int(os.environ.get("BARBEARIA_SCRYPT_N", str(padrao.n))),
+                   int(os.environ.get("BARBEARIA_SCRYPT_R", str(padrao.r))),
+                   int(os.environ.get("BARBEARIA_SCRYPT_P", str(padrao.p))))
+
+
+def _derivar(senha: str, sal: bytes, parametros: ParametrosScrypt):
+    return hashlib.scrypt(senha.encode(), salt=sal, n=parametros.n, r=parametros.r, p=parametros.p,
+                          maxmem=256 * parametros.n * parametros.r + 1024 * 1024, dklen=TAMANHO_HASH)
+
+
+def gerarHash(senha: str, parametros: ParametrosScrypt):
+    """
+    Gera o hash da senha com um sal aleatório, no formato scrypt$n$r$p$sal$hash.
+    Os parâmetros ficam gravados junto do hash, então hashes antigos continuam verificáveis
+    depois que os parâmetros mudam.
+    """
+    sal = secrets.token_bytes(TAMANHO_SAL)
+    derivado = _derivar(senha, sal, parametros)
+    return f"{PREFIXO}${parametros.n}${parametros.r}${parametros.p}${_codificar(sal)}${_codificar(derivado)}"
+
+
+def lerParametros(guardado: str):
+    """
+    Retorna os parâmetros com que o hash foi gerado, ou None se ele não for um hash scrypt
+    (senhas antigas gravadas em texto puro).
+    """
+    partes = guardado.split("$")
+    if len(partes) != 6 or partes[0] != PREFIXO:
+        return None
+    return ParametrosScrypt(int(partes[1]), int(partes[2]), int(partes[3]))
+
+
+def conferirHash(senha: str, guardado: str):
+    """
+    Confere a senha com o valor guardado em tempo constante. Aceita também senhas antigas em texto
+    puro, para que possam ser convertidas em hash no próximo login.
+    """
+    parametros = lerParametros(guardado)
+    if parametros is None:
+        return hmac.compare_digest(senha.encode(), guardado.encode())
+    _, _, _, _, sal, derivado = guardado.split("$")
+    return hmac.compare_digest(_derivar(senha, _decodificar(sal), parametros), _decodificar(derivado))
+
+
+class ServicoSenhas:
+    """
+    Gera e confere hashes de senha em um pool limitado de processos, fora do event loop.
+
+    O scrypt leva dezenas a centenas de milissegundos de CPU; rodando nos processos do pool, os
+    demais endpoints continuam sendo atendidos durante os logins. No máximo maximoPendentes hashes
+    ficam na fila ao mesmo tempo: acima disso, ocupado é verdadeiro e o login deve ser recusado
+    em vez de aumentar a fila.
+    """
+
+    def __init__(self, parametros: ParametrosScrypt = None, processos: int = 2, maximoPendentes: int = 64):
+        self.parametros = parametros or ParametrosScrypt()
+        self.processos = processos
+        self.maximoPendentes = maximoPendentes
+        self.pendentes = 0
+        self._executor = None
+        self._hashFicticio = None
+
+    def _iniciar(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processos)
+        return self._executor
+
+    async def _rodar(self, funcao, *args):
+        self.pendentes += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._iniciar(), funcao, *args)
+        finally:
+            self.pendentes -= 1
+
+    @property
+    def ocupado(self):
+        return self.pendentes >= self.maximoPendentes
+
+    async def gerar(self, senha: str):
+        return await self._rodar(gerarHash, senha, self.parametros)
+
+    async def verificar(self, senha: str, guardado: str = None):
+        """
+        Confere a senha com o hash guardado e retorna (valida, novoHash). novoHash só é preenchido
+        quando a senha é válida mas foi guardada em texto puro ou com parâmetros diferentes dos
+        atuais, e deve substituir o hash guardado.
+
+        Sem hash guardado (usuário inexistente), a senha é conferida com um hash fictício, para que
+        a resposta leve o mesmo tempo e não revele quais usuários existem.
+        """
+        if guardado is None:
+            if self._hashFicticio is None:
+                self._hashFicticio = await self.gerar(secrets.token_urlsafe(16))
+            await self._rodar(conferirHash, senha, self._hashFicticio)
+            return False, None
+        if not await self._rodar(conferirHash, senha, guardado):
+            return False, None
+        if lerParametros(guardado) != self.parametros:
+            return True, await self.gerar(senha)
+        return True, None
+
+    def fechar(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+class LimitadorTentativas:
+    """
+    Limita as tentativas por chave (usuário ou IP) com um balde de fichas: cada chave tem até
+    tentativas fichas, repostas continuamente ao longo de janela segundos.
+
+    Os baldes ficam em um OrderedDict na ordem do último uso, e os que estão parados há mais de
+    uma janela (já cheios de novo) são descartados do início a cada acesso, como as sessões em
+    memória. Com tentativas igual a zero, o limitador não recusa nada. Os limites valem por processo.
+    """
+
+    def __init__(self, tentativas: int, janela: float):
+        self.tentativas = tentativas
+        self.janela = janela
+        self._baldes = OrderedDict()
+
+    def _descartarParados(self, agora: float):
+        while self._baldes:
+            chave, (_, ultimoUso) = next(iter(self._baldes.items()))
+            if agora - ultimoUso < self.janela:
+                break
+            del self._baldes[chave]
+
+    def permitir(self, chave: str):
+        """
+        Consome uma ficha da chave e retorna True, ou False se ela não tiver fichas.
+        """
+        if not self.tentativas:
+            return True
+        agora = time.monotonic()
+        self._descartarParados(agora)
+        fichas, ultimoUso = self._baldes.pop(chave, (self.tentativas, agora))
+        fichas = min(self.tentativas, fichas + (agora - ultimoUso) * self.tentativas / self.janela)
+        permitido = fichas >= 1
+        self._baldes[chave] = (fichas - 1 if permitido else fichas, agora)
+        return permitido
+
+    def __len__(self):
+        return len(self._baldes)
+
+
+def criarServicoSenhas():
+    """
+    Cria o serviço de senhas configurado pelas variáveis de ambiente: BARBEARIA_SCRYPT_N, _R e _P
+    (parâmetros do scrypt), BARBEARIA_PROCESSOS_SENHAS (processos do pool) e
+    BARBEARIA_SENHAS_PENDENTES (máximo de hashes na fila).
+    """
+    return ServicoSenhas(ParametrosScrypt.deAmbiente(),
+                         int(os.environ.get("BARBEARIA_PROCESSOS_SENHAS", "2")),
+                         int(os.environ.get("BARBEARIA_SENHAS_PENDENTES", "64")))
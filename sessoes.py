@@ -0,0 +1,224 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+from functools import partial
+
+import anyio
+
+from repositorio import PoolConexoes
+
+NOME_COOKIE = "sessao"
+TTL_PADRAO = 8 * 60 * 60
+INTERVALO_LIMPEZA = 100
+
+
+def assinar(idSessao: str, segredo: bytes):
+    """
+    Gera o token da sessão: o id seguido da assinatura HMAC-SHA256 do id com o segredo.
+    """
+    assinatura = hmac.new(segredo, idSessao.encode(), hashlib.sha256).digest()
+    return idSessao + "." + base64.urlsafe_b64encode(assinatura).decode().rstrip("=")
+
+
+def lerToken(token: str, segredo: bytes):
+    """
+    Retorna o id da sessão se a assinatura do token for válida, ou None.
+    Tokens forjados ou corrompidos são recusados sem consultar o armazenamento.
+    """
+    idSessao, _, _ = token.rpartition(".")
+    if not idSessao or not hmac.compare_digest(assinar(idSessao, segredo), token):
+        return None
+    return idSessao
+
+
+class ArmazenamentoSessoes:
+    """
+    Interface do armazenamento de sessões de login.
+
+    Cada sessão liga um id aleatório ao usuário logado e expira após ttl segundos sem uso; cada
+    acesso renova o prazo. O cliente recebe apenas o token assinado (assinar), guardado em um cookie,
+    então validar uma requisição custa uma verificação HMAC e uma busca pelo id, O(1).
+    """
+
+    segredo = None
+
+    async def criar(self, usuario: str):
+        """
+        Cria uma sessão para o usuário e retorna o token assinado.
+        """
+        idSessao = secrets.token_urlsafe(32)
+        await self._guardar(idSessao, usuario)
+        return assinar(idSessao, self.segredo)
+
+    async def obter(self, token: str):
+        """
+        Retorna o usuário da sessão do token, renovando o prazo, ou None se o token for inválido
+        ou a sessão tiver expirado.
+        """
+        idSessao = lerToken(token, self.segredo) if token else None
+        if idSessao is None:
+            return None
+        return await self._obter(idSessao)
+
+    async def remover(self, token: str):
+        idSessao = lerToken(token, self.segredo) if token else None
+        if idSessao is not None:
+            await self._remover(idSessao)
+
+    async def _guardar(self, idSessao: str, usuario: str):
+        raise NotImplementedError
+
+    async def _obter(self, idSessao: str):
+        raise NotImplementedError
+
+    async def _remover(self, idSessao: str):
+        raise NotImplementedError
+
+    async def fechar(self):
+        pass
+
+
+class SessoesMemoria(ArmazenamentoSessoes):
+    """
+    Sessões em memória, para um único processo.
+
+    As sessões ficam em um OrderedDict na ordem em que expiram: como o ttl é o mesmo para todas,
+    renovar uma sessão a move para o final, e as expiradas são removidas do início a cada acesso,
+    sem varrer o dicionário.
+    """
+
+    def __init__(self, ttl: int = TTL_PADRAO, segredo: bytes = None):
+        self.ttl = ttl
+        self.segredo = segredo or secrets.token_bytes(32)
+        self._sessoes = OrderedDict()
+
+    def _expirar(self, agora: float):
+        while self._sessoes:
+            idSessao, (_, expiraEm) = next(iter(self._sessoes.items()))
+            if expiraEm > agora:
+                break
+            del self._sessoes[idSessao]
+
+    async def _guardar(self, idSessao: str, usuario: str):
+        agora = time.monotonic()
+        self._expirar(agora)
+        self._sessoes[idSessao] = (usuario, agora + self.ttl)
+
+    async def _obter(self, idSessao: str):
+        agora = time.monotonic()
+        self._expirar(agora)
+        sessao = self._sessoes.get(idSessao)
+        if sessao is None:
+            return None
+        self._sessoes[idSessao] = (sessao[0], agora + self.ttl)
+        self._sessoes.move_to_end(idSessao)
+        return sessao[0]
+
+    async def _remover(self, idSessao: str):
+        self._sessoes.pop(idSessao, None)
+
+    def __len__(self):
+        return len(self._sessoes)
+
+
+ESQUEMA_SESSOES = """
+CREATE TABLE IF NOT EXISTS sessoes (
+    id TEXT PRIMARY KEY,
+    usuario TEXT NOT NULL,
+    expira REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessoes_expira ON sessoes (expira);
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor TEXT NOT NULL
+);
+"""
+
+
+class SessoesSQLite(ArmazenamentoSessoes):
+    """
+    Sessões em um arquivo SQLite no modo WAL, compartilhadas entre vários workers.
+
+    O segredo das assinaturas é gerado na primeira execução e gravado no próprio banco, para que
+    todos os workers aceitem os mesmos tokens. Para evitar uma escrita a cada requisição, o prazo
+    só é renovado depois que metade do ttl tiver passado; as sessões expiradas são apagadas a cada
+    INTERVALO_LIMPEZA logins, usando o índice por expiração.
+    """
+
+    def __init__(self, caminho: str, ttl: int = TTL_PADRAO, segredo: bytes = None, tamanhoPool: int = 4):
+        self.ttl = ttl
+        self.pool = PoolConexoes(caminho, tamanhoPool)
+        self._limitador = anyio.CapacityLimiter(tamanhoPool)
+        self._criadas = 0
+        with self.pool.conexao() as conexao:
+            conexao.executescript(ESQUEMA_SESSOES)
+            with conexao:
+                conexao.execute("INSERT OR IGNORE INTO meta (chave, valor) VALUES ('segredo_sessoes', ?)",
+                                (secrets.token_hex(32),))
+                armazenado = conexao.execute(
+                    "SELECT valor FROM meta WHERE chave = 'segredo_sessoes'").fetchone()["valor"]
+        self.segredo = segredo or bytes.fromhex(armazenado)
+
+    async def _executar(self, funcao, *args):
+        return await anyio.to_thread.run_sync(partial(self._naConexao, funcao, *args),
+                                              limiter=self._limitador)
+
+    def _naConexao(self, funcao, *args):
+        with self.pool.conexao() as conexao:
+            with conexao:
+                return funcao(conexao, *args)
+
+    async def _guardar(self, idSessao: str, usuario: str):
+        self._criadas += 1
+        limpar = self._criadas % INTERVALO_LIMPEZA == 0
+
+        def guardar(conexao):
+            agora = time.time()
+            if limpar:
+                conexao.execute("DELETE FROM sessoes WHERE expira <= ?", (agora,))
+            conexao.execute("INSERT INTO sessoes (id, usuario, expira) VALUES (?, ?, ?)",
+                            (idSessao, usuario, agora + self.ttl))
+
+        await self._executar(guardar)
+
+    async def _obter(self, idSessao: str):
+        def obter(conexao):
+            agora = time.time()
+            linha = conexao.execute("SELECT usuario, expira FROM sessoes WHERE id = ? AND expira > ?",
+                                    (idSessao, agora)).fetchone()
+            if linha is None:
+                return None
+            if linha["expira"] - agora < self.ttl / 2:
+                conexao.execute("UPDATE sessoes SET expira = ? WHERE id = ?", (agora + self.ttl, idSessao))
+            return linha["usuario"]
+
+        return await self._executar(obter)
+
+    async def _remover(self, idSessao: str):
+        await self._executar(lambda conexao: conexao.execute("DELETE FROM sessoes WHERE id = ?", (idSessao,)))
+
+    async def fechar(self):
+        self.pool.fechar()
+
+
+def criarArmazenamentoSessoes():
+    """
+    Cria o armazenamento de sessões configurado pelas variáveis de ambiente.
+
+    BARBEARIA_SESSOES escolhe entre "memoria" (padrão, um único processo) e "sqlite" (vários
+    workers); BARBEARIA_SESSOES_DB define o arquivo do banco, BARBEARIA_SESSAO_TTL o tempo de
+    inatividade em segundos até a sessão expirar e BARBEARIA_SEGREDO, opcional, o segredo das
+    assinaturas em hexadecimal.
+    """
+    backend = os.environ.get("BARBEARIA_SESSOES", "memoria")
+    ttl = int(os.environ.get("BARBEARIA_SESSAO_TTL", str(TTL_PADRAO)))
+    segredo = bytes.fromhex(os.environ["BARBEARIA_SEGREDO"]) if os.environ.get("BARBEARIA_SEGREDO") else None
+    if backend == "sqlite":
+        return SessoesSQLite(os.environ.get("BARBEARIA_SESSOES_DB", "sessoes.db"), ttl, segredo)
+    if backend == "memoria":
+        return SessoesMemoria(ttl, segredo)
+    raise ValueError(f"Armazenamento de sessões desconhecido: {backend}")